@@ -0,0 +1,25 @@
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from calendar_app.models import EventAttachment
+
+
+class Command(BaseCommand):
+    help = 'Move os anexos do calendário gravados no banco (BLOB) para o volume de mídia'
+
+    def handle(self, *args, **options):
+        pending = EventAttachment.objects.filter(file="", file_data__isnull=False)
+        moved = 0
+        # Um BLOB por vez: só o id é listado, os bytes vêm na hora de gravar.
+        for pk in list(pending.values_list("pk", flat=True)):
+            attachment = EventAttachment.objects.get(pk=pk)
+            data = bytes(attachment.file_data or b"")
+            attachment.file.save(attachment.filename, ContentFile(data), save=False)
+            updated = EventAttachment.objects.filter(pk=pk, file="").update(
+                file=attachment.file.name, file_data=None, file_size=len(data),
+            )
+            if updated:
+                moved += 1
+            else:
+                attachment.file.storage.delete(attachment.file.name)
+        self.stdout.write(self.style.SUCCESS(f'Anexos movidos para arquivo: {moved}.'))
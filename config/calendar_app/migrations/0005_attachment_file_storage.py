@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:25
+
+import calendar_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0004_alter_calendarevent_event_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventattachment',
+            name='file',
+            field=models.FileField(blank=True, max_length=255, upload_to=calendar_app.models.event_attachment_path),
+        ),
+        migrations.AlterField(
+            model_name='eventattachment',
+            name='file_data',
+            field=models.BinaryField(blank=True, help_text='Legado: conteúdo do arquivo em bytes (antes do armazenamento em arquivo)', null=True),
+        ),
+    ]
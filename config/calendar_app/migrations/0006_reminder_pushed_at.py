@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:36
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def mark_existing_pushed(apps, schema_editor):
+    # Lembretes já vencidos antes do SSE não viram avisos ao vivo de uma vez
+    # no deploy; os de data futura são avisados quando vencerem.
+    Reminder = apps.get_model("calendar_app", "Reminder")
+    Reminder.objects.filter(remind_date__lte=timezone.localdate()).update(pushed_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0005_attachment_file_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='pushed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Quando o aviso ao vivo (SSE) foi publicado', null=True),
+        ),
+        migrations.RunPython(mark_existing_pushed, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import uuid
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+from core import badges
+from core.versioned_cache import VersionedCache
+
 
 class EventType(models.TextChoices):
     """Tipos de evento no calendário."""
@@ -83,6 +90,26 @@ class EventTag(models.Model):
         dark_colors = {TagColor.BLUE, TagColor.RED, TagColor.PURPLE, TagColor.BLACK}
         return "#fff" if self.color in dark_colors else "#333"
 
+    @classmethod
+    def table(cls) -> dict:
+        """{id: {name, color, text_color}} de todas as etiquetas (lido da memória).
+
+        O calendário mensal manda só os ids das etiquetas de cada evento e
+        resolve nome/cor aqui, sem JOIN nem prefetch por requisição.
+        """
+        return _tag_cache.get()
+
+
+def _load_tag_table():
+    return {
+        tag.pk: {"id": tag.pk, "name": tag.name, "color": tag.color, "text_color": tag.text_color}
+        for tag in EventTag.objects.only("name", "color")
+    }
+
+
+_tag_cache = VersionedCache("calendar_tags", _load_tag_table)
+_tag_cache.invalidate_on_change(EventTag)
+
 
 class CalendarEvent(models.Model):
     """
@@ -188,6 +215,41 @@ class CalendarEvent(models.Model):
         self.status = EventStatus.CANCELED
         self.save(update_fields=["status", "updated_at"])
 
+    @classmethod
+    def ensure_for(cls, user_ids, *, defaults: dict, reminder: dict | None = None, **lookup):
+        """`get_or_create` de um evento por usuário, em lote.
+
+        Os eventos já existentes (`lookup` + assigned_to) saem de uma query; os
+        que faltam entram num `bulk_create`, assim como o lembrete (`reminder`:
+        remind_date, message) dos eventos que ainda não têm nenhum. Devolve
+        ({user_id: evento existente}, [eventos criados]).
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        existing = {
+            event.assigned_to_id: event
+            for event in cls.objects.filter(assigned_to_id__in=user_ids, **lookup)
+        }
+        created = cls.objects.bulk_create([
+            cls(assigned_to_id=user_id, **lookup, **defaults)
+            for user_id in user_ids if user_id not in existing
+        ])
+        reminders = []
+        if reminder is not None:
+            with_reminder = set(
+                Reminder.objects.filter(event__in=existing.values()).values_list("event_id", flat=True)
+            )
+            reminders = Reminder.objects.bulk_create([
+                Reminder(event=event, **reminder)
+                for event in [*existing.values(), *created] if event.pk not in with_reminder
+            ])
+        # bulk_create não dispara os sinais (_event_changed/_reminder_changed)
+        badges.bump(*(event.assigned_to_id for event in created), *(r.event.assigned_to_id for r in reminders))
+        today = timezone.localdate()
+        for due in reminders:
+            if due.remind_date <= today:
+                Reminder.push_due(pk=due.pk)
+        return existing, created
+
 
 class Reminder(models.Model):
     """
@@ -217,6 +279,10 @@ class Reminder(models.Model):
 
     read = models.BooleanField(default=False, help_text="Se o usuário já leu o lembrete")
     read_at = models.DateTimeField(null=True, blank=True)
+    pushed_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="Quando o aviso ao vivo (SSE) foi publicado",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -233,6 +299,53 @@ class Reminder(models.Model):
     def __str__(self) -> str:
         return f"Lembrete: {self.event.title} em {self.remind_date:%d/%m/%Y}"
 
+    @classmethod
+    def due_for(cls, user, today=None):
+        """Lembretes agendados, não lidos e já vencidos (até hoje) do usuário."""
+        return cls.objects.filter(
+            event__assigned_to=user,
+            remind_date__lte=today or timezone.localdate(),
+            read=False,
+            status=ReminderStatus.SCHEDULED,
+        ).select_related("event")
+
+    @classmethod
+    def push_due(cls, today=None, pk=None) -> int:
+        """Publica aviso ao vivo dos lembretes que venceram e ainda não foram avisados.
+
+        Chamado pelo worker (run_jobs) a cada volta: lembretes com data futura
+        "vencem" na virada do dia sem nenhuma escrita. Devolve quantos publicou.
+        """
+        from core.models import LiveEvent
+
+        due = cls.objects.filter(
+            pushed_at__isnull=True,
+            remind_date__lte=today or timezone.localdate(),
+            read=False,
+            status=ReminderStatus.SCHEDULED,
+        ).select_related("event")
+        if pk is not None:
+            due = due.filter(pk=pk)
+        pushed = 0
+        for reminder in due[:200]:
+            # UPDATE condicional: dois workers não publicam o mesmo lembrete
+            if cls.objects.filter(pk=reminder.pk, pushed_at__isnull=True).update(pushed_at=timezone.now()):
+                LiveEvent.objects.create(
+                    user_id=reminder.event.assigned_to_id, kind="reminder", payload=reminder.badge_item(),
+                )
+                pushed += 1
+        return pushed
+
+    def badge_item(self) -> dict:
+        """Item da lista de lembretes do navbar."""
+        return {
+            "id": self.id,
+            "message": self.message or self.event.title,
+            "event_id": self.event_id,
+            "event_date": self.event.event_date.strftime("%d/%m/%Y"),
+            "event_type": self.event.get_event_type_display(),
+        }
+
     def mark_as_read(self):
         """Marca o lembrete como lido."""
         self.read = True
@@ -247,8 +360,23 @@ class Reminder(models.Model):
         self.save(update_fields=["status", "read", "read_at"])
 
 
+def event_attachment_path(instance: "EventAttachment", filename: str) -> str:
+    """Storage path para anexos de eventos do calendário.
+
+    O segmento aleatório impede adivinhar o caminho a partir do id do evento e
+    do nome do arquivo; o download passa por `api_attachment_download`.
+    """
+    return f"calendar/eventos/{instance.event_id}/{uuid.uuid4().hex}/{filename}"
+
+
 class EventAttachment(models.Model):
-    """Anexo de arquivo armazenado como BLOB no banco de dados."""
+    """
+    Anexo de arquivo de um evento, gravado no volume de mídia.
+
+    `file_data` é o BLOB da versão antiga (o arquivo inteiro numa coluna do
+    banco); `manage.py migrate_attachment_blobs` move esses bytes para
+    `file` e esvazia a coluna. Consultas de anexos usam defer("file_data").
+    """
 
     event = models.ForeignKey(
         CalendarEvent,
@@ -258,7 +386,12 @@ class EventAttachment(models.Model):
 
     filename = models.CharField(max_length=255, help_text="Nome original do arquivo")
     content_type = models.CharField(max_length=100, help_text="MIME type do arquivo")
-    file_data = models.BinaryField(help_text="Conteúdo do arquivo em bytes")
+    file = models.FileField(upload_to=event_attachment_path, blank=True, max_length=255)
+    file_data = models.BinaryField(
+        null=True,
+        blank=True,
+        help_text="Legado: conteúdo do arquivo em bytes (antes do armazenamento em arquivo)",
+    )
     file_size = models.PositiveIntegerField(default=0, help_text="Tamanho em bytes")
 
     uploaded_at = models.DateTimeField(auto_now_add=True)
@@ -287,3 +420,40 @@ class EventAttachment(models.Model):
             return f"{self.file_size / 1024:.1f} KB"
         return f"{self.file_size / (1024 * 1024):.1f} MB"
 
+
+@receiver(post_delete, sender=EventAttachment)
+def _delete_attachment_file(sender, instance: EventAttachment, **kwargs):
+    # Também cobre a exclusão em cascata do evento. Só apaga o arquivo depois
+    # do commit: se a transação voltar atrás, o registro continua com arquivo.
+    if instance.file:
+        name, storage = instance.file.name, instance.file.storage
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(post_save, sender=CalendarEvent)
+@receiver(post_delete, sender=CalendarEvent)
+def _event_changed(sender, instance: CalendarEvent, **kwargs):
+    # título/data do evento aparecem na lista de lembretes do badge
+    badges.bump(instance.assigned_to_id)
+
+
+@receiver(post_save, sender="core.Customer")
+def _customer_changed(sender, instance, raw=False, **kwargs):
+    # O feed do mês (api_month) mostra o nome do cliente: tocar `updated_at`
+    # dos eventos dele muda o ETag do mês, como na troca de etiquetas.
+    if raw:
+        return
+    CalendarEvent.objects.filter(customer=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Reminder)
+@receiver(post_delete, sender=Reminder)
+def _reminder_changed(sender, instance: Reminder, **kwargs):
+    try:
+        assigned_to_id = instance.event.assigned_to_id
+    except CalendarEvent.DoesNotExist:
+        return  # evento já excluído (cascata): _event_changed avisa
+    badges.bump(assigned_to_id)
+    if kwargs.get("created") and instance.remind_date <= timezone.localdate():
+        # lembrete criado já vencido: avisa agora, sem esperar o worker
+        Reminder.push_due(pk=instance.pk)
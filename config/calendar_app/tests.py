@@ -1,3 +1,236 @@
-from django.test import TestCase
+import tempfile
+from datetime import date
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+
+from .models import CalendarEvent, EventAttachment
+
+
+class AttachmentStorageTests(TestCase):
+    """Anexos no volume de mídia, download em streaming com Range."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.media = Path(media.name)
+
+        self.user = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.client.force_login(self.user)
+        self.event = CalendarEvent.objects.create(
+            title="Entrega", event_date=date(2026, 3, 10), assigned_to=self.user,
+        )
+        self.payload = bytes(range(256)) * 40  # 10 240 bytes
+
+    def _upload(self) -> EventAttachment:
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse("calendar_app:api_attachment_upload", args=[self.event.pk]),
+                {"file": SimpleUploadedFile("Orçamento.pdf", self.payload, "application/pdf")},
+            )
+        self.assertEqual(resp.status_code, 200)
+        return EventAttachment.objects.get(pk=resp.json()["attachment"]["id"])
+
+    def _download(self, attachment, **headers):
+        url = reverse("calendar_app:api_attachment_download", args=[attachment.pk])
+        return self.client.get(url, headers=headers)
+
+    def test_upload_goes_to_file_storage(self):
+        attachment = self._upload()
+        self.assertIsNone(attachment.file_data)
+        self.assertEqual((self.media / attachment.file.name).read_bytes(), self.payload)
+
+    def test_download_streams_whole_file(self):
+        resp = self._download(self._upload())
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(b"".join(resp.streaming_content), self.payload)
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertEqual(resp["Content-Length"], str(len(self.payload)))
+        self.assertIn("attachment;", resp["Content-Disposition"])
+
+    def test_download_range(self):
+        attachment = self._upload()
+        resp = self._download(attachment, Range="bytes=100-199")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b"".join(resp.streaming_content), self.payload[100:200])
+        self.assertEqual(resp["Content-Range"], f"bytes 100-199/{len(self.payload)}")
+
+        resp = self._download(attachment, Range="bytes=-10")
+        self.assertEqual(b"".join(resp.streaming_content), self.payload[-10:])
+
+        resp = self._download(attachment, Range=f"bytes={len(self.payload)}-")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{len(self.payload)}")
+
+    def test_empty_file_range_is_unsatisfiable(self):
+        self.payload = b""
+        resp = self._download(self._upload(), Range="bytes=-10")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], "bytes */0")
+
+    def test_attachment_not_served_by_media_url(self):
+        attachment = self._upload()
+        self.assertRegex(attachment.file.name, rf"^calendar/eventos/{self.event.pk}/[0-9a-f]{{32}}/")
+        other = User.objects.create_user(username="outro", password="x", role="SELLER")
+        self.client.force_login(other)
+        self.assertEqual(self._download(attachment).status_code, 403)
+        self.assertEqual(self.client.get(f"/media/{attachment.file.name}").status_code, 404)
+
+    def test_legacy_blob_is_migrated_by_command(self):
+        attachment = EventAttachment.objects.create(
+            event=self.event, filename="nota.txt", content_type="text/plain",
+            file_data=b"conteudo antigo", file_size=15,
+        )
+        resp = self._download(attachment)
+        self.assertEqual(b"".join(resp.streaming_content), b"conteudo antigo")
+
+        call_command("migrate_attachment_blobs", stdout=StringIO())
+        attachment.refresh_from_db()
+        self.assertIsNone(attachment.file_data)
+        self.assertEqual((self.media / attachment.file.name).read_bytes(), b"conteudo antigo")
+        resp = self._download(attachment)
+        self.assertEqual(b"".join(resp.streaming_content), b"conteudo antigo")
+
+    def test_delete_removes_file(self):
+        attachment = self._upload()
+        path = self.media / attachment.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse("calendar_app:api_attachment_delete", args=[attachment.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(path.exists())
+
+    def test_event_queries_skip_blob_column(self):
+        self._upload()
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("calendar_app:api_event_detail", args=[self.event.pk]))
+        self.assertEqual(len(resp.json()["attachments"]), 1)
+        self.assertFalse(any("file_data" in q["sql"] for q in ctx.captured_queries))
+
+
+class MonthFeedTests(TestCase):
+    """Feed JSON do mês: campos mínimos, etiquetas por id, ETag e 304."""
+
+    def setUp(self):
+        from .models import EventTag
+
+        self.user = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        other = User.objects.create_user(username="outro", password="x", role="SELLER")
+        self.client.force_login(self.user)
+        self.tag = EventTag.objects.create(name="Urgente", color="#eb5a46")
+        self.event = CalendarEvent.objects.create(
+            title="Entrega sofá", event_date=date(2026, 3, 10), assigned_to=self.user,
+        )
+        self.event.tags.add(self.tag)
+        CalendarEvent.objects.create(title="Outro mês", event_date=date(2026, 4, 1), assigned_to=self.user)
+        CalendarEvent.objects.create(title="De outro", event_date=date(2026, 3, 11), assigned_to=other)
+        self.url = reverse("calendar_app:api_month") + "?year=2026&month=3"
+
+    def test_feed_lists_visible_events_with_tag_ids(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual([e["title"] for e in data["events"]], ["Entrega sofá"])
+        self.assertEqual(data["events"][0]["tags"], [self.tag.pk])
+        self.assertEqual(data["tags"][str(self.tag.pk)]["color"], "#eb5a46")
+        self.assertEqual((data["first_weekday"], data["days"]), (0, 31))  # 01/03/2026 é domingo
+
+    def test_unchanged_month_returns_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        # dos eventos, só o agregado do mês (contagem + último updated_at)
+        event_queries = [q["sql"] for q in ctx.captured_queries if "calendar_app_calendarevent" in q["sql"]]
+        self.assertEqual(len(event_queries), 1)
+        self.assertIn("COUNT(", event_queries[0])
+
+    def test_customer_rename_changes_etag(self):
+        from core.models import Customer
+
+        customer = Customer.objects.create(name="João")
+        self.event.customer = customer
+        self.event.save()
+        etag = self.client.get(self.url)["ETag"]
+        customer.name = "João Silva"
+        customer.save()
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["events"][0]["customer"], "João Silva")
+
+    def test_etag_changes_when_month_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        tag_url = reverse("calendar_app:api_event_tag_toggle", args=[self.event.pk, self.tag.pk])
+        self.client.post(tag_url)  # remove a etiqueta
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["events"][0]["tags"], [])
+
+        etag = resp["ETag"]
+        self.event.delete()
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["events"], [])
+
+    def test_calendar_page_embeds_month_feed(self):
+        resp = self.client.get(reverse("calendar_app:calendar") + "?year=2026&month=3")
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'id="month-data"')
+        self.assertContains(resp, "Entrega sof")
+
+
+class EnsureEventsTests(TestCase):
+    """CalendarEvent.ensure_for: get_or_create por usuário em lote."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f"fin{i}", password="x", role="FINANCE") for i in range(4)
+        ]
+
+    def _ensure(self, when):
+        return CalendarEvent.ensure_for(
+            [u.pk for u in self.users],
+            event_type="ARCHITECT_PAYMENT",
+            defaults={"title": "Pagamento arquiteto", "event_date": when},
+            reminder={"remind_date": when, "message": "Pagar arquiteto"},
+        )
+
+    def test_creates_missing_events_and_reminders_in_bulk(self):
+        from .models import Reminder
+
+        when = date(2030, 1, 10)
+        CalendarEvent.objects.create(
+            title="Pagamento arquiteto", event_type="ARCHITECT_PAYMENT", event_date=when,
+            assigned_to=self.users[0],
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            existing, created = self._ensure(when)
+        self.assertEqual(list(existing), [self.users[0].pk])
+        self.assertEqual(len(created), 3)
+        inserts = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)  # eventos + lembretes
+        # o evento que já existia ganhou o lembrete que faltava
+        self.assertEqual(Reminder.objects.filter(event__assigned_to__in=self.users).count(), 4)
+
+        existing, created = self._ensure(when)
+        self.assertEqual((len(existing), created), (4, []))
+        self.assertEqual(Reminder.objects.count(), 4)
+
+    def test_due_reminders_are_pushed_live(self):
+        from django.utils import timezone
+
+        from core.models import LiveEvent
+
+        self._ensure(timezone.localdate())
+        self.assertEqual(LiveEvent.objects.filter(kind="reminder").count(), 4)
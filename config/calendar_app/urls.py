@@ -21,6 +21,7 @@ urlpatterns = [
 
     # API JSON — popup inline
     path("api/lembretes/", views.reminders_api, name="reminders_api"),
+    path("api/mes/", views.api_month, name="api_month"),
     path("api/evento/<int:event_id>/", views.api_event_detail, name="api_event_detail"),
     path("api/evento/<int:event_id>/salvar/", views.api_event_update, name="api_event_update"),
     path("api/evento/<int:event_id>/concluir/", views.api_event_done, name="api_event_done"),
@@ -1,20 +1,22 @@
 from __future__ import annotations
 
 import calendar
+import hashlib
 import json
 import logging
-import re
-import unicodedata
-from urllib.parse import quote as url_quote
 from datetime import date, timedelta
+from io import BytesIO
 
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max, Prefetch
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 
 from accounts.models import Role, User
+from core.badges import counted
+from core.downloads import ranged_file_response
 
 from .models import (
     CalendarEvent,
@@ -34,16 +36,13 @@ def _is_admin(user: User) -> bool:
     return user.role == Role.ADMIN or user.is_superuser
 
 
-def _get_events_qs(user: User):
+def _visible_events(qs, user: User):
     """
-    Retorna queryset de eventos filtrado por permissão:
+    Filtra `qs` (CalendarEvent) por permissão:
     - Admin/Dono: todos os eventos
     - Financeiro: apenas seus próprios eventos (entregas e pagamentos)
     - Vendedor: somente os seus eventos
     """
-    qs = CalendarEvent.objects.select_related(
-        "assigned_to", "quote", "order", "customer"
-    ).prefetch_related("tags", "attachments")
     if _is_admin(user):
         return qs
     base_qs = qs.filter(assigned_to=user)
@@ -54,12 +53,25 @@ def _get_events_qs(user: User):
     return base_qs
 
 
-@login_required
-def calendar_view(request: HttpRequest) -> HttpResponse:
-    """Página principal do calendário com visualização mensal."""
-    today = timezone.localdate()
+def _get_events_qs(user: User):
+    """Eventos visíveis para o usuário, com tudo que o detalhe/popup mostra."""
+    qs = CalendarEvent.objects.select_related(
+        "assigned_to", "quote", "order", "customer"
+    ).prefetch_related(
+        "tags",
+        Prefetch("attachments", queryset=EventAttachment.objects.defer("file_data")),
+    )
+    return _visible_events(qs, user)
+
 
-    # Pegar mês/ano da query string ou usar o atual
+MONTH_NAMES = [
+    "", "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+    "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
+]
+
+
+def _parse_month(request: HttpRequest, today: date) -> tuple[int, int]:
+    """(ano, mês) da query string, ou o mês atual."""
     try:
         year = int(request.GET.get("year", today.year))
         month = int(request.GET.get("month", today.month))
@@ -71,106 +83,151 @@ def calendar_view(request: HttpRequest) -> HttpResponse:
         month, year = 12, year - 1
     elif month > 12:
         month, year = 1, year + 1
+    if not 1 <= year <= 9999:
+        year = today.year
+    return year, month
 
-    # Filtro por vendedor (apenas para admins)
-    seller_filter = request.GET.get("seller")
-    sellers = []
-    if _is_admin(request.user):
-        sellers = User.objects.filter(is_active=True).order_by("first_name", "username")
-
-    # Construir calendário
-    cal = calendar.Calendar(firstweekday=6)  # Domingo primeiro
-    month_days = cal.monthdayscalendar(year, month)
 
-    # Buscar eventos do mês
+def _month_events(request: HttpRequest, year: int, month: int):
+    """Eventos do mês visíveis para o usuário (todos os status, sem JOINs)."""
     first_day = date(year, month, 1)
     last_day = date(year, month, calendar.monthrange(year, month)[1])
-
-    events_qs = _get_events_qs(request.user).filter(
+    qs = _visible_events(CalendarEvent.objects.all(), request.user).filter(
         event_date__gte=first_day,
         event_date__lte=last_day,
-    ).exclude(status=EventStatus.CANCELED)
-
+    )
+    seller_filter = request.GET.get("seller")
     if _is_admin(request.user) and seller_filter:
         try:
-            events_qs = events_qs.filter(assigned_to_id=int(seller_filter))
+            qs = qs.filter(assigned_to_id=int(seller_filter))
         except (ValueError, TypeError):
             pass
+    return qs
 
-    # Agrupar eventos por dia
-    events_by_day: dict[int, list] = {}
-    for event in events_qs:
-        day = event.event_date.day
-        events_by_day.setdefault(day, []).append(event)
-
-    # Construir semanas com dados
-    weeks = []
-    for week in month_days:
-        week_data = []
-        for day in week:
-            if day == 0:
-                week_data.append({"day": 0, "events": [], "is_today": False})
-            else:
-                current = date(year, month, day)
-                day_events = events_by_day.get(day, [])
-                week_data.append({
-                    "day": day,
-                    "events": day_events,
-                    "is_today": current == today,
-                    "is_past": current < today,
-                })
-        weeks.append(week_data)
-
-    # Navegação mês anterior / próximo
-    if month == 1:
-        prev_month, prev_year = 12, year - 1
-    else:
-        prev_month, prev_year = month - 1, year
 
-    if month == 12:
-        next_month, next_year = 1, year + 1
-    else:
-        next_month, next_year = month + 1, year
+def _month_etag(events_qs, user: User, today: date) -> str:
+    """ETag do mês: muda quando algum evento do mês é criado, alterado ou sai dele.
 
-    month_name = [
-        "", "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-        "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
-    ][month]
+    Cancelar/editar atualiza `updated_at` (o evento continua no conjunto,
+    cancelados inclusive); excluir ou mover para outro mês muda a contagem.
+    A data de hoje entra porque "atrasado" depende dela; as etiquetas, porque
+    o feed leva nome/cor. Salvar um cliente toca `updated_at` dos eventos dele
+    (calendar_app/models.py), porque o feed leva o nome do cliente.
+    """
+    stats = events_qs.aggregate(count=Count("id"), last=Max("updated_at"))
+    tags = EventTag.table()
+    raw = f"{user.pk}|{stats['count']}|{stats['last']}|{today}|{sorted(tags.items())}"
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def _month_payload(events_qs, year: int, month: int, today: date) -> dict:
+    """Dados da grade do mês: só os campos que os cartões mostram."""
+    events = list(
+        events_qs.exclude(status=EventStatus.CANCELED)
+        .select_related("customer")
+        .only(
+            "id", "title", "event_type", "status", "event_date", "event_time",
+            "customer__name",
+        )
+    )
+    # Etiquetas como ids (tabela de ligação, sem JOIN); nome/cor vêm de EventTag.table().
+    tag_ids: dict[int, list[int]] = {}
+    links = CalendarEvent.tags.through.objects.filter(
+        calendarevent_id__in=[e.pk for e in events],
+    ).values_list("calendarevent_id", "eventtag_id")
+    for event_id, tag_id in links:
+        tag_ids.setdefault(event_id, []).append(tag_id)
+
+    tags = EventTag.table()
+    return {
+        "year": year,
+        "month": month,
+        "month_name": MONTH_NAMES[month],
+        "today": today.isoformat(),
+        "first_weekday": (date(year, month, 1).weekday() + 1) % 7,  # 0 = domingo
+        "days": calendar.monthrange(year, month)[1],
+        "tags": {str(pk): tag for pk, tag in tags.items()},
+        "events": [
+            {
+                "id": e.pk,
+                "title": e.title,
+                "date": e.event_date.isoformat(),
+                "time": e.event_time.strftime("%H:%M") if e.event_time else "",
+                "status": e.status,
+                "status_display": e.get_status_display(),
+                "event_type_display": e.get_event_type_display(),
+                "is_overdue": e.is_overdue,
+                "customer": e.customer.name if e.customer else "",
+                # ordem da tabela (por nome), como o prefetch mostrava
+                "tags": [pk for pk in tags if pk in tag_ids.get(e.pk, ())],
+            }
+            for e in events
+        ],
+    }
 
-    # Lembretes não lidos do usuário (para hoje)
-    today_reminders = Reminder.objects.filter(
-        event__assigned_to=request.user,
-        remind_date__lte=today,
-        read=False,
-        status=ReminderStatus.SCHEDULED,
-    ).select_related("event")[:10]
 
-    # Todas as tags disponíveis (para o popover de etiquetas)
-    all_tags = EventTag.objects.all()
-    tag_colors = TagColor.choices  # [("#61bd4f", "Verde"), ...]
+@login_required
+def calendar_view(request: HttpRequest) -> HttpResponse:
+    """Página principal do calendário com visualização mensal.
+
+    A grade é desenhada no navegador a partir do feed do mês (`api_month`),
+    embutido na página; a navegação entre meses busca só o feed.
+    """
+    today = timezone.localdate()
+    year, month = _parse_month(request, today)
+
+    # Filtro por vendedor (apenas para admins)
+    seller_filter = request.GET.get("seller")
+    sellers = []
+    if _is_admin(request.user):
+        sellers = User.objects.filter(is_active=True).order_by("first_name", "username")
+
+    month_data = _month_payload(_month_events(request, year, month), year, month, today)
+
+    # Lembretes não lidos do usuário (para hoje)
+    today_reminders = Reminder.due_for(request.user, today)[:10]
 
     context = {
-        "weeks": weeks,
+        "month_data": month_data,
         "month": month,
         "year": year,
-        "month_name": month_name,
-        "prev_month": prev_month,
-        "prev_year": prev_year,
-        "next_month": next_month,
-        "next_year": next_year,
+        "month_name": MONTH_NAMES[month],
         "today": today,
         "sellers": sellers,
         "seller_filter": seller_filter,
         "is_admin": _is_admin(request.user),
         "today_reminders": today_reminders,
         "weekday_names": ["Dom", "Seg", "Ter", "Qua", "Qui", "Sex", "Sáb"],
-        "all_tags": all_tags,
-        "tag_colors": tag_colors,
+        "tag_colors": TagColor.choices,  # [("#61bd4f", "Verde"), ...]
         "event_types": EventType.choices,
     }
     return render(request, "calendar_app/calendar.html", context)
 
 
+@login_required
+def api_month(request: HttpRequest) -> HttpResponse:
+    """GET ?year=&month=[&seller=]: feed JSON da grade do mês.
+
+    Responde 304 quando o ETag do mês (contagem + último `updated_at` dos
+    eventos visíveis ao usuário) bate com If-None-Match.
+    """
+    from django.utils.cache import get_conditional_response
+
+    today = timezone.localdate()
+    year, month = _parse_month(request, today)
+    events_qs = _month_events(request, year, month)
+
+    etag = _month_etag(events_qs, request.user, today)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = JsonResponse(_month_payload(events_qs, year, month, today))
+        response["ETag"] = etag
+    else:
+        response = not_modified
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @login_required
 def upcoming_events(request: HttpRequest) -> HttpResponse:
     """Lista de próximos eventos (7, 15 ou 30 dias)."""
@@ -296,7 +353,9 @@ def event_mark_canceled(request: HttpRequest, event_id: int) -> HttpResponse:
 @require_POST
 def reminder_dismiss(request: HttpRequest, reminder_id: int) -> JsonResponse:
     """Dispensa um lembrete via AJAX."""
-    reminder = get_object_or_404(Reminder, pk=reminder_id, event__assigned_to=request.user)
+    reminder = get_object_or_404(
+        Reminder.objects.select_related("event"), pk=reminder_id, event__assigned_to=request.user,
+    )
     reminder.dismiss()
     return JsonResponse({"success": True})
 
@@ -305,7 +364,9 @@ def reminder_dismiss(request: HttpRequest, reminder_id: int) -> JsonResponse:
 @require_POST
 def reminder_mark_read(request: HttpRequest, reminder_id: int) -> JsonResponse:
     """Marca lembrete como lido via AJAX."""
-    reminder = get_object_or_404(Reminder, pk=reminder_id, event__assigned_to=request.user)
+    reminder = get_object_or_404(
+        Reminder.objects.select_related("event"), pk=reminder_id, event__assigned_to=request.user,
+    )
     reminder.mark_as_read()
     return JsonResponse({"success": True})
 
@@ -390,35 +451,11 @@ def create_event(request: HttpRequest) -> HttpResponse:
 @login_required
 def reminders_api(request: HttpRequest) -> JsonResponse:
     """API para buscar lembretes não lidos (para badge no navbar)."""
-    today = timezone.localdate()
-    count = Reminder.objects.filter(
-        event__assigned_to=request.user,
-        remind_date__lte=today,
-        read=False,
-        status=ReminderStatus.SCHEDULED,
-    ).count()
-
-    reminders = Reminder.objects.filter(
-        event__assigned_to=request.user,
-        remind_date__lte=today,
-        read=False,
-        status=ReminderStatus.SCHEDULED,
-    ).select_related("event")[:5]
-
-    data = {
+    count, reminders = counted(Reminder.due_for(request.user), 5)
+    return JsonResponse({
         "count": count,
-        "reminders": [
-            {
-                "id": r.id,
-                "message": r.message or r.event.title,
-                "event_id": r.event_id,
-                "event_date": r.event.event_date.strftime("%d/%m/%Y"),
-                "event_type": r.event.get_event_type_display(),
-            }
-            for r in reminders
-        ],
-    }
-    return JsonResponse(data)
+        "reminders": [r.badge_item() for r in reminders],
+    })
 
 
 # ---------------------------------------------------------------------------
@@ -665,7 +702,7 @@ def api_attachment_upload(request: HttpRequest, event_id: int) -> JsonResponse:
         event=event,
         filename=uploaded.name,
         content_type=safe_ct,
-        file_data=uploaded.read(),
+        file=uploaded,
         file_size=uploaded.size,
         uploaded_by=request.user,
     )
@@ -685,35 +722,39 @@ def api_attachment_upload(request: HttpRequest, event_id: int) -> JsonResponse:
 
 @login_required
 def api_attachment_download(request: HttpRequest, attachment_id: int) -> HttpResponse:
-    """GET: faz download de um anexo (retorna bytes com Content-Disposition)."""
-    attachment = get_object_or_404(EventAttachment, pk=attachment_id)
+    """GET: faz download de um anexo (streaming do arquivo, aceita Range)."""
+    attachment = get_object_or_404(
+        EventAttachment.objects.defer("file_data").select_related("event"), pk=attachment_id,
+    )
     # Verificar permissão
-    event = attachment.event
-    if not _is_admin(request.user) and event.assigned_to != request.user:
+    if not _is_admin(request.user) and attachment.event.assigned_to_id != request.user.pk:
         return JsonResponse({"error": "Sem permissão."}, status=403)
 
-    fn = attachment.filename
-    nfkd = unicodedata.normalize('NFKD', fn)
-    ascii_name = nfkd.encode('ascii', 'ignore').decode('ascii')
-    ascii_name = re.sub(r'[^\w.\-]', '_', ascii_name) or 'download'
-    disposition = (
-        f'attachment; filename="{ascii_name}"; '
-        f"filename*=UTF-8''{url_quote(fn)}"
+    if attachment.file:
+        fh = attachment.file.open("rb")
+        size = attachment.file.size
+    else:
+        # Anexo antigo ainda no banco (antes de migrate_attachment_blobs)
+        data = bytes(
+            EventAttachment.objects.values_list("file_data", flat=True).get(pk=attachment.pk) or b""
+        )
+        fh, size = BytesIO(data), len(data)
+    return ranged_file_response(
+        request, fh, size=size,
+        filename=attachment.filename, content_type=attachment.content_type,
     )
-    response = HttpResponse(attachment.file_data, content_type=attachment.content_type)
-    response["Content-Disposition"] = disposition
-    return response
 
 
 @login_required
 @require_POST
 def api_attachment_delete(request: HttpRequest, attachment_id: int) -> JsonResponse:
     """POST: exclui um anexo."""
-    attachment = get_object_or_404(EventAttachment, pk=attachment_id)
-    event = attachment.event
-    if not _is_admin(request.user) and event.assigned_to != request.user:
+    attachment = get_object_or_404(
+        EventAttachment.objects.defer("file_data").select_related("event"), pk=attachment_id,
+    )
+    if not _is_admin(request.user) and attachment.event.assigned_to_id != request.user.pk:
         return JsonResponse({"error": "Sem permissão."}, status=403)
-    attachment.delete()
+    attachment.delete()  # o arquivo sai junto (post_delete em models.py)
     return JsonResponse({"success": True})
 
 
@@ -724,17 +765,7 @@ def api_attachment_delete(request: HttpRequest, attachment_id: int) -> JsonRespo
 @login_required
 def api_tags_list(request: HttpRequest) -> JsonResponse:
     """GET: lista todas as tags disponíveis."""
-    tags = EventTag.objects.all()
-    data = [
-        {
-            "id": t.id,
-            "name": t.name,
-            "color": t.color,
-            "text_color": t.text_color,
-        }
-        for t in tags
-    ]
-    return JsonResponse({"tags": data})
+    return JsonResponse({"tags": list(EventTag.table().values())})
 
 
 @login_required
@@ -824,6 +855,8 @@ def api_event_tag_toggle(request: HttpRequest, event_id: int, tag_id: int) -> Js
     else:
         event.tags.add(tag)
         action = "added"
+    # M2M não toca updated_at; o ETag do mês (api_month) depende dele
+    event.save(update_fields=["updated_at"])
 
     return JsonResponse({
         "success": True,
@@ -119,6 +119,24 @@ else:
     }
 
 
+# Cache
+# "default" fica em memória do processo (rate limit, etc.). "shared" é uma
+# tabela no próprio banco, visível a todos os workers do gunicorn: guarda os
+# números de versão dos caches em memória (core/versioned_cache.py) sem
+# precisar de Redis. Tabela criada por `createcachetable` no start.sh.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_shared_cache",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -191,6 +209,23 @@ elif _IS_PRODUCTION:
 else:
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# PDFs de proposta já renderizados (sales/pdf_cache.py) ficam no volume de
+# mídia; acima deste tamanho os menos usados recentemente são apagados.
+PROPOSAL_PDF_CACHE_MAX_BYTES = int(os.environ.get('PROPOSAL_PDF_CACHE_MAX_MB', '200')) * 1024 * 1024
+
+# Processos usados pelo worker de tarefas para gerar PDFs em paralelo
+# (core/jobs.py). 0 = automático (núcleos da máquina, até 4); 1 = sem pool.
+JOB_PROCESSES = int(os.environ.get('JOB_PROCESSES', '0'))
+
+# Espera máxima do long-poll de /api/badges/?wait=N (core/badges.py). Cada
+# espera prende um worker síncrono do gunicorn: 0 (padrão) desliga; só
+# ligue com workers gthread/ASGI.
+BADGE_LONG_POLL_SECONDS = int(os.environ.get('BADGE_LONG_POLL_SECONDS', '0'))
+
+# Duração de cada conexão do stream SSE /api/live/ (core/live.py). Ao fim o
+# navegador reconecta sozinho com Last-Event-ID.
+LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS', '300'))
+
 # Authentication settings
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'core:index'
@@ -1,14 +1,25 @@
+import posixpath
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.auth.decorators import login_required
+from django.http import Http404
 from django.urls import path, re_path, include
 from django.views.static import serve
 
 
+# Served only through views that check per-object permissions (calendar
+# attachments: calendar_app:api_attachment_download; job results:
+# core:job_download) or never served at all (PDF cache and PDF image assets).
+PRIVATE_MEDIA_PREFIXES = ("calendar/", "jobs/", "pdf_cache/", "pdf_assets/")
+
+
 @login_required
 def protected_media(request, path):
     """Serve media files only to authenticated users."""
+    if posixpath.normpath(path).lstrip("/").startswith(PRIVATE_MEDIA_PREFIXES):
+        raise Http404
     return serve(request, path, document_root=settings.MEDIA_ROOT)
 
 
@@ -6,6 +6,7 @@ from .models import (
     CommunicationHistory,
     QuoteTemplate, QuoteTemplateItem,
     Architect,
+    BackgroundJob,
 )
 
 
@@ -112,6 +113,17 @@ class AuditLogAdmin(AdminOnly, admin.ModelAdmin):
     def has_change_permission(self, request, obj=None): return False
 
 
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(AdminOnly, admin.ModelAdmin):
+    list_display = ("label", "status", "created_by", "attempts", "created_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("label", "created_by__username")
+    readonly_fields = ("label", "handler", "params", "created_by", "attempts", "error", "result",
+                       "result_name", "content_type", "created_at", "started_at", "finished_at")
+
+    def has_add_permission(self, request):              return False
+
+
 @admin.register(SalesGoal)
 class SalesGoalAdmin(AdminOnly, admin.ModelAdmin):
     list_display = ("goal_type", "seller", "period", "target_value")
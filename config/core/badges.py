@@ -0,0 +1,69 @@
+"""Contadores do navbar (notificações + lembretes) com versão por usuário.
+
+O navbar consultava `notifications_api` e `reminders_api` separadamente, e
+cada uma rodava o mesmo filtro duas vezes (lista + count()). `/api/badges/`
+devolve as duas contagens e os itens mais recentes com uma query cada
+(contagem via janela `COUNT(*) OVER ()` na própria lista).
+
+Cada usuário tem um número de versão no cache compartilhado (tabela no
+banco, vale entre workers). `Notification.send`, marcar como lida e
+qualquer mudança em lembretes/eventos do usuário chamam `bump()` após o
+commit. O ETag da resposta é essa versão + a data de hoje (lembretes
+"vencem" à meia-noite sem escrita nenhuma), então o polling com
+If-None-Match custa uma leitura de cache e devolve 304.
+"""
+from __future__ import annotations
+
+import time
+
+from django.db import transaction
+from django.db.models import Count, Window
+
+from .versioned_cache import _shared_cache
+
+
+def _key(user_id: int) -> str:
+    return f"badges:{user_id}:version"
+
+
+def version(user_id: int) -> int:
+    """Versão atual dos contadores do usuário."""
+    cache = _shared_cache()
+    value = cache.get(_key(user_id))
+    if value is None:
+        # Começa do relógio, não de 1: se a chave sumir do cache, um ETag
+        # antigo no navegador não pode coincidir com a versão recriada.
+        cache.add(_key(user_id), time.time_ns() // 1000, timeout=None)
+        value = cache.get(_key(user_id))
+    return value
+
+
+def _incr(user_id: int) -> None:
+    cache = _shared_cache()
+    try:
+        cache.incr(_key(user_id))
+    except ValueError:
+        cache.add(_key(user_id), time.time_ns() // 1000, timeout=None)
+
+
+def bump(*user_ids) -> None:
+    """Os contadores destes usuários mudaram (vale a partir do commit)."""
+    ids = {uid for uid in user_ids if uid}
+    if ids:
+        transaction.on_commit(lambda: [_incr(uid) for uid in ids])
+
+
+def counted(qs, limit: int) -> tuple[int, list]:
+    """(total, primeiros `limit`) de `qs` numa query só."""
+    rows = list(qs.annotate(_total=Window(Count("pk")))[:limit])
+    return (rows[0]._total if rows else 0), rows
+
+
+def wait_for_change(user_id: int, current: int, timeout: float, interval: float = 1.0) -> int:
+    """Espera a versão sair de `current` (até `timeout` s); devolve a versão."""
+    deadline = time.monotonic() + timeout
+    value = version(user_id)
+    while value == current and time.monotonic() < deadline:
+        time.sleep(interval)
+        value = version(user_id)
+    return value
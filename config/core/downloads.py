@@ -0,0 +1,86 @@
+"""Download de arquivos do volume de mídia em streaming, com suporte a Range.
+
+`FileResponse` já lê o arquivo em blocos (nada de carregar tudo na memória
+do worker), mas ignora o cabeçalho Range: o leitor de PDF do navegador e
+o player de vídeo do celular pedem pedaços e recebiam o arquivo inteiro.
+`ranged_file_response` responde 206 para um intervalo único e 416 para um
+intervalo fora do arquivo; o resto (sem Range, vários intervalos, If-Range)
+cai no `FileResponse` normal com o arquivo inteiro.
+"""
+from __future__ import annotations
+
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None | bool:
+    """(início, fim inclusivo); None = ignorar o Range; False = fora do arquivo."""
+    m = _RANGE_RE.match(header.replace(" ", ""))
+    if not m or m.group(1) == m.group(2) == "":
+        return None
+    first, last = m.groups()
+    if size == 0:
+        return False
+    if first == "":
+        # "bytes=-500": os últimos 500 bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(fh, start: int, end: int):
+    try:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fh.read(min(BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def ranged_file_response(request, fh, *, size: int, filename: str, content_type: str,
+                         as_attachment: bool = True) -> HttpResponse:
+    """Resposta em streaming para o arquivo aberto `fh` (modo binário, com seek).
+
+    A resposta fecha `fh` ao terminar.
+    """
+    header = request.headers.get("Range", "")
+    byte_range = None
+    if header and "If-Range" not in request.headers and request.method in ("GET", "HEAD"):
+        byte_range = _parse_range(header, size)
+
+    if byte_range is False:
+        fh.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range is None:
+        response = FileResponse(
+            fh, as_attachment=as_attachment, filename=filename, content_type=content_type,
+        )
+        response["Content-Length"] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(fh, start, end), status=206, content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    response["Accept-Ranges"] = "bytes"
+    return response
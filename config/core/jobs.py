@@ -0,0 +1,177 @@
+"""Fila de tarefas no banco (sem broker) para exportações pesadas.
+
+PDFs de proposta, de fornecedor (ZIP com um PDF por fornecedor) e de pedido
+eram gerados dentro do request; com 2 workers do gunicorn e timeout de 120s,
+uma proposta grande prendia um worker. Agora a view só valida o formulário e
+grava um `BackgroundJob`; o processo `manage.py run_jobs` (iniciado pelo
+start.sh) pega a tarefa, chama o handler e guarda o arquivo no volume de
+mídia. O navegador acompanha em /tarefas/<id>/ e baixa quando fica pronto.
+
+Handler: função importável (caminho "app.modulo.funcao") que recebe os
+`params` da tarefa como kwargs e devolve (nome do arquivo, content type,
+bytes ou arquivo aberto) — ou None, se não gera download (ex.: normalizar
+uma imagem). Os params vão para um JSONField — use só tipos
+JSON (Decimal como str). Trabalho pesado de CPU que se divide em partes
+independentes pode usar `process_pool()`.
+
+Concorrência: a tarefa é reservada com um UPDATE condicional
+(status=PENDING → RUNNING); se dois workers disputarem a mesma, só um
+UPDATE afeta a linha. Tarefa RUNNING há mais de `STALE_AFTER` (worker morto
+no meio) volta para a fila até `MAX_ATTEMPTS` tentativas.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundJob, JobStatus
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=10)
+MAX_ATTEMPTS = 3
+KEEP_FOR = timedelta(days=1)
+
+
+def enqueue(handler: str, label: str, user=None, **params) -> BackgroundJob:
+    """Grava a tarefa na fila; o worker a executa assim que o commit acontecer."""
+    return BackgroundJob.objects.create(
+        handler=handler,
+        label=label[:120],
+        params=params,
+        created_by=user,
+    )
+
+
+def _requeue_stale() -> None:
+    limit = timezone.now() - STALE_AFTER
+    stale = BackgroundJob.objects.filter(status=JobStatus.RUNNING, started_at__lt=limit)
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=JobStatus.FAILED,
+        error="Tempo esgotado.",
+        finished_at=timezone.now(),
+    )
+    stale.update(status=JobStatus.PENDING)
+
+
+def claim_next() -> BackgroundJob | None:
+    """Reserva a tarefa pendente mais antiga, ou None se a fila está vazia."""
+    _requeue_stale()
+    candidates = (
+        BackgroundJob.objects.filter(status=JobStatus.PENDING)
+        .order_by("created_at")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = BackgroundJob.objects.filter(pk=pk, status=JobStatus.PENDING).update(
+            status=JobStatus.RUNNING,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return BackgroundJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job: BackgroundJob) -> BackgroundJob:
+    """Executa uma tarefa já reservada e grava o resultado (ou o erro)."""
+    try:
+        handler = import_string(job.handler)
+        result = handler(**job.params)
+        filename, content_type = "", ""
+        if result is not None:
+            filename, content_type, data = result
+            content = ContentFile(data) if isinstance(data, bytes) else File(data, name=filename)
+            try:
+                job.result.save(filename, content, save=False)
+            finally:
+                content.close()
+    except Exception as exc:
+        logger.exception("Falha na tarefa %s (%s)", job.pk, job.handler)
+        job.status = JobStatus.FAILED
+        job.error = str(exc)[:1000] or exc.__class__.__name__
+    else:
+        job.status = JobStatus.DONE
+        job.result_name = filename
+        job.content_type = content_type
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "result", "result_name", "content_type", "finished_at"])
+    return job
+
+
+def run_pending(limit: int | None = None) -> int:
+    """Executa tarefas até esvaziar a fila (ou `limit`); devolve quantas rodaram."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def purge_finished(older_than: timedelta = KEEP_FOR) -> int:
+    """Apaga tarefas terminadas há mais de `older_than`, com os arquivos."""
+    limit = timezone.now() - older_than
+    old = BackgroundJob.objects.filter(
+        status__in=[JobStatus.DONE, JobStatus.FAILED], finished_at__lt=limit,
+    )
+    count = 0
+    for job in old.iterator():
+        if job.result:
+            job.result.delete(save=False)
+        job.delete()
+        count += 1
+    return count
+
+
+# ── Pool de processos para handlers CPU-bound ───────────────────────────────
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_size() -> int:
+    return getattr(settings, "JOB_PROCESSES", None) or min(4, os.cpu_count() or 1)
+
+
+def process_pool() -> ProcessPoolExecutor | None:
+    """Pool de processos do worker, criado no primeiro uso e reaproveitado.
+
+    Usa "spawn" (nada de conexão de banco herdada por fork); cada processo faz
+    `django.setup()` para poder receber instâncias de modelo, mas não deve
+    consultar o banco. None quando há um só processo disponível — rode na hora.
+    """
+    global _pool
+    if pool_size() < 2:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=pool_size(),
+                mp_context=multiprocessing.get_context("spawn"),
+                # django.setup direto: este módulo importa modelos e não
+                # pode ser carregado antes do setup no processo novo
+                initializer=django.setup,
+            )
+        return _pool
+
+
+def discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Descarta um pool quebrado (processo filho morto); o próximo uso cria outro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,156 @@
+"""Stream SSE (/api/live/) de notificações novas e lembretes vencidos.
+
+Cada aba aberta consultava /api/badges/ a cada 30s. Com o site servido por
+ASGI (config/asgi.py, worker assíncrono do gunicorn — ver start.sh), o
+navegador abre um EventSource e recebe os avisos na hora.
+
+Fan-out sem Redis: quem gera o aviso grava uma linha em `LiveEvent`
+(Notification criada → core/models.py; lembrete vencido →
+`Reminder.push_due`, chamado pelo worker de tarefas). Em cada processo, um
+único `_Hub` lê as linhas novas pelo id crescente a cada `POLL_SECONDS` —
+uma query por processo, não por conexão — e entrega nas filas dos streams
+abertos do destinatário. Reconexão manda Last-Event-ID e recebe o que
+perdeu. Um aviso cuja transação termina depois da de um id maior pode ser
+pulado pelo hub; como o navbar recarrega os contadores a cada aviso, o
+número se corrige no seguinte.
+
+Servido por WSGI (gunicorn síncrono), o endpoint responde 204: o
+EventSource desiste e o navbar continua no polling de /api/badges/.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import LiveEvent
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 2.0
+HEARTBEAT_SECONDS = 20.0
+KEEP_FOR = timedelta(days=1)
+
+
+class _Hub:
+    """Leitor único de `LiveEvent` por event loop, que distribui por usuário."""
+
+    def __init__(self):
+        self.queues: dict[int, set[asyncio.Queue]] = {}
+        self.last_id = 0
+        self.task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Fila que recebe os eventos do usuário com id > `last_id` atual."""
+        async with self._lock:
+            if self.task is None:
+                result = await LiveEvent.objects.aaggregate(last=Max("id"))
+                self.last_id = result["last"] or 0
+                self.task = asyncio.create_task(self._run())
+        queue = asyncio.Queue()
+        self.queues.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self.queues.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.queues[user_id]
+
+    async def _run(self) -> None:
+        try:
+            while self.queues:
+                await asyncio.sleep(POLL_SECONDS)
+                rows = LiveEvent.objects.filter(id__gt=self.last_id).order_by("id")[:500]
+                try:
+                    async for event in rows:
+                        self.last_id = event.id
+                        for queue in self.queues.get(event.user_id, ()):
+                            queue.put_nowait(event)
+                except Exception:
+                    # banco fora do ar por um instante: tenta de novo na próxima volta
+                    logger.warning("Falha ao ler LiveEvent", exc_info=True)
+        finally:
+            self.task = None
+
+
+_hubs: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _hub() -> _Hub:
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = _Hub()
+    return _hubs[loop]
+
+
+def _format(event: LiveEvent) -> str:
+    data = json.dumps(event.payload, ensure_ascii=False)
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n"
+
+
+async def _stream(user_id: int, last_event_id: int | None):
+    hub = _hub()
+    queue = await hub.subscribe(user_id)
+    try:
+        yield "retry: 5000\n\n"
+        sent = last_event_id or 0
+        if last_event_id is not None:
+            # Perdidos durante a reconexão; os que o hub também entregar
+            # depois são descartados pelo id.
+            missed = LiveEvent.objects.filter(
+                user_id=user_id, id__gt=last_event_id,
+            ).order_by("id")[:100]
+            async for event in missed:
+                sent = event.id
+                yield _format(event)
+
+        deadline = time.monotonic() + settings.LIVE_STREAM_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), min(HEARTBEAT_SECONDS, remaining))
+            except TimeoutError:
+                yield ": ping\n\n"  # mantém a conexão viva em proxies
+                continue
+            if event.id > sent:
+                sent = event.id
+                yield _format(event)
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+async def live_stream(request):
+    """GET: text/event-stream com os avisos do usuário logado."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=403)
+    if not isinstance(request, ASGIRequest):
+        # WSGI: um stream prenderia um worker síncrono. 204 = EventSource para.
+        return HttpResponse(status=204)
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+    response = StreamingHttpResponse(
+        _stream(user.pk, last_event_id), content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def purge(older_than: timedelta = KEEP_FOR) -> int:
+    """Apaga avisos antigos (já entregues ou perdidos)."""
+    deleted, _ = LiveEvent.objects.filter(created_at__lt=timezone.now() - older_than).delete()
+    return deleted
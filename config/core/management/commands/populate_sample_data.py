@@ -3,6 +3,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from accounts.models import User, Role
 from core.models import Customer, Supplier, ShippingCompany
+from sales import snapshots
 from sales.models import Quote, QuoteItem, QuoteStatus, FreightResponsible
 
 
@@ -253,8 +254,9 @@ class Command(BaseCommand):
                 },
             ]
 
-            for item_data in items:
-                QuoteItem.objects.create(quote=quote, **item_data)
+            with snapshots.batch():
+                for item_data in items:
+                    QuoteItem.objects.create(quote=quote, **item_data)
 
             self.stdout.write(self.style.SUCCESS(f'✓ Created sample quote: {quote.number} with {len(items)} items'))
 
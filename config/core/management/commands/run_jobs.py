@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from calendar_app.models import Reminder
+from core import live
+from core.jobs import purge_finished, run_pending
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano (PDFs/ZIPs) gravadas no banco'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Esvazia a fila e sai')
+        parser.add_argument('--interval', type=float, default=1.0, help='Segundos entre consultas à fila vazia')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = run_pending()
+            self.stdout.write(self.style.SUCCESS(f'{count} tarefa(s) executada(s).'))
+            return
+
+        self.stdout.write('Aguardando tarefas...')
+        last_purge = 0.0
+        last_reminders = 0.0
+        while True:
+            close_old_connections()
+            if time.monotonic() - last_purge > 3600:
+                purge_finished()
+                live.purge()
+                last_purge = time.monotonic()
+            if time.monotonic() - last_reminders > 60:
+                # lembretes que venceram na virada do dia → aviso ao vivo (SSE)
+                Reminder.push_due()
+                last_reminders = time.monotonic()
+            if not run_pending(limit=20):
+                time.sleep(options['interval'])
@@ -0,0 +1,286 @@
+"""Métricas de vendas dos painéis (home e dashboard), com cache curto.
+
+As duas telas mostram os mesmos números: totais do vendedor no mês de vendas,
+conversão por coorte, mês anterior, série de 6 meses e, para o admin, ranking
+da equipe e meta coletiva. Aqui eles são calculados uma vez por
+(vendedor, mês de vendas) — ou por mês, no caso da equipe — e guardados no
+cache COMPARTILHADO por `METRICS_TTL` segundos, para que recarregar a página
+inicial custe uma leitura de cache.
+
+Quando o resumo mensal muda (venda convertida, orçamento editado/excluído),
+`invalidate_metrics` apaga as entradas afetadas após o commit; o TTL cobre o
+resto (metas editadas no admin, virada do dia).
+"""
+from __future__ import annotations
+
+from datetime import date as date_type, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Role
+from sales.models import (
+    SOLD_STATUSES,
+    QuoteItem,
+    QuoteStatus,
+    SalesMonthRollup,
+    sales_month_start,
+)
+from sales.rollups import next_sales_month_start
+
+from .models import GoalType, SalesGoal
+from .versioned_cache import _shared_cache
+
+METRICS_TTL = 60
+CHART_MONTHS = 6
+
+
+# ── Mês de vendas (25 → 24) ─────────────────────────────────────────────────
+def sales_month_label(start: date_type) -> str:
+    """Label for a sales month: its closing calendar month, e.g. 'Jul/25'."""
+    close = (start.replace(day=28) + timedelta(days=10)).replace(day=1)
+    return close.strftime("%b/%y")
+
+
+def month_bounds(day: date_type) -> tuple[date_type, date_type]:
+    """Start (25th) and end (24th) of the sales month containing `day`."""
+    month_start = sales_month_start(day)
+    month_end = next_sales_month_start(month_start) - timedelta(days=1)
+    return month_start, month_end
+
+
+def prev_month_bounds(month_start: date_type) -> tuple[date_type, date_type]:
+    """Bounds of the sales month immediately before the one at `month_start`."""
+    prev_start = sales_month_start(month_start - timedelta(days=1))
+    return prev_start, month_start - timedelta(days=1)
+
+
+def last_n_month_starts(day: date_type, n: int = CHART_MONTHS) -> list[date_type]:
+    starts = []
+    cur = sales_month_start(day)
+    for _ in range(n):
+        starts.append(cur)
+        cur = sales_month_start(cur - timedelta(days=1))
+    starts.reverse()
+    return starts
+
+
+# ── Leitura do resumo mensal ────────────────────────────────────────────────
+def _rollups_by_month(month_starts: list[date_type], seller_id=None) -> dict:
+    """{início do mês: [SalesMonthRollup, ...]} para os meses pedidos (1 query)."""
+    qs = SalesMonthRollup.objects.filter(month_start__in=month_starts)
+    if seller_id is not None:
+        qs = qs.filter(seller_id=seller_id)
+    else:
+        qs = qs.select_related("seller")
+    by_month = {m: [] for m in month_starts}
+    for r in qs:
+        by_month[r.month_start].append(r)
+    return by_month
+
+
+def _rollup_total(rollups, attr: str):
+    return sum((getattr(r, attr) for r in rollups), Decimal("0") if attr == "sold_total" else 0)
+
+
+def _status_breakdown(rollups) -> tuple[list[str], list[int]]:
+    """Contagem por status (orçados no mês), na ordem de QuoteStatus."""
+    labels, values = [], []
+    for status, field in SalesMonthRollup.STATUS_FIELDS.items():
+        n = sum(getattr(r, field) for r in rollups)
+        if n:
+            labels.append(QuoteStatus(status).label)
+            values.append(n)
+    return labels, values
+
+
+def _seller_ranking(rollups, limit: int = 10) -> list[dict]:
+    ranking = [
+        {"seller__username": r.seller.username, "total": r.sold_total, "count": r.sold_count}
+        for r in rollups if r.sold_count
+    ]
+    return sorted(ranking, key=lambda x: x["total"], reverse=True)[:limit]
+
+
+def _conversion_rate(cohort_sold: int, quotes: int):
+    # Conversão por coorte: dos orçamentos criados no ciclo, quantos viraram venda
+    return round(cohort_sold / quotes * 100, 1) if quotes > 0 else 0
+
+
+# ── Cálculo ─────────────────────────────────────────────────────────────────
+def _compute_personal(seller_id: int, today: date_type) -> dict:
+    month_starts = last_n_month_starts(today)
+    month_start = month_starts[-1]
+    prev_month_start, _ = prev_month_bounds(month_start)
+    rollups = _rollups_by_month(month_starts, seller_id=seller_id)
+    month = rollups[month_start]
+
+    total_sold = _rollup_total(month, "sold_total")
+    quotes_count = _rollup_total(month, "quotes_count")
+    converted_count = _rollup_total(month, "sold_count")
+    status_labels, status_values = _status_breakdown(month)
+    return {
+        "total_sold": total_sold,
+        "quotes_count": quotes_count,
+        "converted_count": converted_count,
+        "conversion_rate": _conversion_rate(sum(r.cohort_sold_count for r in month), quotes_count),
+        "avg_ticket": (
+            round(total_sold / converted_count, 2) if converted_count > 0 else Decimal("0")
+        ),
+        "avg_discount": (
+            _rollup_total(month, "sold_discount_sum") / converted_count
+            if converted_count > 0 else 0
+        ),
+        "prev_total": _rollup_total(rollups[prev_month_start], "sold_total"),
+        "chart_labels": [sales_month_label(m) for m in month_starts],
+        "chart_values": [float(_rollup_total(rollups[m], "sold_total")) for m in month_starts],
+        "status_labels": status_labels,
+        "status_values": status_values,
+    }
+
+
+def _collective_goal(today: date_type):
+    # Meta coletiva cadastrada tem prioridade; sem ela, soma das metas individuais
+    goal = (
+        SalesGoal.objects.filter(
+            goal_type=GoalType.COLLECTIVE,
+            period_start__lte=today,
+            period_end__gte=today,
+        )
+        .order_by("-period_start", "-id")
+        .first()
+    )
+    if goal and goal.target_value > 0:
+        total = goal.target_value
+    else:
+        total = SalesGoal.objects.filter(
+            goal_type=GoalType.INDIVIDUAL,
+            period_start__lte=today,
+            period_end__gte=today,
+            seller__role=Role.SELLER,
+        ).aggregate(total=Sum("target_value"))["total"] or Decimal("0")
+    return total if total > 0 else None
+
+
+def _compute_team(today: date_type) -> dict:
+    month_starts = last_n_month_starts(today)
+    month_start = month_starts[-1]
+    rollups = _rollups_by_month(month_starts)
+    month = rollups[month_start]
+
+    quotes_count = _rollup_total(month, "quotes_count")
+    total_sold = _rollup_total(month, "sold_total")
+    collective_goal = _collective_goal(today)
+    status_labels, status_values = _status_breakdown(month)
+
+    top_products = list(
+        QuoteItem.objects.filter(quote__status__in=SOLD_STATUSES)
+        .annotate(sold_on=Coalesce("quote__sale_date", "quote__quote_date"))
+        .filter(sold_on__gte=month_start)
+        .values("product_name")
+        .annotate(
+            total_revenue=Sum(F("quantity") * F("unit_value")),
+            total_qty=Sum("quantity"),
+        )
+        .order_by("-total_revenue")[:10]
+    )
+    discounts = sorted(
+        (
+            (r.seller.username, r.sold_discount_sum / r.discounted_count)
+            for r in month if r.discounted_count
+        ),
+        key=lambda d: d[1], reverse=True,
+    )[:10]
+
+    return {
+        "total_sold": total_sold,
+        "quotes_count": quotes_count,
+        "converted_count": _rollup_total(month, "sold_count"),
+        "conversion_rate": _conversion_rate(sum(r.cohort_sold_count for r in month), quotes_count),
+        "seller_ranking": _seller_ranking(month),
+        "collective_goal": collective_goal,
+        "collective_goal_pct": (
+            round(float(total_sold) / float(collective_goal) * 100, 1) if collective_goal else 0
+        ),
+        "chart_labels": [sales_month_label(m) for m in month_starts],
+        "chart_values": [float(_rollup_total(rollups[m], "sold_total")) for m in month_starts],
+        "chart_counts": [_rollup_total(rollups[m], "sold_count") for m in month_starts],
+        "status_labels": status_labels,
+        "status_values": status_values,
+        "top_products": top_products,
+        "discount_labels": [d[0] for d in discounts],
+        "discount_values": [round(float(d[1]), 1) for d in discounts],
+    }
+
+
+# Painel de quem não é admin: mesmas chaves, sem consultar nada.
+EMPTY_TEAM_METRICS = {
+    "total_sold": Decimal("0"),
+    "quotes_count": 0,
+    "converted_count": 0,
+    "conversion_rate": 0,
+    "seller_ranking": [],
+    "collective_goal": None,
+    "collective_goal_pct": 0,
+    "chart_labels": [],
+    "chart_values": [],
+    "chart_counts": [],
+    "status_labels": [],
+    "status_values": [],
+    "top_products": [],
+    "discount_labels": [],
+    "discount_values": [],
+}
+
+
+# ── Cache ───────────────────────────────────────────────────────────────────
+def _personal_key(seller_id: int, month_start: date_type) -> str:
+    return f"metrics:personal:{seller_id}:{month_start.isoformat()}"
+
+
+def _team_key(month_start: date_type) -> str:
+    return f"metrics:team:{month_start.isoformat()}"
+
+
+def personal_metrics(user, today: date_type | None = None) -> dict:
+    """Números do vendedor no mês de vendas de `today` (padrão: hoje)."""
+    today = today or timezone.localdate()
+    key = _personal_key(user.pk, sales_month_start(today))
+    cache = _shared_cache()
+    data = cache.get(key)
+    if data is None:
+        data = _compute_personal(user.pk, today)
+        cache.set(key, data, METRICS_TTL)
+    return data
+
+
+def team_metrics(today: date_type | None = None) -> dict:
+    """Números da equipe inteira no mês de vendas de `today` (padrão: hoje)."""
+    today = today or timezone.localdate()
+    key = _team_key(sales_month_start(today))
+    cache = _shared_cache()
+    data = cache.get(key)
+    if data is None:
+        data = _compute_team(today)
+        cache.set(key, data, METRICS_TTL)
+    return data
+
+
+def invalidate_metrics(keys) -> None:
+    """Descarta as métricas afetadas por mudanças nos baldes (seller_id, mês).
+
+    Um mês aparece nos painéis dos `CHART_MONTHS` meses seguintes (gráfico e
+    comparação com o mês anterior), então todas essas entradas caem.
+    """
+    cache_keys = set()
+    for seller_id, month_start in keys:
+        current = month_start
+        for _ in range(CHART_MONTHS):
+            cache_keys.add(_personal_key(seller_id, current))
+            cache_keys.add(_team_key(current))
+            current = next_sales_month_start(current)
+    if cache_keys:
+        transaction.on_commit(lambda: _shared_cache().delete_many(list(cache_keys)))
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_background_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20, verbose_name='Tipo')),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento ao vivo',
+                'verbose_name_plural': 'Eventos ao vivo',
+                'indexes': [models.Index(fields=['user', 'id'], name='core_liveev_user_id_cf32cd_idx'), models.Index(fields=['created_at'], name='core_liveev_created_2d6ae9_idx')],
+            },
+        ),
+    ]
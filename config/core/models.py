@@ -1,8 +1,15 @@
+import uuid
+from types import MappingProxyType
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from . import badges
 from .validador import validate_cpf, validate_cnpj
+from .versioned_cache import SingletonCache, VersionedCache
 
 
 class Customer(models.Model):
@@ -185,6 +192,20 @@ class PaymentTariff(models.Model):
         """Tipo cuja tabela de tarifas vale para `payment_type`."""
         return cls.TARIFF_LOOKUP_OVERRIDES.get(payment_type, payment_type)
 
+    @classmethod
+    def table(cls):
+        """Tabela inteira em memória: {tipo: {parcelas: taxa}}, parcelas em ordem.
+
+        Carregada uma vez por processo e invalidada ao salvar/excluir uma
+        tarifa (ver `_tariff_cache`). Somente leitura.
+        """
+        return _tariff_cache.get()
+
+    @classmethod
+    def fees_for(cls, payment_type):
+        """{parcelas: taxa} cadastradas para `payment_type` (já resolvendo o override)."""
+        return cls.table().get(cls.lookup_type(payment_type), _EMPTY_FEES)
+
     @classmethod
     def get_fee(cls, payment_type, installments):
         """Retorna a taxa cadastrada, ou None se a combinação não existir.
@@ -192,13 +213,24 @@ class PaymentTariff(models.Model):
         None = parcelamento indisponível, nunca 0%. Sem tarifa cadastrada não há
         como saber o custo do banco, e assumir zero oferece a parcela de graça.
         """
-        try:
-            tariff = cls.objects.get(
-                payment_type=cls.lookup_type(payment_type), installments=installments
-            )
-            return tariff.fee_percent
-        except cls.DoesNotExist:
-            return None
+        return cls.fees_for(payment_type).get(installments)
+
+
+_EMPTY_FEES = MappingProxyType({})
+
+
+def _load_tariff_table():
+    table = {}
+    rows = PaymentTariff.objects.order_by("payment_type", "installments").values_list(
+        "payment_type", "installments", "fee_percent"
+    )
+    for payment_type, installments, fee_percent in rows:
+        table.setdefault(payment_type, {})[installments] = fee_percent
+    return MappingProxyType({k: MappingProxyType(v) for k, v in table.items()})
+
+
+_tariff_cache = VersionedCache("payment_tariffs", _load_tariff_table)
+_tariff_cache.invalidate_on_change(PaymentTariff)
 
 
 class Architect(models.Model):
@@ -242,9 +274,11 @@ class ArchitectCommission(models.Model):
     
     @classmethod
     def get_commission(cls):
-        """Retorna a comissão configurada."""
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj.commission_percent
+        """Retorna a comissão configurada (lida da memória; ver SingletonCache)."""
+        return _architect_commission_cache.get().commission_percent
+
+
+_architect_commission_cache = SingletonCache(ArchitectCommission)
 
 
 class SalesMarginConfig(models.Model):
@@ -290,10 +324,13 @@ class SalesMarginConfig(models.Model):
     @classmethod
     def get_config(cls):
         """Retorna (total_margin, min_commission, max_commission)."""
-        obj, _ = cls.objects.get_or_create(pk=1)
+        obj = _sales_margin_config_cache.get()
         return obj.total_margin, obj.min_commission, obj.max_commission
 
 
+_sales_margin_config_cache = SingletonCache(SalesMarginConfig)
+
+
 # ──────────────────────────────────────────────────────────────────────
 # Notification System
 # ──────────────────────────────────────────────────────────────────────
@@ -337,6 +374,17 @@ class Notification(models.Model):
     def __str__(self):
         return f"[{self.get_notification_type_display()}] {self.title}"
 
+    def badge_item(self) -> dict:
+        """Item da lista de não lidas do navbar."""
+        return {
+            "id": self.id,
+            "type": self.notification_type,
+            "title": self.title,
+            "message": self.message[:100],
+            "url": self.url,
+            "created_at": self.created_at.strftime("%d/%m %H:%M"),
+        }
+
     def mark_as_read(self):
         if not self.read:
             self.read = True
@@ -353,6 +401,146 @@ class Notification(models.Model):
             url=url,
         )
 
+    @classmethod
+    def send_many(cls, recipients, title, notification_type=NotificationType.GENERAL, message="", url=""):
+        """A mesma notificação para vários usuários (ou ids) com um INSERT só.
+
+        `bulk_create` não dispara o post_save: o badge e o aviso ao vivo de
+        cada destinatário são publicados aqui, depois do commit.
+        """
+        recipient_ids = list(dict.fromkeys(getattr(r, "pk", r) for r in recipients))
+        notifications = cls.objects.bulk_create([
+            cls(
+                recipient_id=recipient_id,
+                notification_type=notification_type,
+                title=title,
+                message=message,
+                url=url,
+            )
+            for recipient_id in recipient_ids
+        ])
+        if notifications:
+            badges.bump(*recipient_ids)
+            live = [
+                LiveEvent(user_id=n.recipient_id, kind="notification", payload=n.badge_item())
+                for n in notifications
+            ]
+            transaction.on_commit(lambda: LiveEvent.objects.bulk_create(live))
+        return notifications
+
+    @classmethod
+    def broadcast(cls, roles, title, notification_type=NotificationType.GENERAL, message="", url="",
+                  exclude=None, superusers=True):
+        """`send_many` para os usuários ativos com um dos `roles` (e os
+        superusuários), resolvidos numa query; `exclude`: usuário a pular."""
+        from django.contrib.auth import get_user_model
+
+        audience = Q(role__in=list(roles))
+        if superusers:
+            audience |= Q(is_superuser=True)
+        recipients = get_user_model().objects.filter(audience, is_active=True)
+        if exclude is not None:
+            recipients = recipients.exclude(pk=getattr(exclude, "pk", exclude))
+        return cls.send_many(
+            recipients.values_list("pk", flat=True), title, notification_type, message=message, url=url,
+        )
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def _notification_changed(sender, instance, **kwargs):
+    # send(), mark_as_read() e exclusões mudam o badge do destinatário
+    badges.bump(instance.recipient_id)
+    if kwargs.get("created"):
+        LiveEvent.objects.create(
+            user_id=instance.recipient_id, kind="notification", payload=instance.badge_item(),
+        )
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Background Jobs (fila no banco — ver core/jobs.py)
+# ──────────────────────────────────────────────────────────────────────
+
+class JobStatus(models.TextChoices):
+    PENDING = "PENDING", "Na fila"
+    RUNNING = "RUNNING", "Gerando"
+    DONE = "DONE", "Pronto"
+    FAILED = "FAILED", "Falhou"
+
+
+def job_result_path(instance: "BackgroundJob", filename: str) -> str:
+    return f"jobs/{instance.pk}/{filename}"
+
+
+class BackgroundJob(models.Model):
+    """Exportação (PDF/ZIP) gerada fora do request pelo `manage.py run_jobs`."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    label = models.CharField(max_length=120, verbose_name="Descrição")
+    handler = models.CharField(max_length=120, verbose_name="Função")
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.PENDING, verbose_name="Status")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name="background_jobs",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    result = models.FileField(upload_to=job_result_path, blank=True)
+    result_name = models.CharField(max_length=200, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.label} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Eventos ao vivo (SSE — ver core/live.py)
+# ──────────────────────────────────────────────────────────────────────
+
+class LiveEvent(models.Model):
+    """Aviso para o navegador do usuário (notificação nova, lembrete vencido).
+
+    Tabela de passagem: o stream SSE lê as linhas novas pelo id crescente;
+    o worker apaga as antigas.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    kind = models.CharField(max_length=20, verbose_name="Tipo")
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Evento ao vivo"
+        verbose_name_plural = "Eventos ao vivo"
+        indexes = [
+            models.Index(fields=["user", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
 
 # ──────────────────────────────────────────────────────────────────────
 # Audit Log
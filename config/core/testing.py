@@ -0,0 +1,18 @@
+"""Apoio comum aos testes das apps."""
+import tempfile
+from pathlib import Path
+
+from django.test import override_settings
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT num diretório temporário por teste, disponível em `self.media`."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.media = Path(media.name)
@@ -1,5 +1,6 @@
 from decimal import Decimal
 
+from django.db import transaction
 from django.test import TestCase
 
 from core.models import PaymentTariff
@@ -39,3 +40,400 @@ class PaymentTariffFeeTests(TestCase):
         self.assertEqual(PaymentTariff.lookup_type("CHEQUE"), "CREDIT_CARD")
         self.assertEqual(PaymentTariff.lookup_type("CREDIT_CARD"), "CREDIT_CARD")
         self.assertEqual(PaymentTariff.lookup_type("PIX"), "PIX")
+
+
+class PaymentTariffCacheTests(TestCase):
+    """Tabela de tarifas em memória: uma leitura por processo, invalidada ao salvar."""
+
+    def setUp(self):
+        # Executa o on_commit: fora de teste a alteração estaria commitada e
+        # a cópia em memória voltaria a ser guardada.
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentTariff.objects.all().delete()
+            PaymentTariff.objects.create(
+                payment_type="CREDIT_CARD", installments=12, fee_percent=Decimal("13.30")
+            )
+
+    def tearDown(self):
+        from core.models import _tariff_cache
+
+        # O rollback do TestCase não dispara sinais; não deixa a tabela deste
+        # teste em memória para os próximos.
+        _tariff_cache.clear_local()
+
+    def test_leituras_repetidas_nao_consultam_o_banco(self):
+        PaymentTariff.get_fee("CREDIT_CARD", 12)
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                PaymentTariff.get_fee("CREDIT_CARD", 12)
+                PaymentTariff.get_fee("CHEQUE", 12)
+                PaymentTariff.fees_for("BOLETO")
+
+    def test_salvar_invalida(self):
+        self.assertEqual(PaymentTariff.get_fee("CREDIT_CARD", 12), Decimal("13.30"))
+        tariff = PaymentTariff.objects.get(payment_type="CREDIT_CARD", installments=12)
+        tariff.fee_percent = Decimal("12.00")
+        tariff.save()
+        self.assertEqual(PaymentTariff.get_fee("CREDIT_CARD", 12), Decimal("12.00"))
+
+    def test_excluir_invalida(self):
+        self.assertIsNotNone(PaymentTariff.get_fee("CREDIT_CARD", 12))
+        PaymentTariff.objects.filter(installments=12).delete()
+        self.assertIsNone(PaymentTariff.get_fee("CREDIT_CARD", 12))
+
+    def test_transacao_pendente_nao_guarda_valor(self):
+        from core.models import _tariff_cache
+        from core.versioned_cache import _MISSING
+
+        with transaction.atomic():
+            PaymentTariff.objects.create(
+                payment_type="BOLETO", installments=4, fee_percent=Decimal("8.50")
+            )
+            self.assertEqual(PaymentTariff.get_fee("BOLETO", 4), Decimal("8.50"))
+        # Nada foi guardado enquanto a transação estava aberta.
+        self.assertIs(_tariff_cache._value, _MISSING)
+
+    def test_versao_compartilhada_recarrega_outros_workers(self):
+        from core.models import _tariff_cache
+
+        from django.core.cache import caches
+
+        PaymentTariff.get_fee("CREDIT_CARD", 12)
+        # Outro worker alterou a tabela: no nosso processo só a versão muda.
+        PaymentTariff.objects.filter(installments=12).update(fee_percent=Decimal("11.00"))
+        caches["shared"].incr(_tariff_cache.version_key)
+        self.assertEqual(PaymentTariff.get_fee("CREDIT_CARD", 12), Decimal("13.30"))
+        _tariff_cache._checked_at = 0.0  # passou o intervalo de reconferência
+        self.assertEqual(PaymentTariff.get_fee("CREDIT_CARD", 12), Decimal("11.00"))
+
+    def test_rollback_nao_desliga_o_cache_das_outras_threads(self):
+        import threading
+
+        from django.test import override_settings
+
+        from core.versioned_cache import VersionedCache
+
+        loads = []
+        cache = VersionedCache("teste:rollback", lambda: loads.append(1) or len(loads))
+        try:
+            with transaction.atomic():
+                cache.invalidate()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # O _bump do on_commit nunca roda; a marca ficou só nesta thread.
+        seen, errors = [], []
+
+        def read():
+            try:
+                seen.append(cache._dirty_aliases())
+                cache.get()
+                cache.get()
+            except Exception as exc:  # pragma: no cover - falha aparece no assert
+                errors.append(exc)
+
+        # Versão num cache em memória: a outra thread não disputa o banco de
+        # testes com a transação deste TestCase.
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with override_settings(CACHES=locmem):
+            worker = threading.Thread(target=read)
+            worker.start()
+            worker.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(seen, [set()])
+        self.assertEqual(len(loads), 1)
+
+
+class SingletonConfigCacheTests(TestCase):
+    """Configurações singleton lidas da memória, invalidadas ao salvar."""
+
+    def tearDown(self):
+        from core.models import _architect_commission_cache, _sales_margin_config_cache
+        from sales.models import _proposal_config_cache
+
+        for cache in (_architect_commission_cache, _sales_margin_config_cache, _proposal_config_cache):
+            cache.clear_local()
+
+    def test_get_config_cria_e_depois_nao_consulta(self):
+        from core.models import SalesMarginConfig
+        from sales.models import ProposalConfig
+
+        # get_or_create no primeiro acesso: commitado, a cópia passa a valer.
+        with self.captureOnCommitCallbacks(execute=True):
+            SalesMarginConfig.objects.all().delete()
+            self.assertEqual(SalesMarginConfig.get_config()[0], Decimal("10.0"))
+            ProposalConfig.get_config()
+        SalesMarginConfig.get_config()
+        ProposalConfig.get_config()
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                SalesMarginConfig.get_config()
+                ProposalConfig.get_config()
+
+    def test_salvar_invalida(self):
+        from core.models import ArchitectCommission
+
+        ArchitectCommission.get_commission()
+        obj = ArchitectCommission.objects.get(pk=1)
+        obj.commission_percent = Decimal("7.5")
+        obj.save()
+        self.assertEqual(ArchitectCommission.get_commission(), Decimal("7.5"))
+
+
+class DashboardMetricsCacheTests(TestCase):
+    """Home e dashboard compartilham as métricas cacheadas por (vendedor, mês)."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+
+        from core.models import Customer
+        from sales.models import Quote
+
+        User = get_user_model()
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.customer = Customer.objects.create(name="Cliente Teste")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quote = Quote.objects.create(
+                number="ORC-1", customer=self.customer, seller=self.seller,
+                total_value_snapshot=Decimal("1000.00"),
+            )
+
+    def tearDown(self):
+        from django.core.cache import caches
+
+        caches["shared"].clear()
+
+    def test_second_read_is_one_cache_hit(self):
+        from core.metrics import personal_metrics
+
+        first = personal_metrics(self.seller)
+        with self.assertNumQueries(1):
+            self.assertEqual(personal_metrics(self.seller), first)
+
+    def test_conversion_invalidates_after_commit(self):
+        from core.metrics import personal_metrics
+        from sales.models import QuoteStatus
+
+        self.assertEqual(personal_metrics(self.seller)["converted_count"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quote.status = QuoteStatus.CONVERTED
+            self.quote.save()
+        self.assertEqual(personal_metrics(self.seller)["converted_count"], 1)
+
+    def test_home_and_dashboard_share_entry(self):
+        from core.metrics import _personal_key, personal_metrics
+        from sales.models import sales_month_start
+        from django.core.cache import caches
+        from django.urls import reverse
+        from django.utils import timezone
+
+        self.client.force_login(self.seller)
+        self.client.get(reverse("core:index"))
+        key = _personal_key(self.seller.pk, sales_month_start(timezone.localdate()))
+        self.assertIsNotNone(caches["shared"].get(key))
+        resp = self.client.get(reverse("core:dashboard"))
+        self.assertEqual(resp.context["my_quotes_count_month"], personal_metrics(self.seller)["quotes_count"])
+
+
+class BadgesApiTests(TestCase):
+    """/api/badges/: contagens + itens numa query cada, ETag por versão do usuário."""
+
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from accounts.models import User
+        from calendar_app.models import CalendarEvent, Reminder
+        from core.models import Notification
+
+        self.user = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.client.force_login(self.user)
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                Notification.send(self.user, f"Aviso {i}")
+            event = CalendarEvent.objects.create(title="Entrega", event_date=today, assigned_to=self.user)
+            Reminder.objects.create(event=event, remind_date=today, message="Entrega hoje")
+            Reminder.objects.create(event=event, remind_date=today + timedelta(days=3))
+        self.url = "/api/badges/"
+
+    def test_counts_and_items_one_query_each(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url).json()
+        self.assertEqual(data["notifications"]["count"], 3)
+        self.assertEqual(data["notifications"]["items"][0]["title"], "Aviso 2")
+        self.assertEqual(data["reminders"]["count"], 1)
+        self.assertEqual(data["reminders"]["items"][0]["message"], "Entrega hoje")
+        sqls = [q["sql"] for q in ctx.captured_queries]
+        self.assertEqual(sum("core_notification" in q for q in sqls), 1)
+        self.assertEqual(sum("calendar_app_reminder" in q for q in sqls), 1)
+
+    def test_unchanged_badges_return_304_until_send(self):
+        from core.models import Notification
+
+        etag = self.client.get(self.url)["ETag"]
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.send(self.user, "Nova")
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["notifications"]["count"], 4)
+
+        etag = resp["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/notifications/mark-all-read/")
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.json()["notifications"]["count"], 0)
+
+    def test_reminder_dismiss_changes_etag(self):
+        from calendar_app.models import Reminder
+
+        etag = self.client.get(self.url)["ETag"]
+        reminder = Reminder.objects.get(message="Entrega hoje")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/calendario/lembrete/{reminder.pk}/dispensar/")
+        resp = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["reminders"]["count"], 0)
+
+    def test_long_poll_is_capped_by_setting(self):
+        import time
+
+        from django.test import override_settings
+
+        etag = self.client.get(self.url)["ETag"]
+        with override_settings(BADGE_LONG_POLL_SECONDS=0):
+            started = time.monotonic()
+            resp = self.client.get(self.url + "?wait=30", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertLess(time.monotonic() - started, 1)
+
+        with override_settings(BADGE_LONG_POLL_SECONDS=1):
+            started = time.monotonic()
+            resp = self.client.get(self.url + "?wait=30", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+
+
+class LiveStreamTests(TestCase):
+    """SSE /api/live/: avisos gravados em LiveEvent e entregues pelo hub."""
+
+    def setUp(self):
+        from accounts.models import User
+
+        self.user = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+
+    def test_notification_and_due_reminder_publish_live_events(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from calendar_app.models import CalendarEvent, Reminder
+        from core.models import LiveEvent, Notification
+
+        Notification.send(self.user, "Pedido confirmado")
+        today = timezone.localdate()
+        event = CalendarEvent.objects.create(title="Entrega", event_date=today, assigned_to=self.user)
+        Reminder.objects.create(event=event, remind_date=today, message="Entrega hoje")
+        later = Reminder.objects.create(event=event, remind_date=today + timedelta(days=1))
+        self.assertEqual(
+            list(LiveEvent.objects.order_by("id").values_list("kind", flat=True)),
+            ["notification", "reminder"],
+        )
+        self.assertEqual(LiveEvent.objects.first().payload["title"], "Pedido confirmado")
+
+        # vence na virada do dia: o worker publica uma vez só
+        self.assertEqual(Reminder.push_due(today + timedelta(days=1)), 1)
+        self.assertEqual(Reminder.push_due(today + timedelta(days=1)), 0)
+        self.assertEqual(LiveEvent.objects.last().payload["id"], later.pk)
+
+    def test_wsgi_falls_back_with_204(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/api/live/").status_code, 204)
+
+    async def test_stream_replays_and_pushes_new_events(self):
+        from unittest import mock
+
+        from asgiref.sync import sync_to_async
+        from django.test import override_settings
+
+        from core import live
+        from core.models import LiveEvent, Notification
+
+        await sync_to_async(Notification.send)(self.user, "Antes de conectar")
+        first = await LiveEvent.objects.alast()
+        await self.async_client.aforce_login(self.user)
+        with override_settings(LIVE_STREAM_SECONDS=1), mock.patch.object(live, "POLL_SECONDS", 0.05):
+            resp = await self.async_client.get("/api/live/", headers={"Last-Event-ID": "0"})
+            self.assertEqual(resp["Content-Type"], "text/event-stream")
+            chunks = []
+            async for chunk in resp.streaming_content:
+                chunks.append(chunk.decode())
+                if "Antes de conectar" in chunks[-1]:
+                    await sync_to_async(Notification.send)(self.user, "Depois de conectar")
+        body = "".join(chunks)
+        self.assertIn(f"id: {first.pk}", body)
+        self.assertIn("event: notification", body)
+        self.assertIn("Depois de conectar", body)
+
+
+class NotificationFanOutTests(TestCase):
+    """send_many/broadcast: destinatários numa query, um INSERT, avisos após o commit."""
+
+    def setUp(self):
+        from accounts.models import User
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.finance = [
+            User.objects.create_user(username=f"fin{i}", password="x", role="FINANCE") for i in range(3)
+        ]
+        self.admin = User.objects.create_user(username="admin", password="x", role="ADMIN")
+        self.root = User.objects.create_superuser(username="root", password="x", role="SELLER")
+        User.objects.create_user(username="inativo", password="x", role="FINANCE", is_active=False)
+
+    def test_broadcast_targets_roles_with_one_insert(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from accounts.models import Role
+        from core import badges
+        from core.models import LiveEvent, Notification
+
+        before = badges.version(self.finance[0].pk)
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks() as callbacks:
+                sent = Notification.broadcast(
+                    [Role.ADMIN, Role.FINANCE], "Pedido aguardando aprovação", exclude=self.admin,
+                )
+        self.assertEqual(
+            {n.recipient_id for n in sent}, {u.pk for u in self.finance} | {self.root.pk},
+        )
+        sqls = [q["sql"] for q in ctx.captured_queries]
+        self.assertEqual(sum(q.startswith('INSERT INTO "core_notification"') for q in sqls), 1)
+        self.assertEqual(sum('FROM "accounts_user"' in q for q in sqls), 1)
+        # nada publicado antes do commit
+        self.assertFalse(LiveEvent.objects.exists())
+        self.assertEqual(badges.version(self.finance[0].pk), before)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(LiveEvent.objects.filter(kind="notification").count(), 4)
+        self.assertEqual(
+            LiveEvent.objects.get(user=self.root).payload["title"], "Pedido aguardando aprovação",
+        )
+        self.assertNotEqual(badges.version(self.finance[0].pk), before)
+
+    def test_send_many_accepts_users_and_ids_once_each(self):
+        from core.models import Notification
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.send_many([self.seller, self.seller.pk, self.admin.pk], "Entrega agendada")
+        self.assertEqual(Notification.objects.filter(recipient=self.seller).count(), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(Notification.send_many([], "Ninguém"), [])
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import live, views
 
 app_name = "core"
 
@@ -37,6 +37,8 @@ urlpatterns = [
     # Notifications
     path("notificacoes/", views.notifications_list, name="notifications_list"),
     path("api/notifications/", views.notifications_api, name="notifications_api"),
+    path("api/badges/", views.badges_api, name="badges_api"),
+    path("api/live/", live.live_stream, name="live_stream"),
     path("api/notifications/<int:pk>/read/", views.notification_mark_read, name="notification_mark_read"),
     path("api/notifications/mark-all-read/", views.notification_mark_all_read, name="notification_mark_all_read"),
 
@@ -54,6 +56,11 @@ urlpatterns = [
     # Audit Log
     path("auditoria/", views.audit_log_list, name="audit_log_list"),
 
+    # Background jobs (PDF/ZIP exports)
+    path("tarefas/<uuid:job_id>/", views.job_detail, name="job_detail"),
+    path("api/tarefas/<uuid:job_id>/", views.job_status, name="job_status"),
+    path("tarefas/<uuid:job_id>/download/", views.job_download, name="job_download"),
+
     # Goals
     path("metas/", views.goals_list, name="goals_list"),
     path("metas/nova/", views.goal_create, name="goal_create"),
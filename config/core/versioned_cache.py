@@ -0,0 +1,137 @@
+"""Cache em memória do processo, coerente entre workers via número de versão.
+
+Tabelas pequenas e quase estáticas (tarifas, configurações singleton) são lidas
+a cada simulação/PDF, mas só mudam quando alguém edita no admin. Cada worker
+guarda a sua cópia em memória; um contador de versão num cache COMPARTILHADO
+(alias "shared", tabela no banco — funciona sem Redis) diz quando recarregar.
+
+- Quem salva invalida a própria cópia na hora e, após o commit, incrementa a
+  versão compartilhada.
+- Os outros workers conferem a versão no máximo a cada `recheck_seconds`;
+  uma alteração feita em outro worker aparece em até esse intervalo.
+- Entre a alteração e o fim da transação nada é guardado: se ela for
+  desfeita, a cópia em memória não pode ficar com um valor que nunca existiu.
+  Essa marca é da thread e da conexão que alteraram (as outras continuam
+  usando o cache); some no commit ou no primeiro `get()` fora de transação
+  depois de um rollback.
+"""
+from __future__ import annotations
+
+import functools
+import threading
+import time
+from typing import Callable, Generic, TypeVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+
+def _shared_cache():
+    alias = "shared" if "shared" in getattr(settings, "CACHES", {}) else "default"
+    return caches[alias]
+
+
+class VersionedCache(Generic[T]):
+    """Valor carregado uma vez por processo e recarregado quando a versão muda."""
+
+    def __init__(self, name: str, loader: Callable[[], T], *, recheck_seconds: float = 2.0):
+        self.name = name
+        self.loader = loader
+        self.recheck_seconds = recheck_seconds
+        # RLock: o loader pode salvar (get_or_create) e disparar invalidate().
+        self._lock = threading.RLock()
+        self._value = _MISSING
+        self._version = None
+        self._checked_at = 0.0
+        # aliases de conexão desta thread com alteração ainda não commitada
+        self._local = threading.local()
+
+    @property
+    def version_key(self) -> str:
+        return f"vcache:{self.name}:version"
+
+    def _shared_version(self):
+        cache = _shared_cache()
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 1, timeout=None)
+            version = cache.get(self.version_key, 1)
+        return version
+
+    def _dirty_aliases(self) -> set[str]:
+        if not hasattr(self._local, "aliases"):
+            self._local.aliases = set()
+        return self._local.aliases
+
+    def get(self) -> T:
+        now = time.monotonic()
+        dirty = self._dirty_aliases()
+        if dirty:
+            connection = transaction.get_connection()
+            if connection.alias in dirty:
+                if connection.in_atomic_block:
+                    return self.loader()
+                # fora de transação: a que alterou já terminou (rollback)
+                dirty.discard(connection.alias)
+        with self._lock:
+            if self._value is not _MISSING and now - self._checked_at < self.recheck_seconds:
+                return self._value
+            version = self._shared_version()
+            if self._value is _MISSING or version != self._version:
+                self._value = self.loader()
+                self._version = version
+            self._checked_at = now
+            return self._value
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._value = _MISSING
+            self._version = None
+
+    def _bump(self, alias: str) -> None:
+        self._dirty_aliases().discard(alias)
+        cache = _shared_cache()
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # chave ainda não existe (ou expirou): qualquer valor novo serve
+            cache.add(self.version_key, 1, timeout=None)
+        self.clear_local()
+
+    def invalidate(self) -> None:
+        """Descarta a cópia local já e avisa os outros workers após o commit."""
+        self.clear_local()
+        connection = transaction.get_connection()
+        if connection.in_atomic_block:
+            self._dirty_aliases().add(connection.alias)
+        transaction.on_commit(functools.partial(self._bump, connection.alias))
+
+    def invalidate_on_change(self, model) -> None:
+        """Invalida sempre que uma instância de `model` for salva ou excluída."""
+        post_save.connect(self._on_change, sender=model, weak=False)
+        post_delete.connect(self._on_change, sender=model, weak=False)
+
+    def _on_change(self, sender, **kwargs):
+        self.invalidate()
+
+
+class SingletonCache(VersionedCache):
+    """Registro pk=1 de um modelo de configuração singleton, criado se faltar.
+
+    Devolve sempre a mesma instância em memória: trate como somente leitura.
+    Para alterar, busque do banco (`Model.objects.get(pk=1)`) e salve.
+    """
+
+    def __init__(self, model, **kwargs):
+        super().__init__(
+            f"singleton:{model._meta.label_lower}",
+            lambda: model.objects.get_or_create(pk=1)[0],
+            **kwargs,
+        )
+        self.invalidate_on_change(model)
@@ -2,20 +2,20 @@ from __future__ import annotations
 
 import json
 import logging
-from collections import defaultdict
 from datetime import date as date_type, timedelta
 from decimal import Decimal
 
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, Count, Q, F, Avg
+from django.db.models import Sum, Q, F, Avg
 
 
 def health_check(request):
     return HttpResponse("ok", content_type="text/plain")
 from django.db.models.functions import TruncMonth, Coalesce
-from django.http import JsonResponse, HttpRequest, HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, HttpRequest, HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
@@ -27,8 +27,13 @@ from .models import (
     SalesGoal, GoalType, GoalPeriod,
     CommunicationHistory,
     QuoteTemplate, QuoteTemplateItem,
+    BackgroundJob, JobStatus,
 )
+from . import badges
+from .badges import counted
+from .metrics import EMPTY_TEAM_METRICS, month_bounds, personal_metrics, team_metrics
 from sales.models import Quote, QuoteStatus, SOLD_STATUSES, Order, OrderStatus, QuoteItem
+from sales.search import result_url, search
 from accounts.models import User, Role
 from calendar_app.models import CalendarEvent, EventStatus
 
@@ -53,54 +58,6 @@ def _json_html(data) -> str:
     )
 
 
-# The company's sales month runs from the 25th of one calendar month through
-# the 24th of the next, and is labeled by its closing month
-# (e.g. 25/Jun–24/Jul is the "Jul" sales month).
-SALES_MONTH_START_DAY = 25
-
-
-def _sales_month_start(day: date_type) -> date_type:
-    """Start date (a 25th) of the sales month containing `day`."""
-    if day.day >= SALES_MONTH_START_DAY:
-        return day.replace(day=SALES_MONTH_START_DAY)
-    prev_month_end = day.replace(day=1) - timedelta(days=1)
-    return prev_month_end.replace(day=SALES_MONTH_START_DAY)
-
-
-def _next_sales_month_start(start: date_type) -> date_type:
-    """Next sales month's start, given a sales-month start (a 25th)."""
-    return (start.replace(day=28) + timedelta(days=10)).replace(day=SALES_MONTH_START_DAY)
-
-
-def _sales_month_label(start: date_type) -> str:
-    """Label for a sales month: its closing calendar month, e.g. 'Jul/25'."""
-    close = (start.replace(day=28) + timedelta(days=10)).replace(day=1)
-    return close.strftime("%b/%y")
-
-
-def _month_bounds(day: date_type) -> tuple[date_type, date_type]:
-    """Start (25th) and end (24th) of the sales month containing `day`."""
-    month_start = _sales_month_start(day)
-    month_end = _next_sales_month_start(month_start) - timedelta(days=1)
-    return month_start, month_end
-
-
-def _prev_month_bounds(month_start: date_type) -> tuple[date_type, date_type]:
-    """Bounds of the sales month immediately before the one at `month_start`."""
-    prev_start = _sales_month_start(month_start - timedelta(days=1))
-    return prev_start, month_start - timedelta(days=1)
-
-
-def _last_n_month_starts(day: date_type, n: int = 6) -> list[date_type]:
-    starts = []
-    cur = _sales_month_start(day)
-    for _ in range(n):
-        starts.append(cur)
-        cur = _sales_month_start(cur - timedelta(days=1))
-    starts.reverse()
-    return starts
-
-
 def _normalize_month_key(value):
     return value.date() if hasattr(value, "date") else value
 
@@ -113,36 +70,6 @@ def _build_month_series(rows, month_starts: list[date_type]) -> tuple[list[str],
     return labels, totals, counts
 
 
-def _net_quote_value(quote) -> Decimal:
-    """Returns the quote's customer-facing total.
-
-    total_value_snapshot already stores the clean value (subtotal - discount + freight)
-    with NO payment fee added — the fee is a store cost absorbed by the margin.
-    """
-    return quote.total_value_snapshot or Decimal("0")
-
-
-def _sum_net_quote_values(quotes) -> Decimal:
-    return sum((_net_quote_value(q) for q in quotes), Decimal("0"))
-
-
-def _build_net_month_series_from_quotes(quotes, month_starts: list[date_type]) -> tuple:
-    """Série mensal de vendas. `quotes` deve vir de Quote.objects.sold(),
-    que anota `sold_on` (data da venda; fallback: data do orçamento)."""
-    totals = {m: Decimal("0") for m in month_starts}
-    counts = {m: 0 for m in month_starts}
-    for q in quotes:
-        m = _sales_month_start(getattr(q, "sold_on", None) or q.quote_date)
-        if m in totals:
-            totals[m] += _net_quote_value(q)
-            counts[m] += 1
-    return (
-        [_sales_month_label(m) for m in month_starts],
-        [float(totals[m]) for m in month_starts],
-        [counts[m] for m in month_starts],
-    )
-
-
 # ──────────────────────────────────────────────────────────────────────
 # Home
 # ──────────────────────────────────────────────────────────────────────
@@ -152,48 +79,15 @@ def home(request):
     if request.user.is_authenticated:
         user = request.user
         today = timezone.localdate()
-        month_start, month_end = _month_bounds(today)
         is_admin = user.role == Role.ADMIN or user.is_superuser
         is_staff_or_admin = is_admin
 
-        my_quotes = Quote.objects.filter(seller=user)
-        my_quotes_month = my_quotes.filter(quote_date__gte=month_start, quote_date__lte=month_end)
-        my_converted = my_quotes.sold()
-        my_converted_month = my_converted.filter(sold_on__gte=month_start, sold_on__lte=month_end)
-
-        my_total_sold_month = _sum_net_quote_values(
-            my_converted_month.only("total_value_snapshot")
-        )
-        my_quotes_count_month = my_quotes_month.count()
-        my_converted_count_month = my_converted_month.count()
-        # Conversão por coorte: dos orçamentos criados no ciclo, quantos viraram venda
-        my_cohort_converted_month = my_quotes_month.filter(status__in=SOLD_STATUSES).count()
-        my_conversion_rate = (
-            round(my_cohort_converted_month / my_quotes_count_month * 100, 1)
-            if my_quotes_count_month > 0 else 0
-        )
-        my_avg_ticket = (
-            round(my_total_sold_month / my_converted_count_month, 2)
-            if my_converted_count_month > 0 else Decimal("0")
-        )
-
-        # Previous month
-        prev_month_start, prev_month_end = _prev_month_bounds(month_start)
-        prev_total = _sum_net_quote_values(
-            my_quotes.sold().filter(
-                sold_on__gte=prev_month_start,
-                sold_on__lte=prev_month_end,
-            ).only("total_value_snapshot")
-        )
+        # Métricas de vendas: cacheadas por (vendedor, mês de vendas)
+        mine = personal_metrics(user, today)
 
         # Goal — source of truth is user.individual_target_value set in admin
         goal_target = user.individual_target_value or Decimal("0")
-        goal_pct = round(float(my_total_sold_month) / float(goal_target) * 100, 1) if goal_target > 0 else 0
-
-        # Avg discount
-        avg_discount = (
-            my_converted_month.aggregate(avg=Avg("discount_percent"))["avg"] or 0
-        )
+        goal_pct = round(float(mine["total_sold"]) / float(goal_target) * 100, 1) if goal_target > 0 else 0
 
         # Pending quotes
         pending_quotes = Quote.objects.filter(status=QuoteStatus.DRAFT)
@@ -236,158 +130,21 @@ def home(request):
                 is_total_conference=True,
             ).count()
 
-        # Monthly chart (6 months) — net values
-        month_starts = _last_n_month_starts(today, n=6)
-        series_start = month_starts[0]
-        personal_month_quotes = Quote.objects.sold().filter(
-            seller=user,
-            sold_on__gte=series_start,
-            sold_on__lte=today,
-        ).only("quote_date", "sale_date", "total_value_snapshot")
-        chart_labels, chart_values, _ = _build_net_month_series_from_quotes(personal_month_quotes, month_starts)
-
-        # Personal status breakdown (for hero pie)
-        my_status_data = (
-            my_quotes_month.values("status").annotate(count=Count("id"))
-        )
-        my_status_labels = [QuoteStatus(d["status"]).label for d in my_status_data]
-        my_status_values = [d["count"] for d in my_status_data]
-
-        # Team stats (admin)
-        team_total_sold_month = Decimal("0")
-        team_quotes_month = 0
-        team_conversion_rate = 0
-        seller_ranking = []
-        collective_goal = None
-        collective_goal_pct = 0
-        bi_team_chart_labels = bi_team_chart_values = bi_team_chart_counts = []
-        bi_status_labels = bi_status_values = []
-        bi_prod_labels = bi_prod_values = []
-        bi_seller_labels = bi_seller_values = bi_seller_counts = []
-        bi_disc_labels = bi_disc_values = []
-        bi_top_products = []
-        if is_admin:
-            team_quotes_month = Quote.objects.filter(
-                quote_date__gte=month_start,
-                quote_date__lte=month_end,
-            ).count()
-            _team_conv_qs = list(
-                Quote.objects.sold().filter(
-                    sold_on__gte=month_start,
-                    sold_on__lte=month_end,
-                ).only("seller_id", "total_value_snapshot")
-                .select_related("seller")
-            )
-            team_converted_month = len(_team_conv_qs)
-            # Conversão por coorte: dos orçamentos criados no ciclo, quantos viraram venda
-            team_cohort_converted_month = Quote.objects.filter(
-                quote_date__gte=month_start,
-                quote_date__lte=month_end,
-                status__in=SOLD_STATUSES,
-            ).count()
-            team_conversion_rate = (
-                round(team_cohort_converted_month / team_quotes_month * 100, 1)
-                if team_quotes_month > 0 else 0
-            )
-            _buckets: dict = defaultdict(lambda: {"total": Decimal("0"), "count": 0, "username": ""})
-            for _q in _team_conv_qs:
-                _buckets[_q.seller_id]["total"] += _net_quote_value(_q)
-                _buckets[_q.seller_id]["count"] += 1
-                _buckets[_q.seller_id]["username"] = _q.seller.username
-            team_total_sold_month = sum((_b["total"] for _b in _buckets.values()), Decimal("0"))
-            seller_ranking = sorted(
-                [{"seller__username": _b["username"], "total": _b["total"], "count": _b["count"]}
-                 for _b in _buckets.values()],
-                key=lambda x: x["total"], reverse=True,
-            )[:10]
-            # Meta coletiva cadastrada tem prioridade; sem ela, soma das metas individuais
-            _collective_goal_obj = (
-                SalesGoal.objects.filter(
-                    goal_type=GoalType.COLLECTIVE,
-                    period_start__lte=today,
-                    period_end__gte=today,
-                )
-                .order_by("-period_start", "-id")
-                .first()
-            )
-            if _collective_goal_obj and _collective_goal_obj.target_value > 0:
-                _collective_goal_sum = _collective_goal_obj.target_value
-            else:
-                _collective_goal_sum = SalesGoal.objects.filter(
-                    goal_type=GoalType.INDIVIDUAL,
-                    period_start__lte=today,
-                    period_end__gte=today,
-                    seller__role=Role.SELLER,
-                ).aggregate(total=Sum("target_value"))["total"] or Decimal("0")
-            collective_goal = _collective_goal_sum if _collective_goal_sum > 0 else None
-            if collective_goal:
-                collective_goal_pct = round(
-                    float(team_total_sold_month) / float(collective_goal) * 100, 1
-                )
-
-            # ── BI: Team monthly evolution (last 6 months) — net values ──
-            bi_team_all_quotes = Quote.objects.sold().filter(
-                sold_on__gte=series_start,
-                sold_on__lte=today,
-            ).only("quote_date", "sale_date", "total_value_snapshot")
-            bi_team_chart_labels, bi_team_chart_values, bi_team_chart_counts = _build_net_month_series_from_quotes(
-                bi_team_all_quotes, month_starts,
-            )
-
-            # ── BI: Quote status breakdown ──
-            bi_status_data = (
-                Quote.objects.filter(quote_date__gte=month_start, quote_date__lte=month_end)
-                .values("status")
-                .annotate(count=Count("id"))
-            )
-            bi_status_labels = [QuoteStatus(d["status"]).label for d in bi_status_data]
-            bi_status_values = [d["count"] for d in bi_status_data]
-
-            # ── BI: Top 10 products by revenue ──
-            bi_top_products = list(
-                QuoteItem.objects.filter(quote__status__in=SOLD_STATUSES)
-                .annotate(sold_on=Coalesce("quote__sale_date", "quote__quote_date"))
-                .filter(sold_on__gte=month_start)
-                .values("product_name")
-                .annotate(
-                    total_revenue=Sum(F("quantity") * F("unit_value")),
-                    total_qty=Sum("quantity"),
-                )
-                .order_by("-total_revenue")[:10]
-            )
-            bi_prod_labels = [p["product_name"][:25] for p in bi_top_products]
-            bi_prod_values = [float(p["total_revenue"] or 0) for p in bi_top_products]
-
-            # ── BI: Seller comparison (bar chart) ──
-            bi_seller_labels = [s["seller__username"] for s in seller_ranking]
-            bi_seller_values = [float(s["total"] or 0) for s in seller_ranking]
-            bi_seller_counts = [s["count"] for s in seller_ranking]
-
-            # ── BI: Avg discount per seller ──
-            bi_discount_data = list(
-                Quote.objects.sold().filter(
-                    sold_on__gte=month_start,
-                    sold_on__lte=month_end,
-                    discount_percent__gt=0,
-                )
-                .values("seller__username")
-                .annotate(avg_disc=Avg("discount_percent"))
-                .order_by("-avg_disc")[:10]
-            )
-            bi_disc_labels = [d["seller__username"] for d in bi_discount_data]
-            bi_disc_values = [round(float(d["avg_disc"]), 1) for d in bi_discount_data]
+        # Team stats + BI (admin)
+        team = team_metrics(today) if is_admin else EMPTY_TEAM_METRICS
+        bi_top_products = team["top_products"]
 
         context = {
             "today": today,
             "is_admin": is_admin,
             "is_staff_or_admin": is_staff_or_admin,
-            "my_total_sold_month": my_total_sold_month,
-            "my_quotes_count_month": my_quotes_count_month,
-            "my_converted_count_month": my_converted_count_month,
-            "my_conversion_rate": my_conversion_rate,
-            "my_avg_ticket": my_avg_ticket,
-            "prev_total": prev_total,
-            "avg_discount": round(avg_discount, 1),
+            "my_total_sold_month": mine["total_sold"],
+            "my_quotes_count_month": mine["quotes_count"],
+            "my_converted_count_month": mine["converted_count"],
+            "my_conversion_rate": mine["conversion_rate"],
+            "my_avg_ticket": mine["avg_ticket"],
+            "prev_total": mine["prev_total"],
+            "avg_discount": round(mine["avg_discount"], 1),
             "goal_target": goal_target,
             "goal_pct": min(goal_pct, 100),
             "goal_pct_raw": goal_pct,
@@ -396,29 +153,29 @@ def home(request):
             "overdue_events": overdue_events,
             "unread_count": unread_count,
             "pending_orders_count": pending_orders_count,
-            "chart_labels_json": _json_html(chart_labels),
-            "chart_values_json": _json_html(chart_values),
-            "my_status_labels_json": _json_html(my_status_labels),
-            "my_status_values_json": _json_html(my_status_values),
-            "team_total_sold_month": team_total_sold_month,
-            "team_quotes_month": team_quotes_month,
-            "team_conversion_rate": team_conversion_rate,
-            "seller_ranking": seller_ranking,
-            "collective_goal": collective_goal,
-            "collective_goal_pct": min(collective_goal_pct, 100),
+            "chart_labels_json": _json_html(mine["chart_labels"]),
+            "chart_values_json": _json_html(mine["chart_values"]),
+            "my_status_labels_json": _json_html(mine["status_labels"]),
+            "my_status_values_json": _json_html(mine["status_values"]),
+            "team_total_sold_month": team["total_sold"],
+            "team_quotes_month": team["quotes_count"],
+            "team_conversion_rate": team["conversion_rate"],
+            "seller_ranking": team["seller_ranking"],
+            "collective_goal": team["collective_goal"],
+            "collective_goal_pct": min(team["collective_goal_pct"], 100),
             # BI Charts (admin only)
-            "bi_team_chart_labels_json": _json_html(bi_team_chart_labels),
-            "bi_team_chart_values_json": _json_html(bi_team_chart_values),
-            "bi_team_chart_counts_json": _json_html(bi_team_chart_counts),
-            "bi_status_labels_json": _json_html(bi_status_labels),
-            "bi_status_values_json": _json_html(bi_status_values),
-            "bi_prod_labels_json": _json_html(bi_prod_labels),
-            "bi_prod_values_json": _json_html(bi_prod_values),
-            "bi_seller_labels_json": _json_html(bi_seller_labels),
-            "bi_seller_values_json": _json_html(bi_seller_values),
-            "bi_seller_counts_json": _json_html(bi_seller_counts),
-            "bi_disc_labels_json": _json_html(bi_disc_labels),
-            "bi_disc_values_json": _json_html(bi_disc_values),
+            "bi_team_chart_labels_json": _json_html(team["chart_labels"]),
+            "bi_team_chart_values_json": _json_html(team["chart_values"]),
+            "bi_team_chart_counts_json": _json_html(team["chart_counts"]),
+            "bi_status_labels_json": _json_html(team["status_labels"]),
+            "bi_status_values_json": _json_html(team["status_values"]),
+            "bi_prod_labels_json": _json_html([p["product_name"][:25] for p in bi_top_products]),
+            "bi_prod_values_json": _json_html([float(p["total_revenue"] or 0) for p in bi_top_products]),
+            "bi_seller_labels_json": _json_html([r["seller__username"] for r in team["seller_ranking"]]),
+            "bi_seller_values_json": _json_html([float(r["total"] or 0) for r in team["seller_ranking"]]),
+            "bi_seller_counts_json": _json_html([r["count"] for r in team["seller_ranking"]]),
+            "bi_disc_labels_json": _json_html(team["discount_labels"]),
+            "bi_disc_values_json": _json_html(team["discount_values"]),
             "bi_top_products": bi_top_products,
         }
     return render(request, "core/index.html", context)
@@ -431,126 +188,16 @@ def home(request):
 def dashboard(request):
     user = request.user
     today = timezone.localdate()
-    month_start, month_end = _month_bounds(today)
     is_admin = user.role == Role.ADMIN or user.is_superuser
     is_staff_or_admin = is_admin
 
-    # ── Personal Stats ──
-    my_quotes = Quote.objects.filter(seller=user)
-    my_quotes_month = my_quotes.filter(quote_date__gte=month_start, quote_date__lte=month_end)
-    my_converted = my_quotes.sold()
-    my_converted_month = my_converted.filter(sold_on__gte=month_start, sold_on__lte=month_end)
-
-    my_total_sold_month = _sum_net_quote_values(
-        my_converted_month.only("total_value_snapshot")
-    )
-    my_quotes_count_month = my_quotes_month.count()
-    my_converted_count_month = my_converted_month.count()
-    # Conversão por coorte: dos orçamentos criados no ciclo, quantos viraram venda
-    my_cohort_converted_month = my_quotes_month.filter(status__in=SOLD_STATUSES).count()
-    my_conversion_rate = (
-        round(my_cohort_converted_month / my_quotes_count_month * 100, 1)
-        if my_quotes_count_month > 0 else 0
-    )
-    my_avg_ticket = (
-        round(my_total_sold_month / my_converted_count_month, 2)
-        if my_converted_count_month > 0 else Decimal("0")
-    )
-
-    # ── Previous month comparison ──
-    prev_month_start, prev_month_end = _prev_month_bounds(month_start)
-    prev_converted = my_quotes.sold().filter(
-        sold_on__gte=prev_month_start,
-        sold_on__lte=prev_month_end,
-    )
-    prev_total = _sum_net_quote_values(
-        prev_converted.only("total_value_snapshot")
-    )
+    # ── Personal / team stats: mesmo serviço (e cache) da home ──
+    mine = personal_metrics(user, today)
+    team = team_metrics(today) if is_admin else EMPTY_TEAM_METRICS
 
     # ── My Goal — source of truth is user.individual_target_value set in admin ──
     goal_target = user.individual_target_value or Decimal("0")
-    goal_pct = round(float(my_total_sold_month) / float(goal_target) * 100, 1) if goal_target > 0 else 0
-
-    # ── Team Stats (admin) ──
-    team_total_sold_month = Decimal("0")
-    team_quotes_month = 0
-    team_converted_month = 0
-    team_conversion_rate = 0
-    seller_ranking = []
-    collective_goal = None
-    collective_goal_pct = 0
-
-    if is_admin:
-        team_quotes_month = Quote.objects.filter(
-            quote_date__gte=month_start,
-            quote_date__lte=month_end,
-        ).count()
-        _team_conv_qs = list(
-            Quote.objects.sold().filter(
-                sold_on__gte=month_start,
-                sold_on__lte=month_end,
-            ).only("seller_id", "total_value_snapshot")
-            .select_related("seller")
-        )
-        team_converted_month = len(_team_conv_qs)
-        # Conversão por coorte: dos orçamentos criados no ciclo, quantos viraram venda
-        team_cohort_converted_month = Quote.objects.filter(
-            quote_date__gte=month_start,
-            quote_date__lte=month_end,
-            status__in=SOLD_STATUSES,
-        ).count()
-        team_conversion_rate = (
-            round(team_cohort_converted_month / team_quotes_month * 100, 1)
-            if team_quotes_month > 0 else 0
-        )
-        _buckets: dict = defaultdict(lambda: {"total": Decimal("0"), "count": 0, "username": ""})
-        for _q in _team_conv_qs:
-            _buckets[_q.seller_id]["total"] += _net_quote_value(_q)
-            _buckets[_q.seller_id]["count"] += 1
-            _buckets[_q.seller_id]["username"] = _q.seller.username
-        team_total_sold_month = sum((_b["total"] for _b in _buckets.values()), Decimal("0"))
-
-        # Ranking — net values
-        seller_ranking = sorted(
-            [{"seller__username": _b["username"], "total": _b["total"], "count": _b["count"]}
-             for _b in _buckets.values()],
-            key=lambda x: x["total"], reverse=True,
-        )[:10]
-
-        # Meta coletiva cadastrada tem prioridade; sem ela, soma das metas individuais
-        _collective_goal_obj = (
-            SalesGoal.objects.filter(
-                goal_type=GoalType.COLLECTIVE,
-                period_start__lte=today,
-                period_end__gte=today,
-            )
-            .order_by("-period_start", "-id")
-            .first()
-        )
-        if _collective_goal_obj and _collective_goal_obj.target_value > 0:
-            _collective_goal_sum = _collective_goal_obj.target_value
-        else:
-            _collective_goal_sum = SalesGoal.objects.filter(
-                goal_type=GoalType.INDIVIDUAL,
-                period_start__lte=today,
-                period_end__gte=today,
-                seller__role=Role.SELLER,
-            ).aggregate(total=Sum("target_value"))["total"] or Decimal("0")
-        collective_goal = _collective_goal_sum if _collective_goal_sum > 0 else None
-        if collective_goal:
-            collective_goal_pct = round(
-                float(team_total_sold_month) / float(collective_goal) * 100, 1
-            )
-
-    # ── Monthly evolution (last 6 months) — net values ──
-    month_starts = _last_n_month_starts(today, n=6)
-    series_start = month_starts[0]
-    personal_month_quotes = Quote.objects.sold().filter(
-        seller=user,
-        sold_on__gte=series_start,
-        sold_on__lte=today,
-    ).only("quote_date", "sale_date", "total_value_snapshot")
-    chart_labels, chart_values, _ = _build_net_month_series_from_quotes(personal_month_quotes, month_starts)
+    goal_pct = round(float(mine["total_sold"]) / float(goal_target) * 100, 1) if goal_target > 0 else 0
 
     # ── Pending quotes ──
     pending_quotes = Quote.objects.filter(status=QuoteStatus.DRAFT)
@@ -593,38 +240,33 @@ def dashboard(request):
     # ── Notifications count ──
     unread_count = Notification.objects.filter(recipient=user, read=False).count()
 
-    # ── Avg discount ──
-    avg_discount = (
-        my_converted_month.aggregate(avg=Avg("discount_percent"))["avg"] or 0
-    )
-
     context = {
         "today": today,
         "is_admin": is_admin,
         "is_staff_or_admin": is_staff_or_admin,
         # Personal
-        "my_total_sold_month": my_total_sold_month,
-        "my_quotes_count_month": my_quotes_count_month,
-        "my_converted_count_month": my_converted_count_month,
-        "my_conversion_rate": my_conversion_rate,
-        "my_avg_ticket": my_avg_ticket,
-        "prev_total": prev_total,
-        "avg_discount": round(avg_discount, 1),
+        "my_total_sold_month": mine["total_sold"],
+        "my_quotes_count_month": mine["quotes_count"],
+        "my_converted_count_month": mine["converted_count"],
+        "my_conversion_rate": mine["conversion_rate"],
+        "my_avg_ticket": mine["avg_ticket"],
+        "prev_total": mine["prev_total"],
+        "avg_discount": round(mine["avg_discount"], 1),
         # Goal
         "goal_target": goal_target,
         "goal_pct": min(goal_pct, 100),
         "goal_pct_raw": goal_pct,
         # Team
-        "team_total_sold_month": team_total_sold_month,
-        "team_quotes_month": team_quotes_month,
-        "team_converted_month": team_converted_month,
-        "team_conversion_rate": team_conversion_rate,
-        "seller_ranking": seller_ranking,
-        "collective_goal": collective_goal,
-        "collective_goal_pct": min(collective_goal_pct, 100),
+        "team_total_sold_month": team["total_sold"],
+        "team_quotes_month": team["quotes_count"],
+        "team_converted_month": team["converted_count"],
+        "team_conversion_rate": team["conversion_rate"],
+        "seller_ranking": team["seller_ranking"],
+        "collective_goal": team["collective_goal"],
+        "collective_goal_pct": min(team["collective_goal_pct"], 100),
         # Chart
-        "chart_labels_json": _json_html(chart_labels),
-        "chart_values_json": _json_html(chart_values),
+        "chart_labels_json": _json_html(mine["chart_labels"]),
+        "chart_values_json": _json_html(mine["chart_values"]),
         # Lists
         "pending_quotes": pending_quotes,
         "upcoming_deliveries": upcoming_deliveries,
@@ -838,27 +480,11 @@ def global_search(request):
     if not q or len(q) < 2:
         return JsonResponse({"results": []})
 
-    results = []
-
-    # Customers
-    for c in Customer.objects.filter(Q(name__icontains=q) | Q(cpf__icontains=q) | Q(cnpj__icontains=q))[:3]:
-        results.append({"type": "Cliente", "title": str(c), "url": ""})
-
-    # Quotes
-    for qq in Quote.objects.filter(Q(number__icontains=q) | Q(customer__name__icontains=q)).select_related("customer")[:3]:
-        results.append({
-            "type": "Orçamento",
-            "title": f"{qq.number} – {qq.customer.name}",
-            "url": f"/sales/quotes/{qq.id}/",
-        })
-
-    # Orders
-    for o in Order.objects.filter(Q(number__icontains=q)).select_related("quote")[:3]:
-        results.append({
-            "type": "Pedido",
-            "title": f"OC {o.number}",
-            "url": f"/sales/orders/{o.id}/",
-        })
+    # Índice normalizado (sales/search.py): sem acento, ranqueado, uma query
+    results = [
+        {"type": doc.get_kind_display(), "title": doc.title, "url": result_url(doc)}
+        for doc in search(q, per_kind=3)
+    ]
 
     return JsonResponse({"results": results})
 
@@ -875,22 +501,66 @@ def notifications_list(request):
 @login_required
 def notifications_api(request):
     """Badge count + unread list for navbar dropdown."""
-    qs = Notification.objects.filter(recipient=request.user, read=False).order_by("-created_at")[:10]
-    data = {
-        "unread_count": Notification.objects.filter(recipient=request.user, read=False).count(),
-        "items": [
-            {
-                "id": n.id,
-                "type": n.notification_type,
-                "title": n.title,
-                "message": n.message[:100],
-                "url": n.url,
-                "created_at": n.created_at.strftime("%d/%m %H:%M"),
-            }
-            for n in qs
-        ],
-    }
-    return JsonResponse(data)
+    unread_count, items = counted(
+        Notification.objects.filter(recipient=request.user, read=False).order_by("-created_at"), 10,
+    )
+    return JsonResponse({
+        "unread_count": unread_count,
+        "items": [n.badge_item() for n in items],
+    })
+
+
+@login_required
+def badges_api(request):
+    """Contadores do navbar: notificações não lidas + lembretes vencidos.
+
+    ETag = versão dos contadores do usuário (core/badges.py): sem mudança,
+    If-None-Match devolve 304 sem consultar notificações nem lembretes.
+    `?wait=N` (long-poll, até BADGE_LONG_POLL_SECONDS) segura o 304 até a
+    versão mudar ou o tempo acabar.
+    """
+    from django.conf import settings
+    from django.utils.cache import get_conditional_response
+
+    from calendar_app.models import Reminder
+
+    user = request.user
+    today = timezone.localdate()
+
+    def etag_for(v):
+        return f'"{user.pk}-{v}-{today:%Y%m%d}"'
+
+    current = badges.version(user.pk)
+    not_modified = get_conditional_response(request, etag=etag_for(current))
+    if not_modified is not None:
+        try:
+            wait = min(int(request.GET.get("wait", 0)), settings.BADGE_LONG_POLL_SECONDS)
+        except (TypeError, ValueError):
+            wait = 0
+        if wait > 0:
+            current = badges.wait_for_change(user.pk, current, wait)
+            not_modified = get_conditional_response(request, etag=etag_for(current))
+    if not_modified is not None:
+        not_modified["Cache-Control"] = "private, no-cache"
+        return not_modified
+
+    unread_count, notifications = counted(
+        Notification.objects.filter(recipient=user, read=False).order_by("-created_at"), 10,
+    )
+    reminder_count, reminders = counted(Reminder.due_for(user, today), 5)
+    response = JsonResponse({
+        "notifications": {
+            "count": unread_count,
+            "items": [n.badge_item() for n in notifications],
+        },
+        "reminders": {
+            "count": reminder_count,
+            "items": [r.badge_item() for r in reminders],
+        },
+    })
+    response["ETag"] = etag_for(current)
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @login_required
@@ -907,6 +577,7 @@ def notification_mark_all_read(request):
     Notification.objects.filter(recipient=request.user, read=False).update(
         read=True, read_at=timezone.now()
     )
+    badges.bump(request.user.pk)
     return JsonResponse({"ok": True})
 
 
@@ -969,7 +640,7 @@ def report_sales(request):
         messages.error(request, "Acesso negado.")
         return redirect("core:index")
     today = timezone.localdate()
-    date_from = _parse_date_param(request.GET.get("date_from"), _month_bounds(today)[0]).isoformat()
+    date_from = _parse_date_param(request.GET.get("date_from"), month_bounds(today)[0]).isoformat()
     date_to = _parse_date_param(request.GET.get("date_to"), today).isoformat()
     seller_id = request.GET.get("seller", "")
 
@@ -1005,7 +676,7 @@ def report_commissions(request):
         messages.error(request, "Acesso negado.")
         return redirect("core:index")
     today = timezone.localdate()
-    date_from = _parse_date_param(request.GET.get("date_from"), _month_bounds(today)[0]).isoformat()
+    date_from = _parse_date_param(request.GET.get("date_from"), month_bounds(today)[0]).isoformat()
     date_to = _parse_date_param(request.GET.get("date_to"), today).isoformat()
 
     from core.models import SalesMarginConfig
@@ -1113,7 +784,7 @@ def report_discounts(request):
         messages.error(request, "Acesso negado.")
         return redirect("core:index")
     today = timezone.localdate()
-    date_from = _parse_date_param(request.GET.get("date_from"), _month_bounds(today)[0]).isoformat()
+    date_from = _parse_date_param(request.GET.get("date_from"), month_bounds(today)[0]).isoformat()
     date_to = _parse_date_param(request.GET.get("date_to"), today).isoformat()
 
     qs = Quote.objects.filter(
@@ -1140,7 +811,7 @@ def report_products(request):
         messages.error(request, "Acesso negado.")
         return redirect("core:index")
     today = timezone.localdate()
-    date_from = _parse_date_param(request.GET.get("date_from"), _month_bounds(today)[0]).isoformat()
+    date_from = _parse_date_param(request.GET.get("date_from"), month_bounds(today)[0]).isoformat()
     date_to = _parse_date_param(request.GET.get("date_to"), today).isoformat()
 
     items = (
@@ -1169,7 +840,7 @@ def report_csv_export(request):
         return redirect("core:index")
     import csv
     today = timezone.localdate()
-    date_from = _parse_date_param(request.GET.get("date_from"), _month_bounds(today)[0]).isoformat()
+    date_from = _parse_date_param(request.GET.get("date_from"), month_bounds(today)[0]).isoformat()
     date_to = _parse_date_param(request.GET.get("date_to"), today).isoformat()
 
     qs = Quote.objects.sold().filter(
@@ -1290,7 +961,7 @@ def goal_create(request):
             messages.error(request, "Selecione um vendedor para a meta individual.")
             return redirect("core:goals_list")
 
-        month_start, month_end = _month_bounds(requested_start)
+        month_start, month_end = month_bounds(requested_start)
         SalesGoal.objects.update_or_create(
             goal_type=GoalType.INDIVIDUAL,
             period=GoalPeriod.MONTHLY,
@@ -1308,7 +979,7 @@ def goal_create(request):
     period = request.POST.get("period", GoalPeriod.MONTHLY)
     if period == GoalPeriod.MONTHLY:
         # Metas mensais seguem o ciclo de vendas 25→24
-        requested_start, requested_end = _month_bounds(requested_start)
+        requested_start, requested_end = month_bounds(requested_start)
     SalesGoal.objects.update_or_create(
         goal_type=GoalType.COLLECTIVE,
         seller=None,
@@ -1418,3 +1089,53 @@ def supplier_delete(request, supplier_id):
     supplier.delete()
     messages.success(request, f"Fornecedor {name} excluído.")
     return redirect("core:supplier_list")
+
+
+# ──────────────────────────────────────────────────────────────────────
+# Tarefas em segundo plano (PDFs/ZIPs — ver core/jobs.py)
+# ──────────────────────────────────────────────────────────────────────
+
+def _get_job(request, job_id):
+    qs = BackgroundJob.objects.all()
+    if not request.user.is_superuser:
+        qs = qs.filter(created_by=request.user)
+    return get_object_or_404(qs, pk=job_id)
+
+
+def _job_payload(job):
+    return {
+        "id": str(job.pk),
+        "label": job.label,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "finished": job.is_finished,
+        "error": job.error if job.status == JobStatus.FAILED else "",
+        "download_url": (
+            reverse("core:job_download", args=[job.pk]) if job.status == JobStatus.DONE else ""
+        ),
+    }
+
+
+@login_required
+def job_detail(request, job_id):
+    """Página de espera: consulta o status e baixa o arquivo quando fica pronto."""
+    job = _get_job(request, job_id)
+    return render(request, "core/job_wait.html", {"job": job, "payload": _json_html(_job_payload(job))})
+
+
+@login_required
+def job_status(request, job_id):
+    return JsonResponse(_job_payload(_get_job(request, job_id)))
+
+
+@login_required
+def job_download(request, job_id):
+    job = _get_job(request, job_id)
+    if job.status != JobStatus.DONE or not job.result:
+        raise Http404("Arquivo ainda não disponível.")
+    return FileResponse(
+        job.result.open("rb"),
+        as_attachment=True,
+        filename=job.result_name,
+        content_type=job.content_type or "application/octet-stream",
+    )
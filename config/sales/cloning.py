@@ -0,0 +1,134 @@
+"""Cópia de orçamento e itens de modelo (core.QuoteTemplate) num orçamento.
+
+`quote_duplicate` criava os itens um a um (cada um disparando o sinal do
+snapshot) e os modelos de orçamento não tinham como virar orçamento; agora o
+formulário de novo orçamento aceita um modelo. Aqui itens e imagens entram
+com `bulk_create` — uma query por tabela — e o snapshot é calculado uma vez
+no commit (sales/snapshots.py).
+
+As imagens da cópia apontam para os MESMOS arquivos do original, sem copiar
+bytes: a cópia é só mais um registro. Por isso quem apaga arquivo de imagem
+usa `QuoteItemImage.delete_unshared_files()`, que só remove o que nenhum
+outro registro usa.
+"""
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import snapshots
+from .models import Quote, QuoteItem, QuoteItemImage, QuoteStatus
+
+# Campos comerciais copiados do orçamento de origem (número, vendedor,
+# status e data são os da cópia).
+QUOTE_COPY_FIELDS = (
+    "customer_id",
+    "freight_value",
+    "freight_responsible",
+    "shipping_company_id",
+    "shipping_payment_method",
+    "discount_percent",
+    "price_increase_percent",
+    "has_architect",
+    "architect_id",
+    "payment_type",
+    "payment_installments",
+    "payment_fee_percent",
+    "payment_type_2",
+    "payment_installments_2",
+    "payment_fee_percent_2",
+    "payment_split_amount",
+    "total_override",
+    "total_rounding_mode",
+    "total_manual_adjustment",
+)
+
+ITEM_COPY_FIELDS = (
+    "supplier_id",
+    "product_name",
+    "description",
+    "quantity",
+    "unit_value",
+    "condition_text",
+    "architect_percent",
+)
+
+
+def _new_draft(*, number: str, seller, **fields) -> Quote:
+    return Quote.objects.create(
+        number=number,
+        seller=seller,
+        status=QuoteStatus.DRAFT,
+        quote_date=timezone.localdate(),
+        **fields,
+    )
+
+
+def _copy_images(sources: list[QuoteItem], copies: list[QuoteItem]) -> list[QuoteItemImage]:
+    images = QuoteItemImage.objects.bulk_create([
+        QuoteItemImage(
+            item=copy,
+            image=image.image.name,
+            thumbnail=image.thumbnail.name,
+            normalized=image.normalized,
+            caption=image.caption,
+        )
+        for source, copy in zip(sources, copies)
+        for image in source.images.all()
+    ])
+    pending = [image for image in images if not image.normalized]
+    if pending:
+        # Original ainda na fila do worker: a cópia ganha a própria tarefa
+        # (bulk_create não passa pelo save() que enfileira).
+        from core.jobs import enqueue
+
+        for image in pending:
+            enqueue(
+                "sales.images.normalize_item_image",
+                f"Imagem do item {image.item_id}",
+                image_id=image.pk,
+            )
+    return images
+
+
+def duplicate_quote(original: Quote, *, number: str, seller) -> Quote:
+    """Novo rascunho com os dados, itens e imagens de `original`."""
+    sources = list(
+        original.items.order_by("pk").prefetch_related(
+            Prefetch("images", queryset=QuoteItemImage.objects.order_by("pk"))
+        )
+    )
+    with transaction.atomic():
+        quote = _new_draft(
+            number=number,
+            seller=seller,
+            **{field: getattr(original, field) for field in QUOTE_COPY_FIELDS},
+        )
+        copies = QuoteItem.objects.bulk_create([
+            QuoteItem(quote=quote, **{field: getattr(item, field) for field in ITEM_COPY_FIELDS})
+            for item in sources
+        ])
+        _copy_images(sources, copies)
+        # bulk_create não dispara os sinais dos itens
+        snapshots.mark_dirty(quote.pk)
+    return quote
+
+
+def add_template_items(quote: Quote, template) -> list[QuoteItem]:
+    """Acrescenta ao orçamento os itens do modelo (core.QuoteTemplate)."""
+    with transaction.atomic():
+        items = QuoteItem.objects.bulk_create([
+            QuoteItem(
+                quote=quote,
+                product_name=entry.product_name,
+                description=entry.description,
+                quantity=entry.quantity,
+                unit_value=entry.default_unit_value,
+            )
+            for entry in template.items.all()
+        ])
+        if items:
+            quote.invalidate_totals()
+            snapshots.mark_dirty(quote.pk)
+    return items
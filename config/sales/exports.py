@@ -0,0 +1,135 @@
+"""Handlers das exportações em PDF/ZIP executadas pelo worker (core/jobs.py).
+
+Cada handler recebe os params gravados na tarefa e devolve
+(nome do arquivo, content type, bytes). A renderização em si continua em
+sales/views.py, perto do formulário que coleta os dados.
+"""
+from __future__ import annotations
+
+import tempfile
+import zipfile
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Prefetch
+
+from .models import Order, Quote, QuoteItemImage
+
+
+def _prices(raw: dict) -> dict[int, Decimal]:
+    return {int(pk): Decimal(value) for pk, value in raw.items()}
+
+
+def _safe_filename(name: str) -> str:
+    return name.replace(' ', '_').replace('/', '_')
+
+
+def proposal_quotes():
+    """Orçamentos com tudo que a proposta do cliente lê, em queries fixas.
+
+    Orçamento + cliente + vendedor, itens e imagens dos itens: 3 queries,
+    qualquer que seja o número de itens. O renderizador e a impressão
+    digital do cache só percorrem `items.all()` / `images.all()`; as
+    configurações (ProposalConfig) vêm do cache em memória.
+    """
+    return Quote.objects.select_related("customer", "seller").prefetch_related(
+        "items",
+        Prefetch("items__images", queryset=QuoteItemImage.objects.order_by("pk")),
+    )
+
+
+def proposal_quote(quote_id: int) -> Quote:
+    return proposal_quotes().get(pk=quote_id)
+
+
+def quote_client_pdf(quote_id: int):
+    from .pdf_cache import proposal_fingerprint, store_pdf
+    from .views import render_quote_client_pdf
+
+    quote = proposal_quote(quote_id)
+    data = render_quote_client_pdf(quote)
+    # próximos downloads da mesma versão saem do cache, sem tarefa
+    store_pdf(proposal_fingerprint(quote), data)
+    return f"proposta_{quote.number}.pdf", "application/pdf", data
+
+
+def _supplier_pdfs(quote, groups, transportadora, cond_pagamento, observacoes, prices):
+    """(nome do arquivo, PDF) de cada fornecedor, na ordem em que ficam prontos.
+
+    reportlab é CPU-bound: com mais de um fornecedor os documentos são
+    gerados em paralelo no pool de processos do worker. Se um processo do
+    pool morrer (ex.: OOM num PDF grande), o pool é descartado e o que faltou
+    sai aqui mesmo, em série.
+    """
+    from concurrent.futures import as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    from core.jobs import discard_pool, process_pool
+    from .views import render_supplier_pdf
+
+    def _name(supplier):
+        return _safe_filename(f"pedido_{quote.number}_{supplier.name}.pdf")
+
+    args = [
+        (quote, items[0].supplier, items, transportadora, cond_pagamento, observacoes, prices)
+        for items in groups
+    ]
+    pool = process_pool() if len(args) > 1 else None
+    if pool is None:
+        for a in args:
+            yield _name(a[1]), render_supplier_pdf(*a)
+        return
+    done = set()
+    try:
+        futures = {pool.submit(render_supplier_pdf, *a): i for i, a in enumerate(args)}
+        for future in as_completed(futures):
+            i = futures[future]
+            data = future.result()
+            done.add(i)
+            yield _name(args[i][1]), data
+    except BrokenProcessPool:
+        discard_pool(pool)
+        for i, a in enumerate(args):
+            if i not in done:
+                yield _name(a[1]), render_supplier_pdf(*a)
+
+
+def quote_supplier_pdfs(quote_id: int, transportadora: str, cond_pagamento: str,
+                        observacoes: str, prices: dict):
+    """Um PDF por fornecedor; ZIP (gravado aos poucos em arquivo temporário) se mais de um."""
+    quote = (
+        Quote.objects.select_related("customer", "seller")
+        .prefetch_related("items", "items__supplier")
+        .get(pk=quote_id)
+    )
+    by_supplier = defaultdict(list)
+    for item in quote.items.all():
+        if item.supplier_id:
+            by_supplier[item.supplier_id].append(item)
+    if not by_supplier:
+        raise ValueError("Nenhum item com fornecedor cadastrado neste orçamento.")
+
+    pdfs = _supplier_pdfs(
+        quote, list(by_supplier.values()), transportadora, cond_pagamento, observacoes, _prices(prices),
+    )
+    if len(by_supplier) == 1:
+        filename, data = next(pdfs)
+        return filename, "application/pdf", data
+
+    archive = tempfile.TemporaryFile()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for filename, data in pdfs:
+            zf.writestr(filename, data)
+    archive.seek(0)
+    return f"pedidos_{quote.number}.zip", "application/zip", archive
+
+
+def order_pdf(order_id: int, prices: dict):
+    from .views import render_order_pdf
+
+    order = Order.objects.select_related(
+        "quote", "supplier", "quote__customer", "quote__seller",
+    ).get(pk=order_id)
+    supplier_name = order.supplier.name if order.supplier else "sem_fornecedor"
+    filename = _safe_filename(f"pedido_{order.number}_{supplier_name}.pdf")
+    return filename, "application/pdf", render_order_pdf(order, _prices(prices))
@@ -1,5 +1,7 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.db.models import Prefetch
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.utils.functional import cached_property
 from django.utils import timezone
 
 from .models import Quote, QuoteItem, QuoteItemImage, Order, OrderItem, SOLD_STATUSES
@@ -191,10 +193,31 @@ class QuoteItemForm(forms.ModelForm):
         }
 
 
+class BaseQuoteItemFormSet(BaseInlineFormSet):
+    """Itens com as imagens pré-carregadas e a lista de fornecedores lida uma
+    vez para o formset inteiro — sem isso cada linha fazia 2 queries."""
+
+    def __init__(self, *args, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = QuoteItem.objects.prefetch_related(
+                Prefetch("images", queryset=QuoteItemImage.objects.order_by("pk"))
+            )
+        super().__init__(*args, queryset=queryset, **kwargs)
+
+    @cached_property
+    def _supplier_choices(self):
+        return list(self.form.base_fields["supplier"].choices)
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        form.fields["supplier"].choices = self._supplier_choices
+
+
 QuoteItemFormSet = inlineformset_factory(
     Quote,
     QuoteItem,
     form=QuoteItemForm,
+    formset=BaseQuoteItemFormSet,
     extra=1,
     can_delete=True,
 )
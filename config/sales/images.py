@@ -0,0 +1,97 @@
+"""Normalização das fotos dos itens do orçamento, fora do request.
+
+O upload grava o arquivo original (`QuoteItemImage.normalized=False`) e
+enfileira uma tarefa (core/jobs.py). O worker gera a versão normalizada —
+orientação EXIF aplicada, foto inteira encaixada num quadro branco de
+QUOTE_ITEM_IMAGE_SIZE, JPEG — e a miniatura das telas, e só então troca os
+arquivos no registro e apaga o original.
+
+Foto de celular (4000×3000) é reduzida já na decodificação: `draft()` faz o
+decodificador JPEG entregar 1/2, 1/4 ou 1/8 do tamanho, e `reduce()` faz o
+mesmo (por média de blocos, barato) para outros formatos; o LANCZOS final
+trabalha sobre uma imagem poucas vezes maior que o quadro.
+"""
+from __future__ import annotations
+
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps
+
+from .models import QUOTE_ITEM_IMAGE_SIZE, QuoteItemImage
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (120, 120)  # 60px nas telas, 2x para telas retina
+
+
+def _open_reduced(fh, box: tuple[int, int]) -> PILImage.Image:
+    """Abre a imagem já reduzida para perto de `box` e com a orientação EXIF aplicada."""
+    img = PILImage.open(fh)
+    # lado maior nos dois eixos: a foto ainda pode girar 90° no exif_transpose
+    side = max(box)
+    img.draft("RGB", (side, side))
+    factor = min(img.width, img.height) // side
+    if factor >= 2:
+        img = img.reduce(factor)
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = PILImage.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def _jpeg(img: PILImage.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def normalized_variants(fh) -> tuple[bytes, bytes]:
+    """(imagem normalizada, miniatura) em JPEG a partir do arquivo original."""
+    img = _open_reduced(fh, QUOTE_ITEM_IMAGE_SIZE)
+    # Encaixa a imagem inteira no quadro mantendo proporção, SEM cortar,
+    # e centraliza sobre fundo branco (letterbox). Assim o produto nunca
+    # é cortado, independente de ser foto vertical, horizontal ou quadrada.
+    fitted = ImageOps.contain(img, QUOTE_ITEM_IMAGE_SIZE, PILImage.LANCZOS)
+    canvas = PILImage.new("RGB", QUOTE_ITEM_IMAGE_SIZE, (255, 255, 255))
+    canvas.paste(fitted, (
+        (QUOTE_ITEM_IMAGE_SIZE[0] - fitted.width) // 2,
+        (QUOTE_ITEM_IMAGE_SIZE[1] - fitted.height) // 2,
+    ))
+    thumb = canvas.resize(THUMBNAIL_SIZE, PILImage.LANCZOS)
+    return _jpeg(canvas, 90), _jpeg(thumb, 85)
+
+
+def normalize_item_image(image_id: int) -> None:
+    """Tarefa: troca o original de uma QuoteItemImage pela versão normalizada."""
+    record = QuoteItemImage.objects.filter(pk=image_id, normalized=False).first()
+    if record is None or not record.image:
+        return  # já normalizada, ou apagada/substituída antes do worker chegar
+    original = record.image.name
+    storage = record.image.storage
+    try:
+        with record.image.open("rb") as fh:
+            full, thumb = normalized_variants(fh)
+    except Exception:
+        # Arquivo que o PIL não lê fica como veio (o PDF mostra o placeholder).
+        logger.warning("Falha ao normalizar imagem %s; mantendo original.", image_id, exc_info=True)
+        QuoteItemImage.objects.filter(pk=image_id).update(normalized=True)
+        return
+
+    base = original.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    record.image.save(f"{base}.jpg", ContentFile(full), save=False)
+    record.thumbnail.save(f"{base}_thumb.jpg", ContentFile(thumb), save=False)
+    # Só troca se o registro ainda aponta para o original que foi lido.
+    swapped = QuoteItemImage.objects.filter(pk=image_id, image=original).update(
+        image=record.image.name, thumbnail=record.thumbnail.name, normalized=True,
+    )
+    if swapped:
+        # uma cópia do orçamento pode apontar para o mesmo original
+        QuoteItemImage.delete_unshared_files(original, storage=storage)
+    else:
+        storage.delete(record.image.name)
+        storage.delete(record.thumbnail.name)
@@ -0,0 +1,49 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Customer, Supplier
+from sales.models import OrderItem, Quote, QuoteItem
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo médio de geração dos PDFs de pedido de compra (dados em memória, sem banco)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=100, help='Documentos por medição')
+        parser.add_argument('--items', type=int, default=15, help='Itens por documento')
+
+    def handle(self, *args, **options):
+        from accounts.models import User
+        from sales.models import Order
+        from sales.views import render_order_pdf, render_supplier_pdf
+
+        n_docs, n_items = options['docs'], options['items']
+        supplier = Supplier(id=1, name='Fornecedor Exemplo', phone='(11) 4000-0000', email='compras@exemplo.com')
+        quote = Quote(
+            number='ORC-BENCH', customer=Customer(name='Cliente Exemplo'), seller=User(username='vendedor'),
+            quote_date=timezone.localdate(), delivery_days_min=20, delivery_days_max=30,
+        )
+        quote_items = [
+            QuoteItem(id=i, product_name=f'Produto {i}', description='Tecido linho, pés em madeira', quantity=2)
+            for i in range(n_items)
+        ]
+        prices = {i: Decimal('1234.56') for i in range(n_items)}
+        order = Order(id=1, number='LOJA-BENCH', supplier=supplier, created_at=timezone.now(), notes='Entregar embalado.')
+        order_items = [OrderItem(id=i, product_name=f'Produto {i}', quantity=2) for i in range(n_items)]
+        # sem banco: a lista de itens do pedido vem da memória
+        order._prefetched_objects_cache = {'items': order_items}
+
+        cases = [
+            ('fornecedor', lambda: render_supplier_pdf(quote, supplier, quote_items, 'A combinar', '28 DDL', 'Obs.', prices)),
+            ('pedido', lambda: render_order_pdf(order, prices)),
+        ]
+        for label, render in cases:
+            render()  # aquece fontes e caches de estilo
+            start = time.perf_counter()
+            for _ in range(n_docs):
+                render()
+            per_doc = (time.perf_counter() - start) / n_docs * 1000
+            self.stdout.write(f'{label}: {per_doc:.1f} ms/documento ({n_items} itens, {n_docs} documentos)')
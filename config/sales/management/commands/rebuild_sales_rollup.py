@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sales.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula do zero o resumo mensal de vendas (SalesMonthRollup) usado pelos painéis'
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Resumo mensal refeito: {count} linha(s).'))
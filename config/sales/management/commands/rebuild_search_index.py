@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from sales.models import SearchDocument
+from sales.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de busca (clientes, orçamentos e pedidos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-empty',
+            action='store_true',
+            help='Só recria se o índice estiver vazio (primeiro deploy).',
+        )
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and SearchDocument.objects.exists():
+            self.stdout.write('Índice de busca já preenchido; nada a fazer.')
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Índice de busca refeito: {count} documento(s).'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from sales.numbering import SERIES, sync
+
+
+class Command(BaseCommand):
+    help = 'Adianta as séries ORC-/LOJA- até o maior número já usado (após importar dados)'
+
+    def handle(self, *args, **options):
+        for series in SERIES:
+            value = sync(series)
+            self.stdout.write(self.style.SUCCESS(f'Série {series}: último número {value}.'))
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:51
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0025_order_quote_nullable'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesMonthRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_start', models.DateField(verbose_name='Início do Mês de Vendas')),
+                ('quotes_count', models.PositiveIntegerField(default=0, verbose_name='Orçamentos')),
+                ('draft_count', models.PositiveIntegerField(default=0)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('converted_count', models.PositiveIntegerField(default=0)),
+                ('pos_venda_count', models.PositiveIntegerField(default=0)),
+                ('canceled_count', models.PositiveIntegerField(default=0)),
+                ('sold_count', models.PositiveIntegerField(default=0, verbose_name='Vendas')),
+                ('sold_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Vendido (R$)')),
+                ('sold_discount_sum', models.DecimalField(decimal_places=1, default=Decimal('0.0'), max_digits=10)),
+                ('discounted_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal de Vendas',
+                'verbose_name_plural': 'Resumos Mensais de Vendas',
+                'indexes': [models.Index(fields=['month_start'], name='sales_sales_month_s_67045e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('seller', 'month_start'), name='uniq_rollup_seller_month')],
+            },
+        ),
+    ]
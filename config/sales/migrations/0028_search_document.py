@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # Só no PostgreSQL: trigramas tornam indexável o LIKE '%termo%' da busca.
+    # No SQLite (dev/testes) a tabela é pequena e fica sem índice extra.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS sales_searchdoc_text_trgm "
+        "ON sales_searchdocument USING gin (text gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS sales_searchdoc_text_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0027_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CUSTOMER', 'Cliente'), ('QUOTE', 'Orçamento'), ('ORDER', 'Pedido')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('key', models.CharField(blank=True, max_length=40)),
+                ('text', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Documento de Busca',
+                'verbose_name_plural': 'Documentos de Busca',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='uniq_search_document')],
+            },
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
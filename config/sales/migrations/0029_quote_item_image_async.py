@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:22
+
+import sales.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0028_search_document'),
+    ]
+
+    operations = [
+        # Imagens já existentes foram normalizadas no save antigo
+        migrations.AddField(
+            model_name='quoteitemimage',
+            name='normalized',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='quoteitemimage',
+            name='normalized',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='quoteitemimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to=sales.models.quote_item_image_path),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:57
+
+from django.db import migrations, models
+
+SERIES = {
+    # série → (prefixo, modelo com os números já usados)
+    "quote": ("ORC-", "Quote"),
+    "store_order": ("LOJA-", "Order"),
+}
+
+
+def _max_existing(apps, prefix, model_name):
+    model = apps.get_model("sales", model_name)
+    numbers = model.objects.filter(number__startswith=prefix).values_list("number", flat=True)
+    suffixes = (number[len(prefix):] for number in numbers)
+    return max((int(s) for s in suffixes if s.isdigit()), default=0)
+
+
+def create_sequences(apps, schema_editor):
+    # PostgreSQL: sequence nativa por série (nextval não trava nem espera
+    # commit). Outros bancos: uma linha de NumberSequence por série.
+    NumberSequence = apps.get_model("sales", "NumberSequence")
+    for series, (prefix, model_name) in SERIES.items():
+        highest = _max_existing(apps, prefix, model_name)
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.execute(
+                f"CREATE SEQUENCE IF NOT EXISTS sales_{series}_number_seq MINVALUE 0 START WITH 1"
+            )
+            if highest:
+                schema_editor.execute(
+                    f"SELECT setval('sales_{series}_number_seq', {int(highest)})"
+                )
+        else:
+            NumberSequence.objects.update_or_create(name=series, defaults={"last_value": highest})
+
+
+def drop_sequences(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for series in SERIES:
+            schema_editor.execute(f"DROP SEQUENCE IF EXISTS sales_{series}_number_seq")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0029_quote_item_image_async'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Sequência de Numeração',
+                'verbose_name_plural': 'Sequências de Numeração',
+            },
+        ),
+        migrations.RunPython(create_sequences, drop_sequences),
+    ]
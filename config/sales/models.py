@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-import io
 import logging
 import re
+from dataclasses import dataclass
 from datetime import timedelta
 from decimal import Decimal, ROUND_HALF_UP
 
@@ -10,10 +10,10 @@ logger = logging.getLogger(__name__)
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.db import models
 from django.utils import timezone
-from PIL import Image as PILImage, ImageOps
+
+from core.versioned_cache import SingletonCache
 
 
 QUOTE_ITEM_IMAGE_SIZE = (900, 900)  # Fixed normalized size for PDF
@@ -51,6 +51,20 @@ class QuoteStatus(models.TextChoices):
 SOLD_STATUSES = (QuoteStatus.CONVERTED, QuoteStatus.POS_VENDA)
 
 
+# The company's sales month runs from the 25th of one calendar month through
+# the 24th of the next, and is labeled by its closing month
+# (e.g. 25/Jun–24/Jul is the "Jul" sales month).
+SALES_MONTH_START_DAY = 25
+
+
+def sales_month_start(day):
+    """Start date (a 25th) of the sales month containing `day`."""
+    if day.day >= SALES_MONTH_START_DAY:
+        return day.replace(day=SALES_MONTH_START_DAY)
+    prev_month_end = day.replace(day=1) - timedelta(days=1)
+    return prev_month_end.replace(day=SALES_MONTH_START_DAY)
+
+
 class FreightResponsible(models.TextChoices):
     """Responsável pelo pagamento do frete."""
     STORE = "STORE", "Frete Próprio - Empresa"
@@ -75,6 +89,41 @@ ROUNDING_STEPS = {
 }
 
 
+@dataclass(frozen=True, slots=True)
+class QuoteTotals:
+    """Valores de venda de um orçamento, calculados uma vez (ver `Quote.totals`).
+
+    Antes cada `calculate_*` refazia a cadeia inteira — e somava os itens de
+    novo: a tela de detalhe somava o subtotal quatro vezes.
+    """
+    subtotal: Decimal
+    markup_amount: Decimal
+    discount_amount: Decimal
+    freight: Decimal
+    total_with_discount: Decimal  # subtotal ajustado + frete, sem taxa
+    payment_fee: Decimal
+    rounded_total: Decimal        # total ao cliente (= snapshot)
+
+    @property
+    def final_total(self) -> Decimal:
+        return self.total_with_discount + self.payment_fee
+
+
+# Campos do Quote que entram nos totais: mudou algum, `Quote.totals` recalcula.
+TOTALS_FIELDS = (
+    "price_increase_percent",
+    "discount_percent",
+    "freight_value",
+    "payment_type_2",
+    "payment_split_amount",
+    "payment_fee_percent",
+    "payment_fee_percent_2",
+    "total_override",
+    "total_rounding_mode",
+    "total_manual_adjustment",
+)
+
+
 class QuoteQuerySet(models.QuerySet):
     def sold(self):
         """Orçamentos que contam como venda (convertidos, inclusive em Pós-Venda).
@@ -291,6 +340,7 @@ class Quote(models.Model):
             models.Index(fields=["quote_date"]),
             models.Index(fields=["sale_date"], name="sales_quote_sale_date_idx"),
             models.Index(fields=["status"]),
+            models.Index(fields=["-created_at", "-id"], name="sales_quote_keyset_idx"),
         ]
 
     def __str__(self) -> str:
@@ -318,43 +368,83 @@ class Quote(models.Model):
 
         return desc1
     
-    def calculate_subtotal(self) -> Decimal:
-        """Calcula subtotal dos itens sem desconto e sem frete."""
-        subtotal = sum(item.line_total for item in self.items.all())
-        return Decimal(str(subtotal))
-    
-    def calculate_total_with_freight_and_discount(self) -> Decimal:
-        """Calcula total com frete, ajuste de preço e desconto, mas SEM taxa de pagamento.
+    @property
+    def totals(self) -> QuoteTotals:
+        """Totais deste orçamento, guardados na instância.
 
-        O ajuste de preço (markup) e o desconto incidem apenas sobre os produtos
-        (subtotal), não sobre o frete, alinhado com o motor de simulação
-        (_run_simulation): adj = subtotal × (1 + ajuste% − desconto%).
+        Recalcula se um campo de TOTALS_FIELDS mudou, se os itens foram
+        (re)carregados por prefetch ou após `invalidate_totals()` — chamado
+        pelos sinais dos itens e por save()/refresh_from_db().
+        """
+        prefetched = getattr(self, "_prefetched_objects_cache", {}).get("items")
+        key = (prefetched, *(getattr(self, field) for field in TOTALS_FIELDS))
+        cached = self.__dict__.get("_totals")
+        if cached is None or cached[0] != key:
+            cached = (key, self._compute_totals())
+            self.__dict__["_totals"] = cached
+        return cached[1]
+
+    def invalidate_totals(self) -> None:
+        self.__dict__.pop("_totals", None)
+
+    def _compute_totals(self) -> QuoteTotals:
+        """O ajuste de preço (markup) e o desconto incidem apenas sobre os
+        produtos (subtotal), não sobre o frete, alinhado com o motor de
+        simulação (_run_simulation): adj = subtotal × (1 + ajuste% − desconto%).
+        A taxa de pagamento suporta pagamento dividido.
         """
-        subtotal = self.calculate_subtotal()
+        subtotal = Decimal(str(sum(item.line_total for item in self.items.all())))
         markup_pct = self.price_increase_percent or Decimal("0.0")
         discount_pct = self.discount_percent or Decimal("0.0")
+        freight = self.freight_value or Decimal("0.00")
         adj_subtotal = subtotal * (
             Decimal("1") + markup_pct / Decimal("100") - discount_pct / Decimal("100")
         )
-        return adj_subtotal + (self.freight_value or Decimal("0.00"))
-    
-    def calculate_payment_fee_value(self) -> Decimal:
-        """Calcula o valor da taxa de pagamento (suporta pagamento dividido)."""
-        base_total = self.calculate_total_with_freight_and_discount()
+        base_total = adj_subtotal + freight
+
         if self.payment_type_2 and self.payment_split_amount is not None:
             split_1 = min(self.payment_split_amount, base_total)
             split_2 = max(Decimal("0"), base_total - split_1)
             fee1 = split_1 * (self.payment_fee_percent or Decimal("0")) / Decimal("100")
             fee2 = split_2 * (self.payment_fee_percent_2 or Decimal("0")) / Decimal("100")
-            return fee1 + fee2
-        fee_value = base_total * (self.payment_fee_percent or Decimal("0.000")) / Decimal("100")
-        return fee_value
-    
+            payment_fee = fee1 + fee2
+        else:
+            payment_fee = base_total * (self.payment_fee_percent or Decimal("0.000")) / Decimal("100")
+
+        return QuoteTotals(
+            subtotal=subtotal,
+            markup_amount=subtotal * markup_pct / Decimal("100"),
+            discount_amount=subtotal * discount_pct / Decimal("100"),
+            freight=freight,
+            total_with_discount=base_total,
+            payment_fee=payment_fee,
+            rounded_total=self.apply_client_rounding(base_total),
+        )
+
+    def save(self, *args, **kwargs):
+        self.invalidate_totals()
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.invalidate_totals()
+        super().refresh_from_db(*args, **kwargs)
+
+    # Atalhos antigos; prefira `quote.totals`.
+    def calculate_subtotal(self) -> Decimal:
+        """Calcula subtotal dos itens sem desconto e sem frete."""
+        return self.totals.subtotal
+
+    def calculate_total_with_freight_and_discount(self) -> Decimal:
+        """Calcula total com frete, ajuste de preço e desconto, mas SEM taxa de pagamento."""
+        return self.totals.total_with_discount
+
+    def calculate_payment_fee_value(self) -> Decimal:
+        """Calcula o valor da taxa de pagamento (suporta pagamento dividido)."""
+        return self.totals.payment_fee
+
     def calculate_final_total(self) -> Decimal:
         """Calcula o total final incluindo taxa de pagamento."""
-        base_total = self.calculate_total_with_freight_and_discount()
-        fee_value = self.calculate_payment_fee_value()
-        return base_total + fee_value
+        return self.totals.final_total
 
     def apply_client_rounding(self, base: Decimal) -> Decimal:
         """Total de venda ao cliente a partir de um valor base.
@@ -379,8 +469,7 @@ class Quote(models.Model):
         pagamento — igual ao snapshot), arredonda conforme o modo escolhido e
         soma o ajuste manual (pode ser negativo).
         """
-        base = self.calculate_total_with_freight_and_discount()
-        return self.apply_client_rounding(base)
+        return self.totals.rounded_total
 
 
 
@@ -436,6 +525,10 @@ class QuoteItem(models.Model):
 class QuoteItemImage(models.Model):
     item = models.ForeignKey(QuoteItem, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to=quote_item_image_path)
+    # Miniatura para as telas (gerada junto com a normalização)
+    thumbnail = models.ImageField(upload_to=quote_item_image_path, blank=True)
+    # False enquanto `image` ainda é o arquivo original enviado (ver sales/images.py)
+    normalized = models.BooleanField(default=False)
     caption = models.CharField(max_length=120, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
@@ -443,40 +536,42 @@ class QuoteItemImage(models.Model):
         verbose_name = "Imagem do Item"
         verbose_name_plural = "Imagens do Item"
 
+    @property
+    def thumbnail_url(self) -> str:
+        return (self.thumbnail or self.image).url
+
+    @staticmethod
+    def delete_unshared_files(*names: str, storage=None) -> None:
+        """Apaga do storage os arquivos que nenhum registro usa mais.
+
+        Cópias de orçamento (sales/cloning.py) apontam para os arquivos do
+        original; apagar sem conferir quebraria a imagem do outro orçamento.
+        """
+        names = {name for name in names if name}
+        if not names:
+            return
+        used = set(
+            QuoteItemImage.objects.filter(image__in=names).values_list("image", flat=True)
+        ) | set(
+            QuoteItemImage.objects.filter(thumbnail__in=names).values_list("thumbnail", flat=True)
+        )
+        storage = storage or QuoteItemImage._meta.get_field("image").storage
+        for name in names - used:
+            storage.delete(name)
+
     def save(self, *args, **kwargs):
-        # Normalize image to fixed size on first save
-        if self.image and not self.pk:  # only on creation
-            try:
-                img = PILImage.open(self.image)
-                # Respect camera/phone orientation (EXIF) before anything else;
-                # sem isso fotos de celular saem deitadas.
-                img = ImageOps.exif_transpose(img)
-                img = img.convert("RGB")
-                # Encaixa a imagem inteira no quadro mantendo proporção, SEM cortar,
-                # e centraliza sobre fundo branco (letterbox). Assim o produto nunca
-                # é cortado, independente de ser foto vertical, horizontal ou quadrada.
-                fitted = ImageOps.contain(img, QUOTE_ITEM_IMAGE_SIZE, PILImage.LANCZOS)
-                canvas = PILImage.new("RGB", QUOTE_ITEM_IMAGE_SIZE, (255, 255, 255))
-                offset = (
-                    (QUOTE_ITEM_IMAGE_SIZE[0] - fitted.width) // 2,
-                    (QUOTE_ITEM_IMAGE_SIZE[1] - fitted.height) // 2,
-                )
-                canvas.paste(fitted, offset)
-                # Save to buffer
-                buf = io.BytesIO()
-                canvas.save(buf, format="JPEG", quality=90, optimize=True)
-                buf.seek(0)
-                # Replace the file content
-                name = self.image.name.rsplit('.', 1)[0] + '.jpg'
-                self.image.save(name, ContentFile(buf.read()), save=False)
-            except Exception:
-                logger.warning(
-                    "Falha ao processar imagem do item %s; salvando original.",
-                    self.pk or "<new>",
-                    exc_info=True,
-                )
+        # O original é gravado como veio; redimensionar foto de celular no
+        # request travava o formulário. Após o commit o worker de tarefas troca
+        # pela versão normalizada (QUOTE_ITEM_IMAGE_SIZE) + miniatura.
+        creating = self._state.adding
         super().save(*args, **kwargs)
-
+        if creating and self.image and not self.normalized:
+            from core.jobs import enqueue
+            enqueue(
+                "sales.images.normalize_item_image",
+                f"Imagem do item {self.item_id}",
+                image_id=self.pk,
+            )
 
 
 class OrderStatus(models.TextChoices):
@@ -525,6 +620,7 @@ class Order(models.Model):
             models.Index(fields=["number"]),
             models.Index(fields=["quote"]),
             models.Index(fields=["supplier"]),
+            models.Index(fields=["-created_at", "-id"], name="sales_order_keyset_idx"),
         ]
         constraints = [
             # 1 orçamento -> no máximo 1 "pedido total"
@@ -615,13 +711,17 @@ class ProposalConfig(models.Model):
 
     @classmethod
     def get_config(cls) -> "ProposalConfig":
-        obj, _ = cls.objects.get_or_create(pk=1)
-        return obj
+        """Instância em memória (somente leitura), invalidada ao salvar."""
+        return _proposal_config_cache.get()
+
+
+_proposal_config_cache = SingletonCache(ProposalConfig)
 
 
 # ── Signals to keep Quote.total_value_snapshot up to date ─────────────────────
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
+from . import snapshots
 
 
 def _refresh_quote_snapshot(quote_id: int) -> None:
@@ -633,21 +733,47 @@ def _refresh_quote_snapshot(quote_id: int) -> None:
     """
     try:
         quote = Quote.objects.prefetch_related('items').get(pk=quote_id)
-        Quote.objects.filter(pk=quote_id).update(
-            total_value_snapshot=quote.calculate_rounded_total()
-        )
     except Quote.DoesNotExist:
-        pass
+        return None
+    quote.total_value_snapshot = quote.totals.rounded_total
+    Quote.objects.filter(pk=quote_id).update(
+        total_value_snapshot=quote.total_value_snapshot
+    )
+    return quote
+
+
+def _forget_quote_totals(item) -> None:
+    # O orçamento em memória (formset, quote.items.create) guarda os totais
+    if QuoteItem.quote.is_cached(item):
+        item.quote.invalidate_totals()
 
 
 @receiver(post_save, sender=QuoteItem)
 def _on_quote_item_save(sender, instance, **kwargs):
-    _refresh_quote_snapshot(instance.quote_id)
+    _forget_quote_totals(instance)
+    # Recalcula uma vez no commit, não a cada item (sales/snapshots.py)
+    snapshots.mark_dirty(instance.quote_id)
 
 
 @receiver(post_delete, sender=QuoteItem)
 def _on_quote_item_delete(sender, instance, **kwargs):
-    _refresh_quote_snapshot(instance.quote_id)
+    _forget_quote_totals(instance)
+    snapshots.mark_dirty(instance.quote_id)
+
+
+@receiver(pre_save, sender=Quote)
+def _remember_rollup_keys(sender, instance, raw=False, **kwargs):
+    # Guarda os meses em que o orçamento contava ANTES desta gravação: mudar
+    # vendedor, data ou status tem que tirá-lo do mês antigo também.
+    if raw or not instance.pk:
+        instance._old_rollup_keys = set()
+        return
+    from .rollups import rollup_keys
+
+    old = Quote.objects.filter(pk=instance.pk).only(
+        "seller_id", "quote_date", "sale_date", "status"
+    ).first()
+    instance._old_rollup_keys = rollup_keys(old) if old else set()
 
 
 @receiver(post_save, sender=Quote)
@@ -655,9 +781,83 @@ def _on_quote_save(sender, instance, update_fields=None, **kwargs):
     # Skip if this save was triggered by _refresh_quote_snapshot itself
     if update_fields is not None and set(update_fields) == {'total_value_snapshot'}:
         return
-    # Only recalculate when financially relevant fields may have changed
-    # (runs on every save except snapshot-only saves to stay safe)
-    _refresh_quote_snapshot(instance.pk)
+    from .rollups import rollup_keys
+
+    keys = getattr(instance, "_old_rollup_keys", set()) | rollup_keys(instance)
+    snapshots.mark_dirty(instance.pk, keys)
+
+
+@receiver(post_delete, sender=Quote)
+def _on_quote_delete(sender, instance, **kwargs):
+    from .rollups import rollup_keys
+
+    snapshots.mark_rollups_dirty(rollup_keys(instance))
+
+
+# ── Rollup mensal de vendas (painéis) ──────────────────────────────────────────
+class SalesMonthRollup(models.Model):
+    """Totais por vendedor × mês de vendas (25→24), lidos pelos painéis.
+
+    Dois lados por linha: o que foi ORÇADO no mês (pela data do orçamento,
+    contagem por status — base da conversão por coorte) e o que foi VENDIDO no
+    mês (pela data da venda, ver QuoteQuerySet.sold). Mantido pelos sinais do
+    Quote (sales/rollups.py); `manage.py rebuild_sales_rollup` refaz do zero.
+    """
+    seller = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="sales_rollups",
+        verbose_name="Vendedor",
+    )
+    month_start = models.DateField(verbose_name="Início do Mês de Vendas")
+
+    # orçados no mês (quote_date), por status atual
+    quotes_count = models.PositiveIntegerField(default=0, verbose_name="Orçamentos")
+    draft_count = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    approved_count = models.PositiveIntegerField(default=0)
+    converted_count = models.PositiveIntegerField(default=0)
+    pos_venda_count = models.PositiveIntegerField(default=0)
+    canceled_count = models.PositiveIntegerField(default=0)
+
+    # vendidos no mês (sold_on)
+    sold_count = models.PositiveIntegerField(default=0, verbose_name="Vendas")
+    sold_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Total Vendido (R$)")
+    sold_discount_sum = models.DecimalField(max_digits=10, decimal_places=1, default=Decimal("0.0"))
+    discounted_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # status → coluna de contagem
+    STATUS_FIELDS = {
+        QuoteStatus.DRAFT: "draft_count",
+        QuoteStatus.SENT: "sent_count",
+        QuoteStatus.APPROVED: "approved_count",
+        QuoteStatus.CONVERTED: "converted_count",
+        QuoteStatus.POS_VENDA: "pos_venda_count",
+        QuoteStatus.CANCELED: "canceled_count",
+    }
+
+    class Meta:
+        verbose_name = "Resumo Mensal de Vendas"
+        verbose_name_plural = "Resumos Mensais de Vendas"
+        constraints = [
+            models.UniqueConstraint(fields=["seller", "month_start"], name="uniq_rollup_seller_month"),
+        ]
+        indexes = [
+            models.Index(fields=["month_start"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.seller_id} · {self.month_start:%m/%Y}"
+
+    @property
+    def cohort_sold_count(self) -> int:
+        """Orçados no mês que já viraram venda."""
+        return self.converted_count + self.pos_venda_count
+
+    def status_counts(self) -> dict:
+        return {status: getattr(self, field) for status, field in self.STATUS_FIELDS.items()}
 
 
 # ── Commission Split ───────────────────────────────────────────────────────────
@@ -761,3 +961,110 @@ class SaleDocument(models.Model):
     def is_image(self) -> bool:
         name = (self.file.name or "").lower()
         return name.endswith((".png", ".jpg", ".jpeg", ".webp", ".gif"))
+
+
+# ── Numeração ORC-/LOJA- (ver sales/numbering.py) ─────────────────────────────
+class NumberSequence(models.Model):
+    """Último número entregue de cada série. No PostgreSQL a numeração usa
+    sequences nativas e esta tabela fica vazia."""
+    name = models.CharField(max_length=20, primary_key=True)
+    last_value = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Sequência de Numeração"
+        verbose_name_plural = "Sequências de Numeração"
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.last_value}"
+
+
+# ── Índice de busca (ver sales/search.py) ──────────────────────────────────────
+class SearchDocument(models.Model):
+    """Texto normalizado de um cliente, orçamento ou pedido, para a busca."""
+
+    class Kind(models.TextChoices):
+        CUSTOMER = "CUSTOMER", "Cliente"
+        QUOTE = "QUOTE", "Orçamento"
+        ORDER = "ORDER", "Pedido"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    # identificador principal normalizado (número, CPF/CNPJ): pesa no ranking
+    key = models.CharField(max_length=40, blank=True)
+    text = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Documento de Busca"
+        verbose_name_plural = "Documentos de Busca"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="uniq_search_document"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()}: {self.title}"
+
+
+@receiver(post_save, sender="core.Customer")
+def _index_customer(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .search import index_customers, index_orders, index_quotes
+
+    # nome/documento do cliente também aparecem nos orçamentos e pedidos dele
+    index_customers([instance])
+    index_quotes(Quote.objects.filter(customer=instance))
+    index_orders(Order.objects.filter(quote__customer=instance))
+
+
+@receiver(post_save, sender="core.Supplier")
+def _index_supplier_orders(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .search import index_orders
+
+    index_orders(Order.objects.filter(supplier=instance))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def _index_seller_quotes(sender, instance, raw=False, update_fields=None, **kwargs):
+    # o username do vendedor entra no texto dos orçamentos dele
+    if raw or (update_fields and "username" not in update_fields):
+        return
+    from .search import index_quotes
+
+    index_quotes(Quote.objects.filter(seller=instance))
+
+
+@receiver(post_save, sender=Quote)
+def _index_quote(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and set(update_fields) <= {"total_value_snapshot"}):
+        return
+    from .search import index_orders, index_quotes
+
+    index_quotes(Quote.objects.filter(pk=instance.pk))
+    index_orders(Order.objects.filter(quote=instance))
+
+
+@receiver(post_save, sender=Order)
+def _index_order(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    from .search import index_orders
+
+    index_orders(Order.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender="core.Customer")
+@receiver(post_delete, sender=Quote)
+@receiver(post_delete, sender=Order)
+def _unindex(sender, instance, **kwargs):
+    from .search import unindex
+
+    kind = {
+        "Customer": SearchDocument.Kind.CUSTOMER,
+        "Quote": SearchDocument.Kind.QUOTE,
+        "Order": SearchDocument.Kind.ORDER,
+    }[sender.__name__]
+    unindex(kind, instance.pk)
@@ -0,0 +1,94 @@
+"""Números de orçamento (ORC-0001) e de pedido avulso da loja (LOJA-0001).
+
+A geração antiga travava o último registro com `select_for_update`, caía em
+`count()` se o número não seguia o padrão e testava `exists()` número a
+número até achar um livre — serializando quem criava orçamentos ao mesmo
+tempo, com várias queries cada. Aqui cada número custa um incremento
+atômico (mais um `exists()` de conferência):
+
+- PostgreSQL: `nextval()` de uma sequence por série. Não trava nada nem
+  espera o commit de quem pegou o número anterior (um número de uma
+  transação desfeita fica sem uso — buraco aceitável).
+- Outros bancos (SQLite em dev/testes): `UPDATE ... RETURNING` numa linha
+  de `NumberSequence`. O SQLite já tem um escritor por vez.
+
+A série começa do maior número já existente (migração 0030); depois de
+importar dados, `manage.py sync_number_sequences` (no start.sh) a adianta.
+"""
+from __future__ import annotations
+
+from django.db import connection
+
+from .models import NumberSequence, Order, Quote
+
+# série → (prefixo, queryset com os números já usados)
+SERIES = {
+    "quote": ("ORC-", lambda: Quote.objects.all()),
+    "store_order": ("LOJA-", lambda: Order.objects.all()),
+}
+
+
+def _pg_sequence(series: str) -> str:
+    return f"sales_{series}_number_seq"
+
+
+def max_existing(series: str) -> int:
+    """Maior número já gravado na série (0 se nenhum)."""
+    prefix, queryset = SERIES[series]
+    numbers = queryset().filter(number__startswith=prefix).values_list("number", flat=True)
+    suffixes = (number[len(prefix):] for number in numbers.iterator())
+    return max((int(s) for s in suffixes if s.isdigit()), default=0)
+
+
+def next_value(series: str) -> int:
+    """Próximo valor da série, com um incremento atômico."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT nextval(%s)", [_pg_sequence(series)])
+            return cursor.fetchone()[0]
+        table = connection.ops.quote_name(NumberSequence._meta.db_table)
+        cursor.execute(
+            f"UPDATE {table} SET last_value = last_value + 1 WHERE name = %s RETURNING last_value",
+            [series],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        # série ainda sem linha (banco criado antes de haver dados): semeia
+        NumberSequence.objects.get_or_create(
+            name=series, defaults={"last_value": max_existing(series)},
+        )
+        return next_value(series)
+    return row[0]
+
+
+def next_number(series: str) -> str:
+    """Próximo número livre da série, ex. "ORC-0042"."""
+    prefix, queryset = SERIES[series]
+    number = f"{prefix}{next_value(series):04d}"
+    # Número gravado à mão (admin, importação) à frente da série: ressincroniza
+    # uma vez em vez de testar número a número.
+    if queryset().filter(number=number).exists():
+        sync(series)
+        number = f"{prefix}{next_value(series):04d}"
+    return number
+
+
+def sync(series: str) -> int:
+    """Adianta a série até o maior número existente (nunca volta); devolve o valor."""
+    highest = max_existing(series)
+    if connection.vendor == "postgresql":
+        name = connection.ops.quote_name(_pg_sequence(series))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(%s, GREATEST(%s, CASE WHEN is_called THEN last_value "
+                f"ELSE last_value - 1 END)) FROM {name}",
+                [_pg_sequence(series), highest],
+            )
+            return cursor.fetchone()[0]
+    counter, created = NumberSequence.objects.get_or_create(
+        name=series, defaults={"last_value": highest},
+    )
+    if not created and counter.last_value < highest:
+        NumberSequence.objects.filter(name=series, last_value__lt=highest).update(last_value=highest)
+        return highest
+    return counter.last_value
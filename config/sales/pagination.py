@@ -0,0 +1,58 @@
+"""Paginação por cursor (keyset) das listas de orçamentos e pedidos.
+
+Em vez de OFFSET (que lê e descarta tudo antes da página) ou de entregar a
+lista inteira ao template, cada página continua "depois" da última linha
+vista: ordenação fixa por (created_at DESC, id DESC) — o id desempata
+registros criados no mesmo instante — e o filtro
+`created_at < c OR (created_at = c AND id < i)` usa o índice (created_at, id).
+
+Não há COUNT: busca-se uma linha a mais que o tamanho da página só para
+saber se existe continuação.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+PAGE_SIZE = 30
+ORDERING = ("-created_at", "-id")
+
+
+def encode_cursor(obj) -> str:
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str | None) -> tuple[datetime, int] | None:
+    """(created_at, id) do cursor, ou None se vazio/inválido (volta ao início)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        created_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor: str | None, page_size: int | None = None):
+    """Uma página de `queryset` após `cursor`.
+
+    Retorna (itens, próximo cursor); o próximo cursor é None na última página.
+    """
+    page_size = page_size or PAGE_SIZE
+    queryset = queryset.order_by(*ORDERING)
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    rows = list(queryset[: page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
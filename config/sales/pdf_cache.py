@@ -0,0 +1,137 @@
+"""Cache dos PDFs de proposta já renderizados, endereçado pelo conteúdo.
+
+O vendedor baixa a mesma proposta várias vezes durante a negociação, e cada
+download refazia capa, "Sobre Nós" e as páginas de itens com fotos. Aqui o
+PDF é guardado sob uma impressão digital (sha256) de tudo que ele mostra:
+campos do orçamento, cliente, vendedor, itens, imagens dos itens, fundos
+estáticos e `RENDER_VERSION`. Mudou qualquer coisa → outra impressão digital
+→ PDF novo; nada precisa ser invalidado.
+
+Os arquivos ficam em MEDIA_ROOT/pdf_cache/ (volume da Railway, sobrevive a
+deploys). O mtime marca o último uso; quando a pasta passa de
+`PROPOSAL_PDF_CACHE_MAX_BYTES`, os menos usados recentemente são apagados.
+A impressão digital também é o ETag da resposta (If-None-Match → 304).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+# Aumente ao mudar o layout do PDF: invalida todo o cache de uma vez.
+RENDER_VERSION = 2
+CACHE_SUBDIR = "pdf_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def _cache_dir() -> Path:
+    return Path(settings.MEDIA_ROOT) / CACHE_SUBDIR
+
+
+def _field_values(obj) -> list:
+    return [(f.attname, f.value_from_object(obj)) for f in obj._meta.concrete_fields]
+
+
+def _static_pages() -> list:
+    # Fundos da capa e do "Sobre Nós" (config/templates/proposal/page1|page2.*)
+    folder = settings.BASE_DIR / "config" / "templates" / "proposal"
+    try:
+        entries = sorted(os.scandir(folder), key=lambda e: e.name)
+    except OSError:
+        return []
+    return [(e.name, e.stat().st_size, e.stat().st_mtime_ns) for e in entries if e.is_file()]
+
+
+def proposal_fingerprint(quote) -> str:
+    """sha256 do conteúdo da proposta.
+
+    `quote` deve vir com customer/seller e items/items__images pré-carregados
+    (nenhuma query extra).
+    """
+    seller = quote.seller
+    payload = {
+        "v": RENDER_VERSION,
+        "quote": _field_values(quote),
+        "customer": quote.customer.name,
+        "seller": seller.get_full_name() or seller.username,
+        "items": [
+            (_field_values(item), [(img.pk, img.image.name) for img in item.images.all()])
+            for item in quote.items.all()
+        ],
+        "pages": _static_pages(),
+    }
+    raw = json.dumps(payload, default=str, sort_keys=True).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _path(fingerprint: str) -> Path:
+    return _cache_dir() / fingerprint[:2] / f"{fingerprint}.pdf"
+
+
+def cached_pdf(fingerprint: str) -> Path | None:
+    """Caminho do PDF em cache (e marca o uso), ou None."""
+    path = _path(fingerprint)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Grava `data` em `path` sem que um leitor veja o arquivo pela metade."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def store_pdf(fingerprint: str, data: bytes) -> Path:
+    """Grava o PDF e aplica o limite de tamanho."""
+    path = _path(fingerprint)
+    write_atomic(path, data)
+    evict()
+    return path
+
+
+def evict_lru(folder: Path, pattern: str, max_bytes: int) -> int:
+    """Apaga os arquivos de `folder` usados há mais tempo até caber em `max_bytes`.
+
+    Desce até 90% do limite para não varrer a pasta a cada gravação.
+    Devolve quantos arquivos foram apagados.
+    """
+    files = []
+    total = 0
+    for path in folder.glob(pattern):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    target = max_bytes * 0.9
+    for _, size, path in sorted(files, key=lambda f: f[0]):
+        if total <= target:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def evict(max_bytes: int | None = None) -> int:
+    if max_bytes is None:
+        max_bytes = getattr(settings, "PROPOSAL_PDF_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+    return evict_lru(_cache_dir(), "*/*.pdf", max_bytes)
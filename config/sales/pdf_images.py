@@ -0,0 +1,114 @@
+"""Imagens já reduzidas para os PDFs de proposta.
+
+Cada PDF passava ao `ImageReader` o arquivo original — fundos A4 de
+2480×3508 px e fotos de itens — e o PIL decodificava e o reportlab embutia
+a imagem inteira a cada renderização. Aqui cada imagem é convertida uma vez
+para o tamanho em que é impressa (`PRINT_DPI` no quadro em pontos onde é
+desenhada), em JPEG comprimido, e guardada em MEDIA_ROOT/pdf_assets/ sob o
+hash do arquivo + tamanho do quadro. Trocar a imagem muda o hash; não há o
+que invalidar.
+
+`ImageAssets` vive durante um documento e devolve o mesmo `ImageReader`
+para a mesma imagem, então ela é embutida uma vez só (um XObject por imagem).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image as PILImage, ImageOps
+
+from .pdf_cache import evict_lru, write_atomic
+
+logger = logging.getLogger(__name__)
+
+PRINT_DPI = 200
+JPEG_QUALITY = 85
+ASSET_SUBDIR = "pdf_assets"
+MAX_BYTES = 100 * 1024 * 1024
+
+
+def _asset_dir() -> Path:
+    return Path(settings.MEDIA_ROOT) / ASSET_SUBDIR
+
+
+@lru_cache(maxsize=1024)
+def _file_hash(path: str, size: int, mtime_ns: int) -> str:
+    # tamanho/mtime na chave: arquivo substituído no mesmo caminho gera hash novo
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _box_pixels(width_pt: float, height_pt: float) -> tuple[int, int]:
+    return (
+        max(1, round(width_pt / 72 * PRINT_DPI)),
+        max(1, round(height_pt / 72 * PRINT_DPI)),
+    )
+
+
+def _scaled_jpeg(source: Path, size: tuple[int, int], stretch: bool) -> bytes:
+    with PILImage.open(source) as img:
+        # JPEG: decodifica já reduzido (1/2, 1/4, 1/8) quando o quadro permite
+        img.draft("RGB", size)
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = PILImage.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        else:
+            img = img.convert("RGB")
+        if stretch:
+            if img.size != size:
+                img = img.resize(size, PILImage.LANCZOS)
+        else:
+            img.thumbnail(size, PILImage.LANCZOS)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
+
+
+def prepared_image(source, width_pt: float, height_pt: float, *, stretch: bool = False) -> Path:
+    """Caminho da versão de impressão de `source` para um quadro width×height (pt).
+
+    `stretch=True` preenche o quadro inteiro (fundos de página); senão a
+    imagem cabe no quadro mantendo a proporção (nunca é ampliada).
+    """
+    source = Path(source)
+    st = source.stat()
+    size = _box_pixels(width_pt, height_pt)
+    key = _file_hash(str(source), st.st_size, st.st_mtime_ns)
+    mode = "s" if stretch else "f"
+    path = _asset_dir() / key[:2] / f"{key}_{size[0]}x{size[1]}{mode}.jpg"
+    if not path.exists():
+        write_atomic(path, _scaled_jpeg(source, size, stretch))
+        evict_lru(_asset_dir(), "*/*.jpg", MAX_BYTES)
+    return path
+
+
+class ImageAssets:
+    """`ImageReader`s de um documento: um por imagem e tamanho de quadro."""
+
+    def __init__(self):
+        self._readers = {}
+
+    def reader(self, source, width_pt: float, height_pt: float, *, stretch: bool = False):
+        """ImageReader da versão reduzida, ou None se a imagem não puder ser lida."""
+        from reportlab.lib.utils import ImageReader
+
+        key = (str(source), width_pt, height_pt, stretch)
+        if key not in self._readers:
+            try:
+                path = prepared_image(source, width_pt, height_pt, stretch=stretch)
+                self._readers[key] = ImageReader(str(path))
+            except Exception:
+                logger.warning("Imagem ignorada no PDF: %s", source, exc_info=True)
+                self._readers[key] = None
+        return self._readers[key]
@@ -0,0 +1,234 @@
+"""Layout dos PDFs de pedido de compra (PDF do pedido e PDF por fornecedor).
+
+`render_order_pdf` e `render_supplier_pdf` montavam o mesmo documento:
+cada chamada refazia `getSampleStyleSheet()`, uma dúzia de `ParagraphStyle`
+(nomeados por fornecedor) e os `TableStyle` das tabelas. Aqui estilos,
+cores, larguras e estilos de tabela são criados uma vez por processo, e
+`build_purchase_order` monta o documento a partir de dados já prontos.
+
+Só depende do reportlab (nada de modelos), então também serve aos
+processos do pool de tarefas (core/jobs.py).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date as date_type
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import HRFlowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+NAVY  = colors.HexColor('#0A2640')
+LGRAY = colors.HexColor('#DDDDDD')
+BGROW = colors.HexColor('#F8F9FA')
+MUTED = colors.HexColor('#888888')
+
+_base = getSampleStyleSheet()['Normal']
+
+
+def _ps(name, **kw) -> ParagraphStyle:
+    return ParagraphStyle(f'po_{name}', parent=_base, **kw)
+
+
+ST_TITLE   = _ps('title',   fontSize=15, fontName='Helvetica-Bold',
+                 textColor=NAVY, alignment=TA_CENTER, spaceAfter=2)
+ST_SUB     = _ps('sub',     fontSize=9,  textColor=MUTED, alignment=TA_CENTER, spaceAfter=0)
+ST_SECTION = _ps('sec',     fontSize=9,  fontName='Helvetica-Bold',
+                 textColor=NAVY, spaceBefore=8, spaceAfter=4)
+ST_NORMAL  = _ps('normal',  fontSize=9,  leading=13)
+ST_LABEL   = _ps('label',   fontSize=7,  textColor=MUTED, leading=11)
+ST_FOOTER  = _ps('footer',  fontSize=7,  textColor=MUTED, alignment=TA_CENTER)
+ST_TH      = _ps('th',      fontSize=8,  fontName='Helvetica-Bold',
+                 textColor=colors.white, alignment=TA_CENTER)
+ST_TD_C    = _ps('td_c',    fontSize=8,  alignment=TA_CENTER)
+ST_TD_L    = _ps('td_l',    fontSize=8)
+ST_TD_G    = _ps('td_g',    fontSize=7,  textColor=colors.HexColor('#666666'))
+ST_OBS_LBL = _ps('obs_lbl', fontSize=8,  fontName='Helvetica-Bold',
+                 textColor=NAVY, spaceBefore=4, spaceAfter=3)
+ST_OBS_TXT = _ps('obs_txt', fontSize=8,  leading=12, textColor=colors.HexColor('#333333'))
+
+HALF_WIDTHS = [8.5*cm, 8.5*cm]
+FULL_WIDTH  = [17*cm]
+ITEM_WIDTHS = [0.8*cm, 4.5*cm, 6.5*cm, 1.2*cm, 2.5*cm, 2.5*cm]
+
+META_STYLE = TableStyle([
+    ('VALIGN',        (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING',   (0, 0), (-1, -1), 0),
+    ('RIGHTPADDING',  (0, 0), (-1, -1), 0),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+])
+PARTY_STYLE = TableStyle([
+    ('VALIGN',        (0, 0), (-1, -1), 'TOP'),
+    ('BOX',           (0, 0), (0, 0),   0.5, LGRAY),
+    ('BOX',           (1, 0), (1, 0),   0.5, LGRAY),
+    ('BACKGROUND',    (0, 0), (0, 0),   BGROW),
+    ('BACKGROUND',    (1, 0), (1, 0),   BGROW),
+    ('LEFTPADDING',   (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING',  (0, 0), (-1, -1), 8),
+    ('TOPPADDING',    (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+TOTAL_STYLE = TableStyle([
+    ('ALIGN',         (0, 0), (-1, -1), 'RIGHT'),
+    ('TOPPADDING',    (0, 0), (-1, -1), 4),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ('RIGHTPADDING',  (0, 0), (-1, -1), 0),
+])
+OBS_STYLE = TableStyle([
+    ('BOX',           (0, 0), (-1, -1), 0.5, LGRAY),
+    ('BACKGROUND',    (0, 0), (-1, -1), BGROW),
+    ('LEFTPADDING',   (0, 0), (-1, -1), 8),
+    ('RIGHTPADDING',  (0, 0), (-1, -1), 8),
+    ('TOPPADDING',    (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+_ITEMS_COMMANDS = [
+    ('BACKGROUND',    (0, 0), (-1, 0),  NAVY),
+    ('TEXTCOLOR',     (0, 0), (-1, 0),  colors.white),
+    ('FONTNAME',      (0, 0), (-1, 0),  'Helvetica-Bold'),
+    ('FONTSIZE',      (0, 0), (-1, 0),  8),
+    ('TOPPADDING',    (0, 0), (-1, 0),  7),
+    ('BOTTOMPADDING', (0, 0), (-1, 0),  7),
+    ('GRID',          (0, 0), (-1, -1), 0.5, LGRAY),
+    ('VALIGN',        (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING',    (0, 1), (-1, -1), 5),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
+    ('LEFTPADDING',   (0, 1), (-1, -1), 5),
+    ('RIGHTPADDING',  (0, 1), (-1, -1), 5),
+]
+_ITEMS_HEADER = ('#', 'Produto', 'Descrição', 'Qtd', 'Vlr. Unit.', 'Total')
+
+
+@lru_cache(maxsize=64)
+def items_style(rows: int) -> TableStyle:
+    """Estilo da tabela de itens com `rows` linhas de dados (zebrada)."""
+    zebra = [('BACKGROUND', (0, i), (-1, i), BGROW) for i in range(2, rows + 1, 2)]
+    return TableStyle(_ITEMS_COMMANDS + zebra)
+
+
+def fmt_brl(value) -> str:
+    s = f"{float(value):,.2f}"
+    return s.replace(',', '\x00').replace('.', ',').replace('\x00', '.')
+
+
+@dataclass(frozen=True)
+class PurchaseOrderLine:
+    product_name: str
+    description: str
+    quantity: int
+    unit_price: Decimal
+
+    @property
+    def total(self) -> Decimal:
+        return self.unit_price * self.quantity
+
+
+def build_purchase_order(
+    *,
+    meta: list[tuple[str, str]],
+    supplier,
+    client_name: str,
+    lines: list[PurchaseOrderLine],
+    total_label: str,
+    after_total: str = "",
+    notes: str = "",
+    generated_on: date_type | None = None,
+) -> bytes:
+    """PDF "PEDIDO DE COMPRA".
+
+    `meta`: linhas de duas colunas do cabeçalho (markup do reportlab, ex.
+    "<b>Pedido:</b> #LOJA-0001"). `supplier`: objeto com name/phone/email ou
+    None. `after_total`: parágrafo opcional logo abaixo do total.
+    """
+    if generated_on is None:
+        from django.utils import timezone
+        generated_on = timezone.localdate()
+
+    buf = BytesIO()
+    doc = SimpleDocTemplate(
+        buf, pagesize=A4,
+        rightMargin=2*cm, leftMargin=2*cm,
+        topMargin=2*cm, bottomMargin=2*cm,
+    )
+    els = [
+        Paragraph("ROSELAR MÓVEIS", ST_TITLE),
+        Paragraph("PEDIDO DE COMPRA", ST_SUB),
+        Spacer(1, 0.3*cm),
+        HRFlowable(width="100%", thickness=2, color=NAVY),
+        Spacer(1, 0.4*cm),
+    ]
+
+    meta_tbl = Table(
+        [[Paragraph(left, ST_NORMAL), Paragraph(right, ST_NORMAL)] for left, right in meta],
+        colWidths=HALF_WIDTHS,
+    )
+    meta_tbl.setStyle(META_STYLE)
+    els += [meta_tbl, Spacer(1, 0.4*cm)]
+
+    if supplier is not None:
+        supplier_cell = [
+            Paragraph("<b>Fornecedor</b>", ST_SECTION),
+            Paragraph(supplier.name, ST_NORMAL),
+        ]
+        if supplier.phone:
+            supplier_cell.append(Paragraph(f"Tel: {supplier.phone}", ST_LABEL))
+        if supplier.email:
+            supplier_cell.append(Paragraph(supplier.email, ST_LABEL))
+    else:
+        supplier_cell = [Paragraph("—", ST_NORMAL)]
+    client_cell = [
+        Paragraph("<b>Cliente</b>", ST_SECTION),
+        Paragraph(client_name, ST_NORMAL),
+    ]
+    party_tbl = Table([[supplier_cell, client_cell]], colWidths=HALF_WIDTHS)
+    party_tbl.setStyle(PARTY_STYLE)
+    els += [party_tbl, Spacer(1, 0.5*cm), Paragraph("ITENS DO PEDIDO", ST_SECTION)]
+
+    rows = [[Paragraph(h, ST_TH) for h in _ITEMS_HEADER]]
+    total = Decimal('0.00')
+    for idx, line in enumerate(lines, 1):
+        total += line.total
+        rows.append([
+            Paragraph(str(idx),                          ST_TD_C),
+            Paragraph(line.product_name,                 ST_TD_L),
+            Paragraph(line.description.strip() or '—',   ST_TD_G),
+            Paragraph(str(line.quantity),                ST_TD_C),
+            Paragraph(f"R$ {fmt_brl(line.unit_price)}",  ST_TD_C),
+            Paragraph(f"R$ {fmt_brl(line.total)}",       ST_TD_C),
+        ])
+    items_tbl = Table(rows, colWidths=ITEM_WIDTHS, repeatRows=1)
+    items_tbl.setStyle(items_style(len(rows) - 1))
+    els += [items_tbl, Spacer(1, 0.3*cm)]
+
+    total_tbl = Table(
+        [[Paragraph(f"<b>{total_label}:</b> R$ {fmt_brl(total)}", ST_NORMAL)]],
+        colWidths=FULL_WIDTH,
+    )
+    total_tbl.setStyle(TOTAL_STYLE)
+    els.append(total_tbl)
+
+    if after_total:
+        els += [Spacer(1, 0.2*cm), Paragraph(after_total, ST_NORMAL)]
+
+    if notes:
+        obs_tbl = Table(
+            [[[Paragraph("OBSERVAÇÕES", ST_OBS_LBL), Paragraph(notes, ST_OBS_TXT)]]],
+            colWidths=FULL_WIDTH,
+        )
+        obs_tbl.setStyle(OBS_STYLE)
+        els += [Spacer(1, 0.4*cm), obs_tbl]
+
+    els += [
+        Spacer(1, 0.8*cm),
+        HRFlowable(width="100%", thickness=0.5, color=LGRAY),
+        Spacer(1, 0.2*cm),
+        Paragraph(f"Gerado em {generated_on.strftime('%d/%m/%Y')} | Roselar Móveis", ST_FOOTER),
+    ]
+    doc.build(els)
+    return buf.getvalue()
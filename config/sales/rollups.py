@@ -0,0 +1,173 @@
+"""Manutenção do SalesMonthRollup (vendedor × mês de vendas).
+
+Cada orçamento conta em até dois baldes do mesmo vendedor: o mês em que foi
+orçado (quote_date) e, se vendido, o mês da venda (sold_on). Ao mudar um
+orçamento, só esses baldes (antigos e novos) são recalculados, com duas
+agregações no banco cada — os painéis leem poucas linhas em vez de varrer
+os orçamentos.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, ExpressionWrapper, IntegerField, Q, Sum, Value, When,
+)
+from django.db.models.functions import ExtractDay, ExtractMonth, ExtractYear
+from django.db.models.lookups import LessThan
+
+from .models import (
+    SOLD_STATUSES,
+    SALES_MONTH_START_DAY,
+    Quote,
+    SalesMonthRollup,
+    sales_month_start,
+)
+
+
+def next_sales_month_start(start):
+    """Next sales month's start, given a sales-month start (a 25th)."""
+    return (start.replace(day=28) + timedelta(days=10)).replace(day=SALES_MONTH_START_DAY)
+
+
+def rollup_keys(quote) -> set[tuple[int, object]]:
+    """Baldes (seller_id, início do mês) em que `quote` conta."""
+    if quote is None or not quote.seller_id:
+        return set()
+    keys = set()
+    if quote.quote_date:
+        keys.add((quote.seller_id, sales_month_start(quote.quote_date)))
+    if quote.status in SOLD_STATUSES:
+        sold_on = quote.sale_date or quote.quote_date
+        if sold_on:
+            keys.add((quote.seller_id, sales_month_start(sold_on)))
+    return keys
+
+
+def _bucket_values(seller_id: int, month_start) -> dict:
+    month_end = next_sales_month_start(month_start) - timedelta(days=1)
+    values = {field: 0 for field in SalesMonthRollup.STATUS_FIELDS.values()}
+
+    created = (
+        Quote.objects.filter(seller_id=seller_id, quote_date__gte=month_start, quote_date__lte=month_end)
+        .values("status")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for row in created:
+        field = SalesMonthRollup.STATUS_FIELDS.get(row["status"])
+        if field:
+            values[field] = row["n"]
+    values["quotes_count"] = sum(values.values())
+
+    sold = Quote.objects.sold().filter(
+        seller_id=seller_id, sold_on__gte=month_start, sold_on__lte=month_end
+    ).aggregate(
+        sold_count=Count("id"),
+        sold_total=Sum("total_value_snapshot"),
+        sold_discount_sum=Sum("discount_percent"),
+        discounted_count=Count("id", filter=Q(discount_percent__gt=0)),
+    )
+    values["sold_count"] = sold["sold_count"] or 0
+    values["sold_total"] = sold["sold_total"] or Decimal("0")
+    values["sold_discount_sum"] = sold["sold_discount_sum"] or Decimal("0")
+    values["discounted_count"] = sold["discounted_count"] or 0
+    return values
+
+
+def refresh_rollups(keys) -> None:
+    """Recalcula os baldes `keys` a partir dos orçamentos."""
+    from core.metrics import invalidate_metrics
+
+    invalidate_metrics(keys)
+    # Ordem fixa: dois flushes com baldes em comum não travam um ao outro.
+    for seller_id, month_start in sorted(keys):
+        with transaction.atomic():
+            # Lê as agregações só depois de travar a linha: um flush
+            # concorrente do mesmo balde espera e lê já com este commit.
+            row, _ = SalesMonthRollup.objects.select_for_update().get_or_create(
+                seller_id=seller_id, month_start=month_start,
+            )
+            values = _bucket_values(seller_id, month_start)
+            if not values["quotes_count"] and not values["sold_count"]:
+                row.delete()
+                continue
+            for field, value in values.items():
+                setattr(row, field, value)
+            row.save()
+
+
+def sales_month_index(field: str):
+    """Índice inteiro do mês de vendas de `field`: ano*12 + (mês-1), um a menos
+    antes do dia 25. Só aritmética e EXTRACT, então roda igual no SQLite e no
+    PostgreSQL e serve para GROUP BY; `month_from_index` devolve a data (dia 25).
+    """
+    return ExpressionWrapper(
+        ExtractYear(field) * 12 + ExtractMonth(field) - 1
+        - Case(When(LessThan(ExtractDay(field), SALES_MONTH_START_DAY), then=Value(1)), default=Value(0)),
+        output_field=IntegerField(),
+    )
+
+
+def month_from_index(index: int):
+    return date(index // 12, index % 12 + 1, SALES_MONTH_START_DAY)
+
+
+def rebuild_rollups() -> int:
+    """Refaz a tabela inteira a partir de duas agregações no banco
+    (vendedor × mês de vendas). Retorna nº de linhas."""
+    buckets: dict = defaultdict(lambda: {
+        **{field: 0 for field in SalesMonthRollup.STATUS_FIELDS.values()},
+        "quotes_count": 0,
+        "sold_count": 0,
+        "sold_total": Decimal("0"),
+        "sold_discount_sum": Decimal("0"),
+        "discounted_count": 0,
+    })
+    quotes = Quote.objects.filter(seller__isnull=False)
+
+    created = (
+        quotes.annotate(bucket=sales_month_index("quote_date"))
+        .values("seller_id", "bucket", "status")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for row in created:
+        b = buckets[(row["seller_id"], month_from_index(row["bucket"]))]
+        b["quotes_count"] += row["n"]
+        field = SalesMonthRollup.STATUS_FIELDS.get(row["status"])
+        if field:
+            b[field] += row["n"]
+
+    sold = (
+        quotes.sold()
+        .annotate(bucket=sales_month_index("sold_on"))
+        .values("seller_id", "bucket")
+        .annotate(
+            sold_count=Count("id"),
+            sold_total=Sum("total_value_snapshot"),
+            sold_discount_sum=Sum("discount_percent"),
+            discounted_count=Count("id", filter=Q(discount_percent__gt=0)),
+        )
+        .order_by()
+    )
+    for row in sold:
+        b = buckets[(row["seller_id"], month_from_index(row["bucket"]))]
+        b["sold_count"] = row["sold_count"]
+        b["sold_total"] = row["sold_total"] or Decimal("0")
+        b["sold_discount_sum"] = row["sold_discount_sum"] or Decimal("0")
+        b["discounted_count"] = row["discounted_count"]
+
+    with transaction.atomic():
+        SalesMonthRollup.objects.all().delete()
+        SalesMonthRollup.objects.bulk_create(
+            [
+                SalesMonthRollup(seller_id=seller_id, month_start=month_start, **values)
+                for (seller_id, month_start), values in buckets.items()
+            ],
+            batch_size=500,
+        )
+    return len(buckets)
@@ -0,0 +1,185 @@
+"""Índice de busca: uma linha (SearchDocument) por cliente, orçamento e pedido.
+
+A busca antiga fazia `icontains` em várias colunas de tabelas ligadas por
+JOIN (cliente, vendedor, fornecedor). Aqui cada registro vira um texto só,
+já normalizado — minúsculo, sem acento ("João" = "joao"), pontuação como
+espaço e CPF/CNPJ também só com dígitos —, mantido pelos sinais em
+sales/models.py. Buscar é filtrar uma tabela, sem JOIN; no PostgreSQL um
+índice GIN de trigramas (migração 0028) atende o `LIKE '%termo%'`.
+
+`manage.py rebuild_search_index` refaz tudo (após importar dados, por ex.);
+com `--if-empty` (usado no deploy) só quando o índice ainda está vazio.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+
+from .models import Order, Quote, SearchDocument
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_DOCUMENT_LIKE = re.compile(r"[\d.\-/ ]+")
+
+
+def normalize(value) -> str:
+    """'João-Silva  Ltda.' → 'joao silva ltda'."""
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def _digits(value) -> str:
+    return re.sub(r"\D", "", value or "")
+
+
+def search_terms(query: str) -> list[str]:
+    """Termos da consulta; CPF/CNPJ/telefone digitado com máscara vira só dígitos."""
+    query = (query or "").strip()
+    if _DOCUMENT_LIKE.fullmatch(query) and _digits(query):
+        return [_digits(query)]
+    return normalize(query).split()
+
+
+def _join(*parts) -> str:
+    # espaços nas pontas: " termo" casa início de palavra (usado no ranking)
+    return " " + " ".join(p for p in (normalize(x) for x in parts) if p) + " "
+
+
+# ── Documentos ──────────────────────────────────────────────────────────────
+def _customer_doc(customer) -> SearchDocument:
+    return SearchDocument(
+        kind=SearchDocument.Kind.CUSTOMER,
+        object_id=customer.pk,
+        title=str(customer)[:200],
+        key=_digits(customer.cpf or customer.cnpj) or normalize(customer.name)[:40],
+        text=_join(customer.name, customer.cpf, customer.cnpj, _digits(customer.cpf), _digits(customer.cnpj)),
+    )
+
+
+def _quote_doc(quote) -> SearchDocument:
+    customer = quote.customer
+    return SearchDocument(
+        kind=SearchDocument.Kind.QUOTE,
+        object_id=quote.pk,
+        title=f"{quote.number} – {customer.name}"[:200],
+        key=normalize(quote.number)[:40],
+        text=_join(
+            quote.number, customer.name, _digits(customer.cpf), _digits(customer.cnpj),
+            quote.seller.username if quote.seller_id else "",
+        ),
+    )
+
+
+def _order_doc(order) -> SearchDocument:
+    quote = order.quote
+    return SearchDocument(
+        kind=SearchDocument.Kind.ORDER,
+        object_id=order.pk,
+        title=f"OC {order.number}"[:200],
+        key=normalize(order.number)[:40],
+        text=_join(
+            order.number,
+            quote.number if quote else "",
+            quote.customer.name if quote else "",
+            order.supplier.name if order.supplier_id else "",
+            order.notes,
+        ),
+    )
+
+
+def _save(docs: list[SearchDocument]) -> None:
+    if docs:
+        SearchDocument.objects.bulk_create(
+            docs,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["title", "key", "text", "updated_at"],
+        )
+
+
+def index_customers(customers) -> None:
+    _save([_customer_doc(c) for c in customers])
+
+
+def index_quotes(quotes) -> None:
+    _save([_quote_doc(q) for q in quotes.select_related("customer", "seller")])
+
+
+def index_orders(orders) -> None:
+    _save([_order_doc(o) for o in orders.select_related("quote__customer", "supplier")])
+
+
+def unindex(kind: str, object_id: int) -> None:
+    SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild_index() -> int:
+    from core.models import Customer
+
+    # numa transação só: quem busca durante o rebuild vê o índice antigo
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        index_customers(Customer.objects.all().iterator(chunk_size=2000))
+        index_quotes(Quote.objects.all())
+        index_orders(Order.objects.all())
+        return SearchDocument.objects.count()
+
+
+# ── Consulta ────────────────────────────────────────────────────────────────
+def _matching(terms: list[str], kind: str | None = None):
+    qs = SearchDocument.objects.all()
+    if kind:
+        qs = qs.filter(kind=kind)
+    for term in terms:
+        qs = qs.filter(text__contains=term)
+    return qs
+
+
+def matching_ids(kind: str, query: str):
+    """Subquery com os ids de `kind` que casam com `query` (para `pk__in=`)."""
+    terms = search_terms(query)
+    if not terms:
+        return SearchDocument.objects.none().values("object_id")
+    return _matching(terms, kind).values("object_id")
+
+
+def search(query: str, per_kind: int = 3) -> list[SearchDocument]:
+    """Melhores `per_kind` documentos de cada tipo, em uma query.
+
+    Ranking: identificador (número/CPF/CNPJ) igual à consulta > identificador
+    começando por ela > algum termo no início de palavra > demais; empate pelo
+    mais recente.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    joined = " ".join(terms)
+    rank = Case(
+        When(key=joined, then=Value(3)),
+        When(key__startswith=joined, then=Value(2)),
+        When(text__contains=" " + terms[0], then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    qs = (
+        _matching(terms)
+        .annotate(rank=rank)
+        .annotate(row=Window(RowNumber(), partition_by=F("kind"), order_by=[F("rank").desc(), F("updated_at").desc()]))
+        .filter(row__lte=per_kind)
+    )
+    order = list(SearchDocument.Kind.values)
+    return sorted(qs, key=lambda d: (order.index(d.kind), d.row))
+
+
+def result_url(doc: SearchDocument) -> str:
+    if doc.kind == SearchDocument.Kind.QUOTE:
+        return reverse("sales:quote_detail", args=[doc.object_id])
+    if doc.kind == SearchDocument.Kind.ORDER:
+        return reverse("sales:order_detail", args=[doc.object_id])
+    return ""
@@ -0,0 +1,170 @@
+"""Motor de simulação em lote: todas as formas de pagamento × parcelas de uma vez.
+
+`_run_simulation` avalia UM cenário por chamada. O painel do simulador quer a
+grade inteira (tipo de pagamento × 1..18 parcelas) para os mesmos valores de
+subtotal/frete/desconto/acréscimo. Aqui tudo que não depende da forma de
+pagamento (subtotal ajustado, orçamento da loja, arquiteto, desconto) é
+calculado uma única vez e as colunas que dependem da taxa são derivadas em
+passadas sobre a tabela inteira de tarifas.
+
+As contas seguem a mesma ordem de operações do motor unitário, em Decimal,
+então cada célula é idêntica ao `_run_simulation` do cenário equivalente; a
+quantização para centavos acontece só na saída.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Mapping
+
+# Parcelamento máximo oferecido por tipo de pagamento.
+MAX_INSTALLMENTS = {
+    'CASH': 1, 'PIX': 1, 'DEBIT_CARD': 1, 'CREDIT_CARD': 18, 'CHEQUE': 12, 'BOLETO': 4,
+}
+
+MARGIN_BASE_RATE = Decimal("0.12")
+ARCHITECT_RATE = Decimal("0.05")
+
+_CENT = Decimal("0.01")
+_HUNDRED = Decimal("100")
+
+
+def commission_pct_for(main_method: str | None, max_parcelas: int, mld_pct: Decimal) -> Decimal:
+    """Comissão do vendedor (%) conforme LOGICA_SIMULADOR.txt.
+
+    PIX / CASH (Dinheiro):    dinâmico, clamp(mld, 2%, 5%)
+    Débito:                   4% fixo
+    Boleto à vista (1x):      4% fixo (máximo)
+    Boleto parcelado (2x+):   dinâmico, clamp(mld, 2%, 4%)
+    Crédito 1x–6x:            3% fixo
+    Crédito 7x+:              dinâmico, clamp(mld, 2%, 4%)
+    Cheque / outros:          dinâmico, clamp(mld, 2%, 4%)
+    """
+    if main_method in ('CASH', 'PIX'):
+        pct = max(Decimal('2'), min(mld_pct, Decimal('5')))
+    elif main_method == 'DEBIT_CARD':
+        pct = Decimal('4')
+    elif main_method == 'BOLETO':
+        if max_parcelas == 1:
+            pct = Decimal('4')
+        else:
+            pct = max(Decimal('2'), min(mld_pct, Decimal('4')))
+    elif main_method == 'CREDIT_CARD':
+        if max_parcelas >= 7:
+            pct = max(Decimal('2'), min(mld_pct, Decimal('4')))
+        else:
+            pct = Decimal('3')
+    else:
+        pct = max(Decimal('2'), min(mld_pct, Decimal('4')))
+    return pct.quantize(_CENT, rounding=ROUND_HALF_UP)
+
+
+def status_for(mld_pct: Decimal) -> str:
+    """VERMELHO se MLD<0, AMARELO se 0≤MLD<2, VERDE se MLD≥2."""
+    if mld_pct < Decimal('0'):
+        return "VERMELHO"
+    if mld_pct < Decimal('2'):
+        return "AMARELO"
+    return "VERDE"
+
+
+def payment_options(tariff_table: Mapping[str, Mapping[int, Decimal]], lookup_overrides: dict[str, str],
+                    payment_types: Iterable[str]) -> list[tuple[str, int, Decimal]]:
+    """Expande a tabela de tarifas em (tipo, parcelas, taxa) oferecidos ao cliente.
+
+    `tariff_table` é `PaymentTariff.table()` ({tipo: {parcelas: taxa}}). Só
+    entram combinações com tarifa cadastrada (ausência não é 0%), respeitando
+    o parcelamento máximo do tipo e a tabela emprestada (CHEQUE → cartão).
+    """
+    options = []
+    for payment_type in payment_types:
+        max_inst = MAX_INSTALLMENTS.get(payment_type, 1)
+        fees = tariff_table.get(lookup_overrides.get(payment_type, payment_type), {})
+        for installments in sorted(fees):
+            if installments <= max_inst:
+                options.append((payment_type, installments, Decimal(str(fees[installments]))))
+    return options
+
+
+def simulate_matrix(
+    *,
+    subtotal: Decimal,
+    freight_value: Decimal,
+    discount_pct: Decimal,
+    markup_pct: Decimal,
+    has_architect: bool,
+    options: list[tuple[str, int, Decimal]],
+    down_payment: Decimal = Decimal("0"),
+) -> list[dict]:
+    """Simula cada (tipo, parcelas, taxa) de `options` como forma única de pagamento.
+
+    Frete com markup por dentro pela taxa da própria célula, como em
+    `_build_simulation_context`. Devolve uma linha por opção, na mesma ordem.
+    """
+    subtotal = Decimal(str(subtotal or 0))
+    freight_value = Decimal(str(freight_value or 0))
+    discount_pct = Decimal(str(discount_pct or 0))
+    markup_pct = Decimal(str(markup_pct or 0))
+    down_payment = max(Decimal("0"), Decimal(str(down_payment or 0)))
+
+    if subtotal <= 0 or not options:
+        return []
+
+    # ---- Invariantes da grade (independem da forma de pagamento) ----
+    adj = subtotal * (Decimal('1') + (markup_pct / _HUNDRED) - (discount_pct / _HUNDRED))
+    budget = subtotal * MARGIN_BASE_RATE
+    gordura = subtotal * (markup_pct / _HUNDRED)
+    queima = subtotal * (discount_pct / _HUNDRED)
+    arquiteto = adj * (Decimal('1') - MARGIN_BASE_RATE) * ARCHITECT_RATE if has_architect else Decimal('0')
+    fixo = budget + gordura
+
+    types = [o[0] for o in options]
+    insts = [o[1] for o in options]
+    fees = [o[2] for o in options]
+
+    # ---- Colunas dependentes da taxa ----
+    freights = [
+        freight_value / (Decimal("1") - fee / _HUNDRED)
+        if fee / _HUNDRED < Decimal("1") and freight_value > 0 else freight_value
+        for fee in fees
+    ]
+    totals = [max(Decimal("0"), adj + fr) for fr in freights]
+    entradas = [
+        min(max(Decimal('0'), min(down_payment, t)), max(Decimal('0'), t)) for t in totals
+    ]
+    financed = [max(Decimal('0'), t - e) for t, e in zip(totals, entradas)]
+    # forma única: todo o financiado paga a taxa da célula
+    juros = [
+        f * fee / _HUNDRED if f > 0 and t > 0 else Decimal('0')
+        for f, t, fee in zip(financed, totals, fees)
+    ]
+    juros_frete = [
+        j * (fr / t) if t > 0 else Decimal('0')
+        for j, fr, t in zip(juros, freights, totals)
+    ]
+    saldos = [
+        fixo - ((j - jf) + arquiteto + queima) for j, jf in zip(juros, juros_frete)
+    ]
+    mlds = [(s / subtotal) * _HUNDRED for s in saldos]
+
+    rows = []
+    for i, payment_type in enumerate(types):
+        comissao = commission_pct_for(payment_type, insts[i], mlds[i])
+        status = status_for(mlds[i])
+        installment_value = financed[i] / Decimal(insts[i]) if insts[i] > 1 else financed[i]
+        rows.append({
+            'payment_type': payment_type,
+            'installments': insts[i],
+            'fee_percent': fees[i],
+            'status': status,
+            'controls_blocked': status == "VERMELHO",
+            'mld_pct': mlds[i].quantize(_CENT, rounding=ROUND_HALF_UP),
+            'margin_balance': saldos[i].quantize(_CENT, rounding=ROUND_HALF_UP),
+            'freight_charged': freights[i].quantize(_CENT, rounding=ROUND_HALF_UP),
+            'final_total': totals[i].quantize(_CENT, rounding=ROUND_HALF_UP),
+            'financed': financed[i].quantize(_CENT, rounding=ROUND_HALF_UP),
+            'bank_interest': juros[i].quantize(_CENT, rounding=ROUND_HALF_UP),
+            'installment_value': installment_value.quantize(_CENT, rounding=ROUND_HALF_UP),
+            'commission_pct': comissao,
+            'commission_value': (adj * (comissao / _HUNDRED)).quantize(_CENT, rounding=ROUND_HALF_UP),
+        })
+    return rows
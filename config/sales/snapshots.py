@@ -0,0 +1,77 @@
+"""Recálculo do `Quote.total_value_snapshot` (e dos rollups) uma vez por commit.
+
+Os sinais de QuoteItem e Quote recalculavam o snapshot a cada gravação —
+buscando o orçamento com todos os itens e fazendo um UPDATE. Salvar um
+formset de N itens (ou duplicar um orçamento item a item) custava O(N²) e
+2N+ queries a mais. Agora os sinais só chamam `mark_dirty()`: o id do
+orçamento (e os baldes do rollup em que ele contava antes) fica anotado na
+thread até o commit, e `flush()` roda uma vez em `transaction.on_commit`,
+recalculando cada orçamento e cada balde uma vez só. Toda marcação agenda
+um `flush`: o primeiro a rodar esvazia a fila e os demais não acham nada.
+Assim um savepoint desfeito (que leva junto os callbacks dele) nunca deixa
+marcação sem flush; no pior caso um orçamento que não mudou é recalculado.
+
+Fora de transação o on_commit roda na hora — mesmo comportamento de antes.
+Código que grava vários itens fora de uma view (comandos, shell) deve usar
+`with batch():`, que é um `transaction.atomic()` com esse propósito.
+
+Durante a transação o snapshot no banco fica velho; quem precisa do total
+antes do commit usa `quote.totals.rounded_total`.
+"""
+from __future__ import annotations
+
+import threading
+
+from django.db import transaction
+
+_local = threading.local()
+
+
+def _pending() -> dict:
+    # quote_id → baldes do rollup que a mudança afetou (antes/depois)
+    if not hasattr(_local, "quotes"):
+        _local.quotes = {}
+        _local.rollup_keys = set()
+    return _local.quotes
+
+
+def mark_dirty(quote_id: int | None, rollup_keys=()) -> None:
+    """Agenda o recálculo do orçamento `quote_id` para o commit."""
+    pending = _pending()
+    if quote_id is not None:
+        pending.setdefault(quote_id, set()).update(rollup_keys)
+    else:
+        _local.rollup_keys.update(rollup_keys)
+    transaction.on_commit(flush)
+
+
+def mark_rollups_dirty(rollup_keys) -> None:
+    """Agenda só baldes do rollup (ex.: orçamento apagado)."""
+    mark_dirty(None, rollup_keys)
+
+
+def flush() -> None:
+    """Recalcula os orçamentos e baldes pendentes desta thread."""
+    from .models import SOLD_STATUSES, _refresh_quote_snapshot
+    from .rollups import refresh_rollups, rollup_keys
+
+    pending = _pending()
+    if not pending and not _local.rollup_keys:
+        return
+    quotes, keys = dict(pending), set(_local.rollup_keys)
+    pending.clear()
+    _local.rollup_keys.clear()
+
+    for quote_id, changed_keys in quotes.items():
+        quote = _refresh_quote_snapshot(quote_id)
+        keys |= changed_keys
+        if quote is not None and quote.status in SOLD_STATUSES:
+            # o total vendido do balde segue o snapshot recém-calculado
+            keys |= rollup_keys(quote)
+    if keys:
+        refresh_rollups(keys)
+
+
+def batch():
+    """`with batch():` — grava vários itens/orçamentos e recalcula no fim."""
+    return transaction.atomic()
@@ -1,12 +1,16 @@
+import re
+import zipfile
 from datetime import date
 from decimal import Decimal
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from django.utils import timezone
 
 from core.models import Supplier
+from core.testing import TempMediaMixin
 from sales.models import Order, OrderStatus, Quote, QuoteStatus
 
 User = get_user_model()
@@ -316,3 +320,1107 @@ class SimulationSuggestionTests(TestCase):
         self.assertTrue(ctx["controls_blocked"])
         self.assertEqual(ctx["min_increase_to_unblock"], Decimal("0"))
         self.assertEqual(ctx["suggested_increase"], Decimal("0"))
+
+
+def _sweep_reference(mld_at, target, start, limit, step=Decimal("0.1")):
+    """Varredura linear original (0,1% por passo) — referência para o solver."""
+    pi = start
+    while pi <= limit:
+        if mld_at(pi) >= target:
+            return pi - start
+        pi += step
+    return Decimal("0")
+
+
+class MarginSolverTests(TestCase):
+    """Bisecção tem que devolver exatamente o que a varredura devolvia."""
+
+    def setUp(self):
+        from core.models import PaymentTariff
+
+        PaymentTariff.objects.all().delete()
+        for inst, fee in ((1, "4.00"), (6, "3.00"), (7, "9.87"), (12, "13.30"), (18, "19.90")):
+            PaymentTariff.objects.create(
+                payment_type="CREDIT_CARD", installments=inst, fee_percent=Decimal(fee)
+            )
+        PaymentTariff.objects.create(
+            payment_type="BOLETO", installments=4, fee_percent=Decimal("8.50")
+        )
+
+    def test_solver_igual_a_varredura_em_funcao_monotona(self):
+        from sales.margin_solver import min_increase_for
+
+        for slope in (Decimal("0.37"), Decimal("1"), Decimal("2.5")):
+            for target in (Decimal("-1"), Decimal("0"), Decimal("2"), Decimal("4"), Decimal("50")):
+                for start in (Decimal("0"), Decimal("1.3"), Decimal("29.95"), Decimal("31")):
+                    fn = lambda pi, s=slope: pi * s - Decimal("7")
+                    self.assertEqual(
+                        min_increase_for(fn, target, start, Decimal("30")),
+                        _sweep_reference(fn, target, start, Decimal("30")),
+                        (slope, target, start),
+                    )
+
+    def test_poucas_avaliacoes_do_motor(self):
+        from sales.margin_solver import min_increase_for
+
+        calls = []
+
+        def fn(pi):
+            calls.append(pi)
+            return pi - Decimal("17.3")
+
+        self.assertEqual(min_increase_for(fn, Decimal("0"), Decimal("0"), Decimal("30")), Decimal("17.3"))
+        self.assertLessEqual(len(calls), 12)
+
+    def test_contexto_identico_ao_da_varredura(self):
+        from unittest import mock
+
+        from sales.views import _build_simulation_context
+
+        cenarios = []
+        for inst in (1, 6, 7, 12, 18, 9):
+            for arq in (False, True):
+                for desc in (Decimal("0"), Decimal("5"), Decimal("12.5")):
+                    cenarios.append(dict(
+                        sim_payment_type="CREDIT_CARD", sim_installments=inst,
+                        sim_has_architect=arq, sim_discount=desc,
+                    ))
+        cenarios.append(dict(
+            sim_payment_type="CREDIT_CARD", sim_installments=18, sim_has_architect=True,
+            sim_discount=Decimal("3"), sim_payment_type_2="BOLETO", sim_installments_2=4,
+            sim_split_amount=Decimal("4000"),
+        ))
+        cenarios.append(dict(
+            sim_payment_type="CREDIT_CARD", sim_installments=12, sim_has_architect=False,
+            sim_discount=Decimal("0"), down_payment_value=Decimal("2500"),
+        ))
+
+        chaves = (
+            "min_increase_to_unblock", "suggested_increase", "suggested_increase_1",
+            "suggested_increase_2", "suggestion_is_opportunity",
+        )
+        for cenario in cenarios:
+            kwargs = dict(
+                subtotal=Decimal("10000"), freight_value=Decimal("350"),
+                price_increase_pct=Decimal("0"), **cenario,
+            )
+            novo = _build_simulation_context(**kwargs)
+            with mock.patch("sales.views.min_increase_for", _sweep_reference):
+                antigo = _build_simulation_context(**kwargs)
+            for chave in chaves:
+                self.assertEqual(novo[chave], antigo[chave], (cenario, chave))
+
+
+class SimulationMatrixTests(TestCase):
+    """Motor em lote: cada célula igual ao motor unitário do mesmo cenário."""
+
+    def setUp(self):
+        from core.models import PaymentTariff
+
+        PaymentTariff.objects.all().delete()
+        for inst, fee in ((1, "4.00"), (6, "3.00"), (7, "9.87"), (12, "13.30"), (18, "19.90")):
+            PaymentTariff.objects.create(
+                payment_type="CREDIT_CARD", installments=inst, fee_percent=Decimal(fee)
+            )
+        for pt, inst, fee in (("PIX", 1, "0"), ("DEBIT_CARD", 1, "1.20"), ("BOLETO", 1, "0"), ("BOLETO", 4, "8.50")):
+            PaymentTariff.objects.create(payment_type=pt, installments=inst, fee_percent=Decimal(fee))
+        self.admin = User.objects.create_user(username="admin", password="x", role="ADMIN")
+
+    def _options(self):
+        from core.models import PaymentMethodType, PaymentTariff
+        from sales.simulation_matrix import payment_options
+
+        return payment_options(
+            PaymentTariff.table(),
+            PaymentTariff.TARIFF_LOOKUP_OVERRIDES,
+            PaymentMethodType.values,
+        )
+
+    def test_opcoes_respeitam_tabela_e_teto(self):
+        pares = [(pt, inst) for pt, inst, _fee in self._options()]
+        self.assertIn(("CHEQUE", 12), pares)       # tabela do cartão
+        self.assertNotIn(("CHEQUE", 18), pares)    # teto do cheque = 12x
+        self.assertNotIn(("CASH", 1), pares)       # sem tarifa, não oferece
+        self.assertIn(("CREDIT_CARD", 18), pares)
+
+    def test_celulas_iguais_ao_motor_unitario(self):
+        from decimal import ROUND_HALF_UP
+
+        from sales.simulation_matrix import simulate_matrix
+        from sales.views import _build_simulation_context
+
+        cent = Decimal("0.01")
+        for arq in (False, True):
+            for dp in (Decimal("0"), Decimal("1500")):
+                rows = simulate_matrix(
+                    subtotal=Decimal("10000"), freight_value=Decimal("350"),
+                    discount_pct=Decimal("5"), markup_pct=Decimal("2.5"),
+                    has_architect=arq, options=self._options(), down_payment=dp,
+                )
+                self.assertTrue(rows)
+                for row in rows:
+                    ctx = _build_simulation_context(
+                        subtotal=Decimal("10000"), freight_value=Decimal("350"),
+                        sim_payment_type=row["payment_type"], sim_has_architect=arq,
+                        sim_discount=Decimal("5"), price_increase_pct=Decimal("2.5"),
+                        sim_installments=row["installments"], down_payment_value=dp,
+                    )
+                    msg = (row["payment_type"], row["installments"], arq, dp)
+                    self.assertEqual(row["controls_blocked"], ctx["controls_blocked"], msg)
+                    self.assertEqual(
+                        row["margin_balance"],
+                        ctx["margin_balance"].quantize(cent, rounding=ROUND_HALF_UP), msg,
+                    )
+                    self.assertEqual(row["commission_pct"], ctx["seller_commission_percent"], msg)
+                    self.assertEqual(
+                        row["final_total"],
+                        ctx["final_total"].quantize(cent, rounding=ROUND_HALF_UP), msg,
+                    )
+                    self.assertEqual(
+                        row["installment_value"],
+                        ctx["installment_value"].quantize(cent, rounding=ROUND_HALF_UP), msg,
+                    )
+
+    def test_endpoint_devolve_grade(self):
+        self.client.login(username="admin", password="x")
+        resp = self.client.get(
+            reverse("sales:simulation_matrix_api"),
+            {"subtotal": "10000", "freight": "0", "markup": "0", "discount": "0"},
+        )
+        self.assertEqual(resp.status_code, 200)
+        tipos = {t["payment_type"]: t["options"] for t in resp.json()["types"]}
+        cartao = {o["installments"]: o for o in tipos["CREDIT_CARD"]}
+        self.assertEqual(sorted(cartao), [1, 6, 7, 12, 18])
+        self.assertTrue(cartao[12]["controls_blocked"])
+        self.assertFalse(cartao[6]["controls_blocked"])
+        self.assertEqual(tipos["CASH"], [])
+
+    def test_painel_consulta_a_grade(self):
+        self.client.login(username="admin", password="x")
+        resp = self.client.get(reverse("sales:standalone_simulation"))
+        self.assertContains(resp, reverse("sales:simulation_matrix_api"))
+
+
+class SalesMonthRollupTests(TestCase):
+    """Resumo vendedor × mês de vendas mantido pelos sinais do Quote."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.other = User.objects.create_user(username="outro", password="x", role="SELLER")
+        self.customer = Customer.objects.create(name="Cliente Teste")
+        self.supplier = Supplier.objects.create(name="Fornecedor Teste")
+
+    def _quote(self, number, **kwargs):
+        kwargs.setdefault("seller", self.seller)
+        kwargs.setdefault("quote_date", date(2026, 6, 10))
+        # o rollup é recalculado no commit (sales/snapshots.py)
+        with self.captureOnCommitCallbacks(execute=True):
+            quote = Quote.objects.create(number=number, customer=self.customer, **kwargs)
+            quote.items.create(supplier=self.supplier, product_name="Sofá", quantity=1, unit_value=Decimal("1000.00"))
+        return quote
+
+    def _row(self, seller, month_start):
+        from sales.models import SalesMonthRollup
+
+        return SalesMonthRollup.objects.filter(seller=seller, month_start=month_start).first()
+
+    def _snapshot(self):
+        from sales.models import SalesMonthRollup
+
+        return sorted(
+            SalesMonthRollup.objects.values_list(
+                "seller_id", "month_start", "quotes_count", "draft_count", "converted_count",
+                "sold_count", "sold_total", "sold_discount_sum", "discounted_count",
+            )
+        )
+
+    def test_quote_counts_in_its_sales_month(self):
+        self._quote("ORC-1")
+        row = self._row(self.seller, date(2026, 5, 25))
+        self.assertEqual(row.quotes_count, 1)
+        self.assertEqual(row.draft_count, 1)
+        self.assertEqual(row.sold_count, 0)
+
+    def test_conversion_moves_total_to_sale_month(self):
+        quote = self._quote("ORC-1")
+        quote.status = QuoteStatus.CONVERTED
+        quote.sale_date = date(2026, 6, 26)  # já no mês de julho (25/06→24/07)
+        quote.discount_percent = Decimal("5")
+        with self.captureOnCommitCallbacks(execute=True):
+            quote.save()
+
+        june = self._row(self.seller, date(2026, 5, 25))
+        self.assertEqual(june.converted_count, 1)
+        self.assertEqual(june.cohort_sold_count, 1)
+        self.assertEqual(june.sold_count, 0)
+        july = self._row(self.seller, date(2026, 6, 25))
+        self.assertEqual(july.quotes_count, 0)
+        self.assertEqual(july.sold_count, 1)
+        self.assertEqual(july.sold_total, Quote.objects.get(pk=quote.pk).total_value_snapshot)
+        self.assertEqual(july.discounted_count, 1)
+
+    def test_item_change_updates_sold_total(self):
+        quote = self._quote("ORC-1", status=QuoteStatus.CONVERTED, sale_date=date(2026, 6, 10))
+        before = self._row(self.seller, date(2026, 5, 25)).sold_total
+        with self.captureOnCommitCallbacks(execute=True):
+            quote.items.create(supplier=self.supplier, product_name="Mesa", quantity=1, unit_value=Decimal("500.00"))
+        after = self._row(self.seller, date(2026, 5, 25)).sold_total
+        self.assertGreater(after, before)
+        self.assertEqual(after, Quote.objects.get(pk=quote.pk).total_value_snapshot)
+
+    def test_changing_seller_and_deleting_clean_old_buckets(self):
+        quote = self._quote("ORC-1")
+        quote.seller = self.other
+        with self.captureOnCommitCallbacks(execute=True):
+            quote.save()
+        self.assertIsNone(self._row(self.seller, date(2026, 5, 25)))
+        self.assertEqual(self._row(self.other, date(2026, 5, 25)).quotes_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quote.delete()
+        self.assertIsNone(self._row(self.other, date(2026, 5, 25)))
+
+    def test_rebuild_matches_incremental(self):
+        from sales.rollups import rebuild_rollups
+
+        self._quote("ORC-1")
+        self._quote("ORC-2", status=QuoteStatus.CONVERTED, sale_date=date(2026, 7, 1), discount_percent=Decimal("3"))
+        self._quote("ORC-3", seller=self.other, quote_date=date(2026, 6, 30), status=QuoteStatus.POS_VENDA)
+        self._quote("ORC-4", status=QuoteStatus.CANCELED, quote_date=date(2026, 4, 2))
+        incremental = self._snapshot()
+
+        self.assertEqual(rebuild_rollups(), len(incremental))
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_sql_sales_month_bucket_matches_python(self):
+        from sales.models import sales_month_start
+        from sales.rollups import month_from_index, sales_month_index
+
+        days = [date(2026, 1, 24), date(2026, 1, 25), date(2025, 12, 31), date(2026, 2, 28), date(2026, 12, 25)]
+        for i, day in enumerate(days):
+            Quote.objects.create(number=f"ORC-B{i}", customer=self.customer, seller=self.seller, quote_date=day)
+        rows = Quote.objects.annotate(bucket=sales_month_index("quote_date")).values_list("quote_date", "bucket")
+        for day, bucket in rows:
+            self.assertEqual(month_from_index(bucket), sales_month_start(day), day)
+
+    def test_dashboards_render_from_rollup(self):
+        admin = User.objects.create_user(username="admin", password="x", role="ADMIN")
+        self._quote("ORC-1", quote_date=timezone.localdate(), status=QuoteStatus.CONVERTED)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(reverse("core:index")).status_code, 200)
+        self.client.force_login(self.seller)
+        resp = self.client.get(reverse("core:dashboard"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["my_converted_count_month"], 1)
+
+
+class SnapshotCoalescingTests(TestCase):
+    """total_value_snapshot recalculado uma vez por orçamento, no commit."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.customer = Customer.objects.create(name="Cliente Teste")
+        self.supplier = Supplier.objects.create(name="Fornecedor Teste")
+
+    def _item(self, quote, value):
+        return quote.items.create(
+            supplier=self.supplier, product_name="Item", quantity=1, unit_value=Decimal(value),
+        )
+
+    def test_one_recompute_per_quote_per_transaction(self):
+        from unittest import mock
+
+        from sales import models as sales_models, snapshots
+
+        with mock.patch.object(
+            sales_models, "_refresh_quote_snapshot", wraps=sales_models._refresh_quote_snapshot,
+        ) as refresh:
+            with self.captureOnCommitCallbacks(execute=True), snapshots.batch():
+                first = Quote.objects.create(number="ORC-1", customer=self.customer, seller=self.seller)
+                second = Quote.objects.create(number="ORC-2", customer=self.customer, seller=self.seller)
+                items = [self._item(first, "100.00") for _ in range(5)]
+                items[0].quantity = 3
+                items[0].save()
+                items[1].delete()
+                self._item(second, "250.00")
+                self._item(second, "250.00")
+                self.assertEqual(refresh.call_count, 0)
+
+        self.assertEqual(sorted(c.args[0] for c in refresh.call_args_list), [first.pk, second.pk])
+        self.assertEqual(Quote.objects.get(pk=first.pk).total_value_snapshot, Decimal("600.00"))
+        self.assertEqual(Quote.objects.get(pk=second.pk).total_value_snapshot, Decimal("500.00"))
+
+    def test_marks_survive_rolled_back_savepoint(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quote = Quote.objects.create(number="ORC-1", customer=self.customer, seller=self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self._item(quote, "999.00")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self._item(quote, "100.00")
+        self.assertEqual(Quote.objects.get(pk=quote.pk).total_value_snapshot, Decimal("100.00"))
+
+    def test_flush_scheduled_before_rolled_back_savepoint_still_runs(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quote = Quote.objects.create(number="ORC-1", customer=self.customer, seller=self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._item(quote, "100.00")
+            try:
+                with transaction.atomic():
+                    self._item(quote, "999.00")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(Quote.objects.get(pk=quote.pk).total_value_snapshot, Decimal("100.00"))
+
+
+class QuoteTotalsTests(TestCase):
+    """`Quote.totals`: calculado uma vez por instância, refeito quando muda."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.quote = Quote.objects.create(
+            number="ORC-1", customer=Customer.objects.create(name="C"), seller=seller,
+            discount_percent=Decimal("10"), freight_value=Decimal("50.00"),
+            payment_fee_percent=Decimal("2"),
+        )
+        self.quote.items.create(product_name="Sofá", quantity=2, unit_value=Decimal("500.00"))
+
+    def test_values_and_immutability(self):
+        import dataclasses
+
+        totals = Quote.objects.get(pk=self.quote.pk).totals
+        self.assertEqual(totals.subtotal, Decimal("1000.00"))
+        self.assertEqual(totals.discount_amount, Decimal("100"))
+        self.assertEqual(totals.total_with_discount, Decimal("950.00"))
+        self.assertEqual(totals.payment_fee, Decimal("19"))
+        self.assertEqual(totals.final_total, Decimal("969"))
+        self.assertEqual(totals.rounded_total, Decimal("950.00"))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            totals.subtotal = Decimal("0")
+        self.assertFalse(hasattr(totals, "__dict__"))
+
+    def test_items_read_once_and_recomputed_on_change(self):
+        quote = Quote.objects.get(pk=self.quote.pk)
+        with self.assertNumQueries(1):
+            for _ in range(4):
+                quote.calculate_subtotal()
+                quote.calculate_rounded_total()
+            self.assertIs(quote.totals, quote.totals)
+
+        quote.discount_percent = Decimal("0")
+        self.assertEqual(quote.totals.total_with_discount, Decimal("1050.00"))
+
+        quote.items.create(product_name="Mesa", quantity=1, unit_value=Decimal("200.00"))
+        self.assertEqual(quote.totals.subtotal, Decimal("1200.00"))
+
+
+class QuoteCloningTests(TestCase):
+    """Duplicar orçamento e criar a partir de modelo com bulk_create."""
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+
+        from django.test import override_settings
+
+        from core.models import Customer
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.media = Path(media.name)
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.client.force_login(self.seller)
+        self.customer = Customer.objects.create(name="Cliente Teste")
+        self.supplier = Supplier.objects.create(name="Fornecedor Teste")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.original = Quote.objects.create(
+                number="ORC-0001", customer=self.customer, seller=self.seller,
+                discount_percent=Decimal("10"), freight_value=Decimal("50.00"),
+            )
+            for i in range(4):
+                self.original.items.create(
+                    supplier=self.supplier, product_name=f"Item {i}", quantity=2, unit_value=Decimal("100.00"),
+                )
+
+    def _shared_image(self):
+        from sales.models import QuoteItemImage
+
+        name = "quotes/ORC-0001/items/foto.jpg"
+        (self.media / name).parent.mkdir(parents=True)
+        (self.media / name).write_bytes(b"jpeg")
+        return QuoteItemImage.objects.create(
+            item=self.original.items.first(), image=name, thumbnail=name, normalized=True,
+        )
+
+    def test_duplicate_bulk_creates_items_and_shares_images(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from sales.models import QuoteItemImage
+
+        image = self._shared_image()
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse("sales:quote_duplicate", args=[self.original.pk]))
+        copy = Quote.objects.exclude(pk=self.original.pk).get()
+        self.assertRedirects(resp, reverse("sales:quote_edit", args=[copy.pk]), fetch_redirect_response=False)
+
+        item_inserts = [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "sales_quoteitem"')]
+        self.assertEqual(len(item_inserts), 1)
+        self.assertEqual(copy.items.count(), 4)
+        self.assertEqual(copy.discount_percent, Decimal("10"))
+        self.assertEqual(copy.total_value_snapshot, Quote.objects.get(pk=self.original.pk).total_value_snapshot)
+        self.assertEqual(copy.status, QuoteStatus.DRAFT)
+
+        copied = QuoteItemImage.objects.get(item__quote=copy)
+        self.assertEqual((copied.image.name, copied.normalized), (image.image.name, True))
+
+        # apagar a imagem da cópia não leva o arquivo do original junto
+        copied.delete()
+        QuoteItemImage.delete_unshared_files(copied.image.name)
+        self.assertTrue((self.media / image.image.name).exists())
+        image.delete()
+        QuoteItemImage.delete_unshared_files(image.image.name)
+        self.assertFalse((self.media / image.image.name).exists())
+
+    def test_create_quote_with_template_items(self):
+        from core.models import QuoteTemplate
+
+        template = QuoteTemplate.objects.create(name="Cozinha Completa")
+        template.items.create(product_name="Armário", quantity=2, default_unit_value=Decimal("300.00"))
+        template.items.create(product_name="Bancada", quantity=1, default_unit_value=Decimal("400.00"))
+
+        self.assertContains(self.client.get(reverse("sales:quote_create")), "Cozinha Completa")
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse("sales:quote_create"), {
+                "customer": self.customer.id,
+                "freight_responsible": "CUSTOMER",
+                "payment_type": "",
+                "total_override": "",
+                "notes": "",
+                "template": template.pk,
+                "items-TOTAL_FORMS": "0",
+                "items-INITIAL_FORMS": "0",
+                "items-MIN_NUM_FORMS": "0",
+                "items-MAX_NUM_FORMS": "1000",
+            })
+        self.assertEqual(resp.status_code, 302, getattr(resp, "context", None) and resp.context["form"].errors)
+        quote = Quote.objects.exclude(pk=self.original.pk).get()
+        self.assertEqual(
+            list(quote.items.order_by("pk").values_list("product_name", "quantity", "unit_value")),
+            [("Armário", 2, Decimal("300.00")), ("Bancada", 1, Decimal("400.00"))],
+        )
+        self.assertEqual(quote.total_value_snapshot, quote.calculate_rounded_total())
+        self.assertGreater(quote.total_value_snapshot, 0)
+
+
+class NumberSequenceTests(TransactionTestCase):
+    """ORC-/LOJA- com um incremento atômico, sem número repetido sob concorrência."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.customer = Customer.objects.create(name="Cliente Teste")
+
+    def test_concurrent_quote_creation_gets_distinct_numbers(self):
+        import threading
+
+        from django.db import connection, transaction
+
+        from sales.views import generate_next_quote_number
+
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("SQLite em memória não aceita escritas de várias threads")
+        threads, per_thread = 8, 5
+        start = threading.Barrier(threads)
+        errors = []
+
+        def create_quotes():
+            try:
+                start.wait()
+                for _ in range(per_thread):
+                    with transaction.atomic():
+                        Quote.objects.create(
+                            number=generate_next_quote_number(),
+                            customer=self.customer, seller=self.seller,
+                        )
+            except Exception as exc:  # pragma: no cover - falha aparece no assert
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=create_quotes) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        numbers = sorted(Quote.objects.values_list("number", flat=True))
+        self.assertEqual(numbers, [f"ORC-{i:04d}" for i in range(1, threads * per_thread + 1)])
+
+    def test_sequence_skips_numbers_entered_by_hand(self):
+        from sales.numbering import next_number
+
+        self.assertEqual(next_number("quote"), "ORC-0001")
+        Quote.objects.create(number="ORC-0002", customer=self.customer, seller=self.seller)
+        Quote.objects.create(number="ORC-0007", customer=self.customer, seller=self.seller)
+        self.assertEqual(next_number("quote"), "ORC-0008")
+        self.assertEqual(next_number("store_order"), "LOJA-0001")
+
+
+class KeysetListTests(TestCase):
+    """Listas de orçamentos/pedidos paginadas por cursor (created_at, id)."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.admin = User.objects.create_user(username="admin", password="x", role="ADMIN")
+        self.customer = Customer.objects.create(name="Cliente Teste")
+        self.supplier = Supplier.objects.create(name="Fornecedor Teste")
+        same_instant = timezone.now()
+        for i in range(7):
+            quote = Quote.objects.create(
+                number=f"ORC-{i:04d}", customer=self.customer, seller=self.seller,
+                status=QuoteStatus.SENT if i % 2 else QuoteStatus.DRAFT,
+            )
+            # metade com o mesmo created_at: o id precisa desempatar
+            if i < 4:
+                Quote.objects.filter(pk=quote.pk).update(created_at=same_instant)
+            Order.objects.create(
+                number=f"LOJA-{i:04d}", quote=None, supplier=self.supplier,
+                is_total_conference=False, status=OrderStatus.PENDING,
+            )
+
+    def _walk(self, url_name, key, params=None, page_size=3):
+        from unittest import mock
+
+        seen, cursor = [], None
+        with mock.patch("sales.pagination.PAGE_SIZE", page_size):
+            while True:
+                query = dict(params or {})
+                if cursor:
+                    query["cursor"] = cursor
+                data = self.client.get(reverse(url_name), query).json()
+                seen += re.findall(key, data["html"])
+                cursor = data["next_cursor"]
+                self.assertEqual(data["has_more"], cursor is not None)
+                if not cursor:
+                    return seen
+
+    def test_quote_pages_cover_everything_once(self):
+        self.client.force_login(self.admin)
+        seen = self._walk("sales:quote_list_page", r"ORC-\d{4}")
+        expected = list(
+            Quote.objects.order_by("-created_at", "-id").values_list("number", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_filters_are_kept_across_pages(self):
+        self.client.force_login(self.admin)
+        seen = self._walk("sales:quote_list_page", r"ORC-\d{4}", {"status": QuoteStatus.SENT}, page_size=2)
+        self.assertEqual(sorted(seen), ["ORC-0001", "ORC-0003", "ORC-0005"])
+
+    def test_order_pages_and_first_page(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(len(self._walk("sales:order_list_page", r"LOJA-\d{4}", page_size=4)), 7)
+        resp = self.client.get(reverse("sales:order_list"), {"supplier": self.supplier.pk})
+        self.assertEqual(len(resp.context["orders"]), 7)
+        self.assertIsNone(resp.context["next_cursor"])
+
+    def test_invalid_cursor_restarts(self):
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse("sales:quote_list"), {"cursor": "@@not-a-cursor"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context["quotes"]), 7)
+
+
+class SearchIndexTests(TestCase):
+    """Busca pelo índice normalizado (sales/search.py)."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        self.admin = User.objects.create_user(username="admin", password="x", role="ADMIN")
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.customer = Customer.objects.create(name="João Conceição", cpf="529.982.247-25")
+        self.other = Customer.objects.create(name="Maria Souza")
+        self.quote = Quote.objects.create(number="ORC-0101", customer=self.customer, seller=self.seller)
+        self.other_quote = Quote.objects.create(number="ORC-0102", customer=self.other, seller=self.seller)
+        self.supplier = Supplier.objects.create(name="Móveis Paraná")
+        self.order = Order.objects.create(
+            number="ORC-0101", quote=self.quote, supplier=self.supplier,
+            is_total_conference=False, notes="entregar após às 14h",
+        )
+
+    def test_accent_insensitive_list_search(self):
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse("sales:quote_list"), {"search": "joao conceicao"})
+        self.assertEqual([q.pk for q in resp.context["quotes"]], [self.quote.pk])
+        resp = self.client.get(reverse("sales:order_list"), {"search": "PARANA"})
+        self.assertEqual([o.pk for o in resp.context["orders"]], [self.order.pk])
+        resp = self.client.get(reverse("sales:order_list"), {"search": "apos"})
+        self.assertEqual([o.pk for o in resp.context["orders"]], [self.order.pk])
+
+    def test_document_with_or_without_mask(self):
+        from sales.search import search
+
+        for query in ("52998224725", "529.982.247-25", "529.982"):
+            kinds = {d.kind: d.object_id for d in search(query)}
+            self.assertEqual(kinds.get("CUSTOMER"), self.customer.pk, query)
+            self.assertEqual(kinds.get("QUOTE"), self.quote.pk, query)
+
+    def test_customer_rename_reindexes_quotes_and_orders(self):
+        from sales.search import search
+
+        self.customer.name = "Joana Dárc"
+        self.customer.save()
+        found = {(d.kind, d.object_id) for d in search("joana darc")}
+        self.assertIn(("QUOTE", self.quote.pk), found)
+        self.assertIn(("ORDER", self.order.pk), found)
+        self.assertFalse(search("conceicao"))
+
+    def test_global_search_ranked_in_one_query(self):
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(3):  # sessão + usuário + busca
+            resp = self.client.get(reverse("core:global_search"), {"q": "ORC-0102"})
+        results = resp.json()["results"]
+        quotes = [r for r in results if r["type"] == "Orçamento"]
+        self.assertEqual(quotes[0]["title"], "ORC-0102 – Maria Souza")
+        self.assertEqual(quotes[0]["url"], reverse("sales:quote_detail", args=[self.other_quote.pk]))
+
+    def test_delete_and_rebuild(self):
+        from sales.models import SearchDocument
+        from sales.search import rebuild_index
+
+        self.order.delete()
+        self.assertFalse(SearchDocument.objects.filter(kind="ORDER", object_id=self.order.pk).exists())
+        SearchDocument.objects.all().delete()
+        self.assertEqual(rebuild_index(), 4)  # 2 clientes + 2 orçamentos
+
+    def test_seller_rename_reindexes_quotes(self):
+        from sales.search import search
+
+        self.seller.username = "carla"
+        self.seller.save()
+        self.assertEqual({d.object_id for d in search("carla") if d.kind == "QUOTE"},
+                         {self.quote.pk, self.other_quote.pk})
+
+    def test_rebuild_if_empty_keeps_existing_index(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from sales.models import SearchDocument
+
+        SearchDocument.objects.filter(kind="ORDER").delete()
+        call_command("rebuild_search_index", "--if-empty", stdout=StringIO())
+        self.assertFalse(SearchDocument.objects.filter(kind="ORDER").exists())
+        SearchDocument.objects.all().delete()
+        call_command("rebuild_search_index", "--if-empty", stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 5)
+
+
+class ExportJobTests(TestCase):
+    """PDFs/ZIPs saem do request: a view enfileira e o worker gera o arquivo."""
+
+    def setUp(self):
+        import tempfile
+
+        from django.test import override_settings
+
+        from core.models import Customer
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.admin = User.objects.create_user(username="admin", password="x", role="ADMIN")
+        customer = Customer.objects.create(name="Cliente Teste")
+        self.supplier = Supplier.objects.create(name="Fornecedor A")
+        self.other_supplier = Supplier.objects.create(name="Fornecedor B")
+        self.quote = Quote.objects.create(number="ORC-0001", customer=customer, seller=self.seller)
+        self.item_a = self.quote.items.create(
+            supplier=self.supplier, product_name="Sofá", quantity=1, unit_value=Decimal("1000.00"),
+        )
+        self.item_b = self.quote.items.create(
+            supplier=self.other_supplier, product_name="Mesa", quantity=2, unit_value=Decimal("500.00"),
+        )
+
+    def _follow_job(self, resp):
+        from core.jobs import run_pending
+        from core.models import BackgroundJob, JobStatus
+
+        self.assertEqual(resp.status_code, 302)
+        job = BackgroundJob.objects.get()
+        self.assertEqual(resp["Location"], reverse("core:job_detail", args=[job.pk]))
+        self.assertEqual(self.client.get(reverse("core:job_status", args=[job.pk])).json()["status"], JobStatus.PENDING)
+
+        self.assertEqual(run_pending(), 1)
+        status = self.client.get(reverse("core:job_status", args=[job.pk])).json()
+        self.assertEqual(status["status"], JobStatus.DONE, status["error"])
+        download = self.client.get(status["download_url"])
+        self.assertEqual(download.status_code, 200)
+        job.refresh_from_db()
+        return job, b"".join(download.streaming_content)
+
+    def test_client_pdf_is_generated_by_worker(self):
+        self.client.login(username="vendedor", password="x")
+        job, data = self._follow_job(self.client.get(reverse("sales:quote_pdf_client", args=[self.quote.pk])))
+        self.assertTrue(data.startswith(b"%PDF"))
+        self.assertEqual(job.result_name, "proposta_ORC-0001.pdf")
+
+    def test_client_pdf_served_from_cache_until_quote_changes(self):
+        from core.models import BackgroundJob
+
+        self.client.login(username="vendedor", password="x")
+        url = reverse("sales:quote_pdf_client", args=[self.quote.pk])
+        _, rendered = self._follow_job(self.client.get(url))
+
+        cached = self.client.get(url)
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(b"".join(cached.streaming_content), rendered)
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=cached["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+        self.item_a.unit_value = Decimal("1100.00")
+        self.item_a.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=cached["ETag"])
+        self.assertEqual(changed.status_code, 302)
+        self.assertEqual(BackgroundJob.objects.count(), 2)
+
+    def test_client_pdf_evicted_after_lookup_is_rendered_again(self):
+        from pathlib import Path
+        from unittest import mock
+
+        from core.models import BackgroundJob
+
+        self.client.login(username="vendedor", password="x")
+        url = reverse("sales:quote_pdf_client", args=[self.quote.pk])
+        # evict_lru de outra requisição apagou o arquivo logo após a consulta
+        with mock.patch("sales.pdf_cache.cached_pdf", return_value=Path("/nao/existe.pdf")):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(BackgroundJob.objects.count(), 1)
+
+    def test_pdf_cache_evicts_least_recently_used(self):
+        import os
+
+        from sales import pdf_cache
+
+        paths = [pdf_cache.store_pdf(f"{i:02d}" + "0" * 62, b"x" * 100) for i in range(3)]
+        for age, path in zip((300, 100, 200), paths):
+            os.utime(path, (0, 1_000_000 - age))
+        pdf_cache.cached_pdf("00" + "0" * 62)  # o mais antigo acabou de ser usado
+
+        self.assertEqual(pdf_cache.evict(max_bytes=150), 2)
+        self.assertEqual([p.exists() for p in paths], [True, False, False])
+
+    def test_pdf_images_are_scaled_once_and_shared_per_document(self):
+        from django.conf import settings
+        from PIL import Image as PILImage
+
+        from sales.pdf_images import ImageAssets, prepared_image
+
+        source = f"{settings.MEDIA_ROOT}/grande.png"
+        PILImage.new("RGBA", (3000, 2000), (200, 10, 10, 255)).save(source)
+
+        path = prepared_image(source, 128, 128)
+        with PILImage.open(path) as img:
+            self.assertEqual(img.format, "JPEG")
+            self.assertEqual(img.size, (356, 237))  # 128pt a 200 dpi, proporção mantida
+        mtime = path.stat().st_mtime_ns
+        self.assertEqual(prepared_image(source, 128, 128), path)
+        self.assertEqual(path.stat().st_mtime_ns, mtime)
+
+        assets = ImageAssets()
+        self.assertIs(assets.reader(source, 128, 128), assets.reader(source, 128, 128))
+        self.assertIsNone(assets.reader(f"{settings.MEDIA_ROOT}/nao_existe.jpg", 128, 128))
+
+    def test_supplier_export_zips_one_pdf_per_supplier(self):
+        import io
+        import zipfile
+
+        self.client.login(username="admin", password="x")
+        resp = self.client.post(
+            reverse("sales:quote_pdf_supplier", args=[self.quote.pk]),
+            {f"price_{self.item_a.pk}": "700,00", f"price_{self.item_b.pk}": "300"},
+        )
+        job, data = self._follow_job(resp)
+        self.assertEqual(job.content_type, "application/zip")
+        names = zipfile.ZipFile(io.BytesIO(data)).namelist()
+        self.assertEqual(sorted(names), ["pedido_ORC-0001_Fornecedor_A.pdf", "pedido_ORC-0001_Fornecedor_B.pdf"])
+
+    def test_supplier_pdfs_render_in_process_pool(self):
+        from django.test import override_settings
+
+        from core import jobs
+        from sales.exports import quote_supplier_pdfs
+
+        params = dict(transportadora="", cond_pagamento="", observacoes="",
+                      prices={str(self.item_a.pk): "700", str(self.item_b.pk): "300"})
+        with override_settings(JOB_PROCESSES=2):
+            _, content_type, archive = quote_supplier_pdfs(self.quote.pk, **params)
+            self.assertIsNotNone(jobs._pool)
+        with archive:
+            self.assertEqual(content_type, "application/zip")
+            self.assertEqual(len(zipfile.ZipFile(archive).namelist()), 2)
+
+    def test_supplier_pdfs_survive_a_dead_pool_worker(self):
+        import os
+        from concurrent.futures.process import BrokenProcessPool
+
+        from django.test import override_settings
+
+        from core import jobs
+        from sales.exports import quote_supplier_pdfs
+
+        params = dict(transportadora="", cond_pagamento="", observacoes="",
+                      prices={str(self.item_a.pk): "700", str(self.item_b.pk): "300"})
+        with override_settings(JOB_PROCESSES=2):
+            pool = jobs.process_pool()
+            self.addCleanup(pool.shutdown)
+            with self.assertRaises(BrokenProcessPool):  # filho morto, como pelo OOM killer
+                pool.submit(os._exit, 1).result()
+            _, _, archive = quote_supplier_pdfs(self.quote.pk, **params)
+            self.assertIsNone(jobs._pool)
+            with archive:
+                self.assertEqual(len(zipfile.ZipFile(archive).namelist()), 2)
+
+            # o próximo ZIP ganha um pool novo
+            _, _, archive = quote_supplier_pdfs(self.quote.pk, **params)
+            self.assertIsNotNone(jobs._pool)
+            self.assertIsNot(jobs._pool, pool)
+            self.addCleanup(jobs.discard_pool, jobs._pool)
+            with archive:
+                self.assertEqual(len(zipfile.ZipFile(archive).namelist()), 2)
+
+    def test_order_pdf_uses_prices_from_form(self):
+        order = Order.objects.create(
+            number="LOJA-0001", quote=None, supplier=self.supplier,
+            is_total_conference=False, status=OrderStatus.PENDING,
+        )
+        item = order.items.create(product_name="Cadeira", quantity=2)
+        self.client.login(username="admin", password="x")
+        resp = self.client.post(
+            reverse("sales:order_pdf", args=[order.pk]),
+            {"transportadora": "Transp X", f"price_{item.pk}": "150,50"},
+        )
+        job, data = self._follow_job(resp)
+        self.assertTrue(data.startswith(b"%PDF"))
+        self.assertEqual(job.params["prices"], {str(item.pk): "150.50"})
+        order.refresh_from_db()
+        self.assertEqual(order.transport_info, "Transp X")
+
+    def test_job_is_private_to_its_creator(self):
+        from core.jobs import run_pending
+
+        self.client.login(username="vendedor", password="x")
+        resp = self.client.get(reverse("sales:quote_pdf_client", args=[self.quote.pk]))
+        run_pending()
+        other = User.objects.create_user(username="outro", password="x", role="SELLER")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(resp["Location"]).status_code, 404)
+
+    def test_job_result_not_served_by_media_url(self):
+        from core.jobs import run_pending
+        from core.models import BackgroundJob
+
+        self.client.login(username="vendedor", password="x")
+        self.client.get(reverse("sales:quote_pdf_client", args=[self.quote.pk]))
+        run_pending()
+        job = BackgroundJob.objects.get()
+        self.assertTrue(job.result.name.startswith("jobs/"))
+        self.assertEqual(self.client.get(f"/media/{job.result.name}").status_code, 404)
+
+    def test_failed_handler_marks_job_failed(self):
+        from core.jobs import enqueue, run_pending
+        from core.models import JobStatus
+
+        job = enqueue("sales.exports.quote_client_pdf", "Proposta", self.seller, quote_id=999999)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertTrue(job.error)
+
+    def test_concurrent_claim_takes_job_once(self):
+        from core.jobs import claim_next, enqueue
+
+        enqueue("sales.exports.quote_client_pdf", "Proposta", self.seller, quote_id=self.quote.pk)
+        self.assertIsNotNone(claim_next())
+        self.assertIsNone(claim_next())
+
+
+class QueryBudgetTests(TestCase):
+    """Número de queries não pode crescer com a quantidade de itens."""
+
+    def setUp(self):
+        import tempfile
+
+        from django.test import override_settings
+
+        from core.models import Customer
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        self.customer = Customer.objects.create(name="Cliente Teste")
+        self.supplier = Supplier.objects.create(name="Fornecedor Teste")
+        self.client.force_login(self.seller)
+
+    def _quote_with_items(self, n):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image as PILImage
+
+        from sales.models import QuoteItemImage
+
+        quote = Quote.objects.create(
+            number=f"ORC-{n:04d}", customer=self.customer, seller=self.seller,
+        )
+        for i in range(n):
+            item = quote.items.create(
+                supplier=self.supplier, product_name=f"Produto {i}", quantity=1,
+                unit_value=Decimal("100.00"),
+            )
+            buf = BytesIO()
+            PILImage.new("RGB", (40, 40), (i * 20 % 255, 80, 80)).save(buf, format="JPEG")
+            QuoteItemImage.objects.create(
+                item=item, image=SimpleUploadedFile(f"foto{i}.jpg", buf.getvalue(), "image/jpeg"),
+            )
+        return quote
+
+    def _queries(self, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return len(ctx.captured_queries)
+
+    def assertFlat(self, run):
+        """`run(quote)` gasta o mesmo número de queries com 2 e com 6 itens."""
+        small, large = self._quote_with_items(2), self._quote_with_items(6)
+        run(small)  # aquece caches de processo (configurações, fontes, imagens)
+        run(large)
+        self.assertEqual(self._queries(lambda: run(small)), self._queries(lambda: run(large)))
+
+    def test_client_pdf_render(self):
+        from sales.exports import proposal_quote
+        from sales.views import render_quote_client_pdf
+
+        self.assertFlat(lambda q: render_quote_client_pdf(proposal_quote(q.pk)))
+
+    def test_client_pdf_view(self):
+        self.assertFlat(lambda q: self.client.get(reverse("sales:quote_pdf_client", args=[q.pk])))
+
+    def test_quote_detail(self):
+        self.assertFlat(lambda q: self.client.get(reverse("sales:quote_detail", args=[q.pk])))
+
+    def test_quote_edit_form(self):
+        self.assertFlat(lambda q: self.client.get(reverse("sales:quote_edit", args=[q.pk])))
+
+    def test_simulation(self):
+        self.assertFlat(lambda q: self.client.get(reverse("sales:quote_simulate", args=[q.pk])))
+
+
+class ItemImageNormalizationTests(TempMediaMixin, TestCase):
+    """Foto do item: original gravado no upload, versão normalizada pelo worker."""
+
+    def setUp(self):
+        from core.models import Customer
+
+        super().setUp()
+        seller = User.objects.create_user(username="vendedor", password="x", role="SELLER")
+        quote = Quote.objects.create(number="ORC-0001", customer=Customer.objects.create(name="C"), seller=seller)
+        self.item = quote.items.create(product_name="Sofá", quantity=1, unit_value=Decimal("10.00"))
+
+    def _upload(self, size=(2000, 1000), orientation=None):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image as PILImage
+
+        from sales.models import QuoteItemImage
+
+        img = PILImage.new("RGB", size, (200, 30, 30))
+        exif = PILImage.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        buf = BytesIO()
+        img.save(buf, format="JPEG", exif=exif.tobytes())
+        return QuoteItemImage.objects.create(
+            item=self.item, image=SimpleUploadedFile("foto.jpeg", buf.getvalue(), "image/jpeg"),
+        )
+
+    def test_worker_swaps_in_normalized_image_and_thumbnail(self):
+        import os
+
+        from PIL import Image as PILImage
+
+        from core.jobs import run_pending
+
+        record = self._upload(orientation=6)  # celular "deitado": girar 90°
+        original = record.image.path
+        self.assertFalse(record.normalized)
+        self.assertTrue(os.path.exists(original))
+
+        self.assertEqual(run_pending(), 1)
+        record.refresh_from_db()
+        self.assertTrue(record.normalized)
+        self.assertFalse(os.path.exists(original))
+        with PILImage.open(record.image.path) as img:
+            self.assertEqual((img.format, img.size), ("JPEG", (900, 900)))
+            # depois de girar fica em pé (450×900): laterais brancas, centro colorido
+            self.assertEqual(img.getpixel((20, 450)), (255, 255, 255))
+            self.assertNotEqual(img.getpixel((450, 450)), (255, 255, 255))
+        with PILImage.open(record.thumbnail.path) as thumb:
+            self.assertEqual(thumb.size, (120, 120))
+        self.assertEqual(record.thumbnail_url, record.thumbnail.url)
+
+    def test_replaced_image_is_not_overwritten(self):
+        from unittest import mock
+
+        from core.jobs import run_pending
+        from sales import images
+        from sales.models import QuoteItemImage
+
+        record = self._upload()
+        real = images.normalized_variants
+
+        def replaced_meanwhile(fh):
+            # usuário troca a foto enquanto o worker ainda processa a antiga
+            QuoteItemImage.objects.filter(pk=record.pk).update(image="quotes/outra.jpg")
+            return real(fh)
+
+        with mock.patch.object(images, "normalized_variants", replaced_meanwhile):
+            run_pending()
+        record.refresh_from_db()
+        self.assertEqual(record.image.name, "quotes/outra.jpg")
+        self.assertFalse(record.thumbnail)
+        self.assertFalse(record.normalized)
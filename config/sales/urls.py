@@ -7,6 +7,7 @@ urlpatterns = [
     # Quotes Hub
     path("quotes/", views.quotes_hub, name="quotes_hub"),
     path("quotes/list/", views.quote_list, name="quote_list"),
+    path("quotes/list/page/", views.quote_list_page, name="quote_list_page"),
     path("quotes/new/", views.quote_create, name="quote_create"),
     path("quotes/<int:quote_id>/", views.quote_detail, name="quote_detail"),
     path("quotes/<int:quote_id>/reminders/", views.quote_reminders, name="quote_reminders"),
@@ -28,11 +29,13 @@ urlpatterns = [
 
     # API endpoints
     path("api/payment-method-fees/", views.payment_method_fees_api, name="payment_method_fees_api"),
+    path("api/simulation-matrix/", views.simulation_matrix_api, name="simulation_matrix_api"),
     path("api/authorize-discount/", views.authorize_discount_api, name="authorize_discount_api"),
     path("api/get-architect-commission/", views.get_architect_commission_api, name="get_architect_commission_api"),
     
     # Order URLs
     path("orders/", views.order_list, name="order_list"),
+    path("orders/page/", views.order_list_page, name="order_list_page"),
     path("orders/new/", views.order_create_standalone, name="order_create_standalone"),
     path("orders/<int:order_id>/", views.order_detail, name="order_detail"),
     path("orders/<int:order_id>/edit/", views.order_edit, name="order_edit"),
@@ -2,13 +2,10 @@ from __future__ import annotations
 
 import json
 import logging
-import re
-import unicodedata
 from collections import defaultdict
 from datetime import date as date_type, time as time_type, timedelta
 from decimal import Decimal, ROUND_CEILING
 from io import BytesIO
-from urllib.parse import quote as url_quote
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -17,15 +14,13 @@ from django.db import transaction
 from django.db import models
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
 from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +50,20 @@ def _is_seller(user):
 def _can_view_all_orders(user):
     return _is_admin(user) or _is_finance(user)
 
+def _order_viewer_roles():
+    # Mesmo público de _can_view_all_orders (mais superusuários), para o banco.
+    from accounts.models import Role
+    return (Role.ADMIN, Role.FINANCE)
+
+def _order_viewer_ids() -> list[int]:
+    from django.contrib.auth import get_user_model
+    from django.db.models import Q
+    return list(
+        get_user_model().objects.filter(
+            Q(role__in=_order_viewer_roles()) | Q(is_superuser=True), is_active=True,
+        ).values_list("pk", flat=True)
+    )
+
 def _can_generate_order_pdf(user):
     return _is_admin(user) or _is_finance(user)
 
@@ -69,31 +78,25 @@ def _build_value_breakdown(quote):
     frete, taxa de pagamento e o total final — tudo que o financeiro precisa
     revisar antes de aprovar.
     """
-    subtotal = quote.calculate_subtotal()
+    totals = quote.totals
     markup_pct = quote.price_increase_percent or Decimal("0.00")
     discount_pct = quote.discount_percent or Decimal("0.00")
-    markup_amount = subtotal * markup_pct / Decimal("100")
-    discount_amount = subtotal * discount_pct / Decimal("100")
-    freight = quote.freight_value or Decimal("0.00")
-    payment_fee = quote.calculate_payment_fee_value()
-    total_with_discount = quote.calculate_total_with_freight_and_discount()
-    rounded_total = quote.calculate_rounded_total()
     from .models import RoundingMode
     return {
-        "subtotal": subtotal,
+        "subtotal": totals.subtotal,
         "markup_pct": markup_pct,
-        "markup_amount": markup_amount,
+        "markup_amount": totals.markup_amount,
         "discount_pct": discount_pct,
-        "discount_amount": discount_amount,
+        "discount_amount": totals.discount_amount,
         "has_discount": discount_pct > 0,
         "has_markup": markup_pct > 0,
-        "freight": freight,
-        "total_with_discount": total_with_discount,
-        "payment_fee": payment_fee,
+        "freight": totals.freight,
+        "total_with_discount": totals.total_with_discount,
+        "payment_fee": totals.payment_fee,
         "payment_fee_pct": quote.payment_fee_percent or Decimal("0.00"),
-        "final_total": rounded_total,
-        "rounded_total": rounded_total,
-        "rounding_diff": rounded_total - total_with_discount,
+        "final_total": totals.rounded_total,
+        "rounded_total": totals.rounded_total,
+        "rounding_diff": totals.rounded_total - totals.total_with_discount,
         "has_rounding": (
             quote.total_override is not None
             or quote.total_rounding_mode != RoundingMode.NONE
@@ -118,15 +121,6 @@ def _get_order_or_403(request, order_id, **extra_filters):
         return None, HttpResponseForbidden("Acesso negado.")
     return order, None
 
-def _safe_content_disposition(filename: str) -> str:
-    nfkd = unicodedata.normalize('NFKD', filename)
-    ascii_name = nfkd.encode('ascii', 'ignore').decode('ascii')
-    ascii_name = re.sub(r'[^\w.\-]', '_', ascii_name)
-    return (
-        f'attachment; filename="{ascii_name}"; '
-        f"filename*=UTF-8''{url_quote(filename)}"
-    )
-
 def _persist_item_images_from_formset(formset) -> None:
     for item_form in formset.forms:
         if not hasattr(item_form, "cleaned_data"):
@@ -143,17 +137,32 @@ def _persist_item_images_from_formset(formset) -> None:
             continue
 
         existing_images = QuoteItemImage.objects.filter(item=item)
-        for old_image in existing_images:
-            if old_image.image:
-                try:
-                    old_image.image.delete(save=False)
-                except Exception:
-                    pass
+        old_files = [
+            name for pair in existing_images.values_list("image", "thumbnail") for name in pair
+        ]
         existing_images.delete()
+        try:
+            QuoteItemImage.delete_unshared_files(*old_files)
+        except Exception:
+            pass
 
         QuoteItemImage.objects.create(item=item, image=uploaded_image)
 
 
+def _quote_templates():
+    from core.models import QuoteTemplate
+    return QuoteTemplate.objects.only("id", "name")
+
+
+def _selected_quote_template(request):
+    """Modelo escolhido no formulário de novo orçamento (ou None)."""
+    from core.models import QuoteTemplate
+    template_id = request.POST.get("template")
+    if not template_id or not template_id.isdigit():
+        return None
+    return QuoteTemplate.objects.filter(pk=template_id).prefetch_related("items").first()
+
+
 def _capture_order_item_links(quote) -> dict:
     """Fotografa o vínculo OrderItem→QuoteItem ANTES de salvar a edição.
 
@@ -279,10 +288,19 @@ def _sync_orders_from_quote(quote, original_links: dict) -> None:
 
 
 from .forms import QuoteForm, QuoteItemFormSet, OrderForm, OrderItemFormSet
+from .margin_solver import PI_STEP, min_increase_for
+from .pagination import keyset_page
+from .search import matching_ids
+from .simulation_matrix import (
+    MAX_INSTALLMENTS,
+    commission_pct_for,
+    payment_options,
+    simulate_matrix,
+    status_for,
+)
 from .models import (
     Quote,
     QuoteStatus,
-    QuoteItem,
     QuoteItemImage,
     Order,
     OrderItem,
@@ -292,6 +310,7 @@ from .models import (
     ProposalConfig,
     SaleDocument,
     SaleDocumentType,
+    SearchDocument,
     SOLD_STATUSES,
 )
 from calendar_app.models import (
@@ -302,23 +321,8 @@ from calendar_app.models import (
 )
 
 def generate_next_quote_number() -> str:
-    with transaction.atomic():
-        last_quote = Quote.objects.select_for_update().order_by("-id").first()
-        if not last_quote:
-            candidate = 1
-        else:
-            try:
-                if last_quote.number.startswith("ORC-"):
-                    candidate = int(last_quote.number.split("-")[1]) + 1
-                else:
-                    candidate = Quote.objects.count() + 1
-            except (ValueError, IndexError):
-                candidate = Quote.objects.count() + 1
-
-        while Quote.objects.filter(number=f"ORC-{candidate:04d}").exists():
-            candidate += 1
-
-        return f"ORC-{candidate:04d}"
+    from .numbering import next_number
+    return next_number("quote")
 
 @login_required
 def quotes_hub(request: HttpRequest) -> HttpResponse:
@@ -333,28 +337,15 @@ def payment_method_fees_api(request: HttpRequest) -> JsonResponse:
     if not payment_type:
         return JsonResponse({'error': 'payment_type required'}, status=400)
     
-    max_installments_map = {
-        'CASH': 1,
-        'PIX': 1,
-        'DEBIT_CARD': 1,
-        'CREDIT_CARD': 18,
-        'CHEQUE': 12,
-        'BOLETO': 4,
-    }
-    
     is_installment = payment_type in ['CREDIT_CARD', 'CHEQUE', 'BOLETO']
-    max_installments = max_installments_map.get(payment_type, 1)
-
-    tariffs = PaymentTariff.objects.filter(
-        payment_type=PaymentTariff.lookup_type(payment_type)
-    ).order_by('installments')
+    max_installments = MAX_INSTALLMENTS.get(payment_type, 1)
 
     # Só expõe parcelas com tarifa cadastrada. Preencher as faltantes com 0%
     # oferecia parcelamento sem custo e estourava a margem silenciosamente.
     tariffs_data = [
-        {'installments': t.installments, 'fee_percent': str(t.fee_percent)}
-        for t in tariffs
-        if t.installments <= max_installments
+        {'installments': installments, 'fee_percent': str(fee)}
+        for installments, fee in PaymentTariff.fees_for(payment_type).items()
+        if installments <= max_installments
     ]
     max_installments = tariffs_data[-1]['installments'] if tariffs_data else 1
 
@@ -370,6 +361,90 @@ def payment_method_fees_api(request: HttpRequest) -> JsonResponse:
     
     return JsonResponse(data)
 
+def _decimal_param(params, name: str, default: str = '0') -> Decimal:
+    try:
+        return Decimal(params.get(name, default) or default)
+    except Exception:
+        return Decimal(default)
+
+
+@login_required
+@require_http_methods(["GET"])
+def simulation_matrix_api(request: HttpRequest) -> JsonResponse:
+    """Grade completa tipo de pagamento × parcelas para o painel do simulador.
+
+    Aceita `quote_id` (subtotal e frete do orçamento) ou `subtotal`/`freight`
+    avulsos, mais `discount`, `markup`, `architect=1` e `down_payment`.
+    """
+    from core.models import PaymentTariff, PaymentMethodType
+
+    quote_id = request.GET.get('quote_id')
+    if quote_id:
+        try:
+            quote = Quote.objects.prefetch_related('items').get(pk=int(quote_id))
+        except (Quote.DoesNotExist, ValueError, TypeError):
+            return JsonResponse({'error': 'Orçamento não encontrado.'}, status=404)
+        if not _can_access_all_quotes(request.user) and quote.seller_id != request.user.id:
+            return JsonResponse({'error': 'Acesso negado.'}, status=403)
+        subtotal = quote.totals.subtotal
+        freight_value = quote.freight_value or Decimal('0')
+    else:
+        subtotal = _decimal_param(request.GET, 'subtotal')
+        freight_value = _decimal_param(request.GET, 'freight')
+
+    # Mesmos limites de _build_simulation_context.
+    subtotal = max(Decimal('0'), subtotal)
+    freight_value = max(Decimal('0'), freight_value)
+    discount = max(Decimal('0'), min(_decimal_param(request.GET, 'discount'), Decimal('30')))
+    markup = max(Decimal('0'), min(_decimal_param(request.GET, 'markup'), Decimal('30')))
+    down_payment = max(Decimal('0'), _decimal_param(request.GET, 'down_payment'))
+    has_architect = request.GET.get('architect') == '1'
+
+    options = payment_options(
+        PaymentTariff.table(),
+        PaymentTariff.TARIFF_LOOKUP_OVERRIDES,
+        PaymentMethodType.values,
+    )
+    rows = simulate_matrix(
+        subtotal=subtotal,
+        freight_value=freight_value,
+        discount_pct=discount,
+        markup_pct=markup,
+        has_architect=has_architect,
+        options=options,
+        down_payment=down_payment,
+    )
+
+    labels = dict(PaymentMethodType.choices)
+    matrix: dict[str, list] = {pt: [] for pt in PaymentMethodType.values}
+    for row in rows:
+        matrix[row['payment_type']].append({
+            'installments':      row['installments'],
+            'label':             "À vista" if row['installments'] == 1 else f"{row['installments']}x",
+            'fee_percent':       str(row['fee_percent']),
+            'status':            row['status'],
+            'controls_blocked':  row['controls_blocked'],
+            'mld_pct':           str(row['mld_pct']),
+            'margin_balance':    str(row['margin_balance']),
+            'final_total':       str(row['final_total']),
+            'financed':          str(row['financed']),
+            'installment_value': str(row['installment_value']),
+            'commission_pct':    str(row['commission_pct']),
+            'commission_value':  str(row['commission_value']),
+        })
+
+    return JsonResponse({
+        'subtotal': str(subtotal),
+        'freight': str(freight_value),
+        'discount': str(discount),
+        'markup': str(markup),
+        'has_architect': has_architect,
+        'types': [
+            {'payment_type': pt, 'type_display': labels[pt], 'options': matrix[pt]}
+            for pt in PaymentMethodType.values
+        ],
+    })
+
 @login_required
 @require_http_methods(["POST"])
 def authorize_discount_api(request: HttpRequest) -> JsonResponse:
@@ -430,26 +505,33 @@ def get_architect_commission_api(request: HttpRequest) -> JsonResponse:
         logger.exception('get_architect_commission_api error')
         return JsonResponse({'error': 'Erro interno.'}, status=500)
 
-@login_required
-def quote_list(request: HttpRequest) -> HttpResponse:
-    quotes = Quote.objects.select_related('customer', 'seller').order_by('-created_at')
+def _filtered_quotes(request: HttpRequest):
+    """Orçamentos visíveis ao usuário com os filtros da lista (busca/status)."""
+    quotes = (
+        Quote.objects.select_related('customer', 'seller')
+        .annotate(items_count=models.Count('items'))
+    )
     if not _can_access_all_quotes(request.user):
         quotes = quotes.filter(seller=request.user)
-    
+
     search_query = request.GET.get('search', '').strip()
     if search_query:
-        quotes = quotes.filter(
-            models.Q(number__icontains=search_query) |
-            models.Q(customer__name__icontains=search_query) |
-            models.Q(seller__username__icontains=search_query)
-        )
-    
+        quotes = quotes.filter(pk__in=matching_ids(SearchDocument.Kind.QUOTE, search_query))
+
     status_filter = request.GET.get('status', '').strip()
     if status_filter:
         quotes = quotes.filter(status=status_filter)
-    
+    return quotes, search_query, status_filter
+
+
+@login_required
+def quote_list(request: HttpRequest) -> HttpResponse:
+    quotes, search_query, status_filter = _filtered_quotes(request)
+    page, next_cursor = keyset_page(quotes, request.GET.get('cursor'))
+
     context = {
-        'quotes': quotes,
+        'quotes': page,
+        'next_cursor': next_cursor,
         'search_query': search_query,
         'status_filter': status_filter,
         'is_admin': _is_admin(request.user),
@@ -457,6 +539,19 @@ def quote_list(request: HttpRequest) -> HttpResponse:
     
     return render(request, 'sales/quote_list.html', context)
 
+
+@login_required
+def quote_list_page(request: HttpRequest) -> JsonResponse:
+    """Próxima página da lista de orçamentos (rolagem infinita)."""
+    quotes, _, _ = _filtered_quotes(request)
+    page, next_cursor = keyset_page(quotes, request.GET.get('cursor'))
+    html = render_to_string(
+        'sales/_quote_rows.html',
+        {'quotes': page, 'is_admin': _is_admin(request.user)},
+        request=request,
+    )
+    return JsonResponse({'html': html, 'next_cursor': next_cursor, 'has_more': next_cursor is not None})
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def quote_create(request: HttpRequest) -> HttpResponse:
@@ -495,10 +590,10 @@ def quote_create(request: HttpRequest) -> HttpResponse:
                             quote.discount_authorized_at = timezone.now()
                         except User.DoesNotExist:
                             messages.error(request, "Usuário autorizador não encontrado.")
-                            return render(request, "sales/quote_form.html", {"form": form, "formset": formset})
+                            return render(request, "sales/quote_form.html", {"form": form, "formset": formset, "quote_templates": _quote_templates()})
                     else:
                         messages.error(request, "Desconto acima de 15% requer autorização.")
-                        return render(request, "sales/quote_form.html", {"form": form, "formset": formset})
+                        return render(request, "sales/quote_form.html", {"form": form, "formset": formset, "quote_templates": _quote_templates()})
                 
                 quote.save()
 
@@ -506,6 +601,11 @@ def quote_create(request: HttpRequest) -> HttpResponse:
                 formset.save()
                 _persist_item_images_from_formset(formset)
 
+                template = _selected_quote_template(request)
+                if template is not None:
+                    from .cloning import add_template_items
+                    add_template_items(quote, template)
+
             from core.models import AuditLog, AuditAction
             AuditLog.log(request.user, AuditAction.CREATE_QUOTE,
                          f"Orçamento {quote.number} criado", obj=quote,
@@ -532,7 +632,7 @@ def quote_create(request: HttpRequest) -> HttpResponse:
     return render(
         request,
         "sales/quote_form.html",
-        {"form": form, "formset": formset},
+        {"form": form, "formset": formset, "quote_templates": _quote_templates()},
     )
 
 @login_required
@@ -905,33 +1005,20 @@ def quote_convert_to_orders(request: HttpRequest, quote_id: int) -> HttpResponse
                     f"Lembrar pagamento do arquiteto ({architect_label}) referente ao orçamento {quote.number}."
                 )
 
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                recipients = [
-                    user for user in User.objects.filter(is_active=True)
-                    if _can_view_all_orders(user)
-                ]
-
-                for recipient in recipients:
-                    event, created = CalendarEvent.objects.get_or_create(
-                        quote=quote,
-                        order=total_order,
-                        event_type=EventType.ARCHITECT_PAYMENT,
-                        assigned_to=recipient,
-                        defaults={
-                            "title": reminder_title,
-                            "description": reminder_description,
-                            "status": EventStatus.PENDING,
-                            "event_date": reminder_date,
-                            "customer": quote.customer,
-                        },
-                    )
-                    if created:
-                        Reminder.objects.create(
-                            event=event,
-                            remind_date=reminder_date,
-                            message=reminder_title,
-                        )
+                CalendarEvent.ensure_for(
+                    _order_viewer_ids(),
+                    quote=quote,
+                    order=total_order,
+                    event_type=EventType.ARCHITECT_PAYMENT,
+                    defaults={
+                        "title": reminder_title,
+                        "description": reminder_description,
+                        "status": EventStatus.PENDING,
+                        "event_date": reminder_date,
+                        "customer": quote.customer,
+                    },
+                    reminder={"remind_date": reminder_date, "message": reminder_title},
+                )
 
             # NÃO apagar as imagens dos itens ao converter: elas continuam sendo
             # usadas no PDF do cliente e precisam sobreviver a edições posteriores
@@ -951,21 +1038,18 @@ def quote_convert_to_orders(request: HttpRequest, quote_id: int) -> HttpResponse
                 url=f"/sales/quotes/{quote.id}/",
             )
 
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        for finance_user in User.objects.filter(is_active=True):
-            if _can_view_all_orders(finance_user) and finance_user != request.user:
-                Notification.send(
-                    finance_user,
-                    f"Pedido aguardando aprovação: {quote.number}",
-                    NotificationType.ORDER_CONFIRMED,
-                    message=(
-                        f"Orçamento {quote.number} (cliente: {quote.customer.name}) "
-                        f"foi convertido em pedido pelo vendedor {request.user.get_full_name() or request.user.username}. "
-                        f"Aguardando sua aprovação."
-                    ),
-                    url=f"/sales/orders/?status=PENDING",
-                )
+        Notification.broadcast(
+            _order_viewer_roles(),
+            f"Pedido aguardando aprovação: {quote.number}",
+            NotificationType.ORDER_CONFIRMED,
+            message=(
+                f"Orçamento {quote.number} (cliente: {quote.customer.name}) "
+                f"foi convertido em pedido pelo vendedor {request.user.get_full_name() or request.user.username}. "
+                f"Aguardando sua aprovação."
+            ),
+            url="/sales/orders/?status=PENDING",
+            exclude=request.user,
+        )
 
         if not items:
             messages.success(
@@ -1046,20 +1130,60 @@ def _register_brand_fonts():
 
 @login_required
 def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
-    from reportlab.pdfgen import canvas as pdf_canvas
-    from reportlab.lib.utils import ImageReader
-    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from django.http import FileResponse
+    from django.utils.cache import get_conditional_response
 
-    quote = get_object_or_404(
-        Quote.objects.select_related("customer", "seller")
-                     .prefetch_related("items", "items__images"),
-        id=quote_id,
-    )
+    from core.jobs import enqueue
+    from .exports import proposal_quotes
+    from .pdf_cache import cached_pdf, proposal_fingerprint
+
+    quote = get_object_or_404(proposal_quotes(), id=quote_id)
     if not _can_access_all_quotes(request.user) and quote.seller_id != request.user.id:
         messages.error(request, "Acesso negado.")
         return redirect("sales:quote_list")
 
+    # Proposta sem mudanças desde o último PDF: 304 ou leitura do arquivo.
+    fingerprint = proposal_fingerprint(quote)
+    etag = f'"{fingerprint}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["Cache-Control"] = "private, no-cache"
+        return not_modified
+    path = cached_pdf(fingerprint)
+    if path is not None:
+        try:
+            pdf_file = open(path, "rb")
+        except FileNotFoundError:
+            # evict_lru apagou o arquivo entre o cached_pdf() e o open(): renderiza de novo
+            pdf_file = None
+        if pdf_file is not None:
+            response = FileResponse(
+                pdf_file, as_attachment=True,
+                filename=f"proposta_{quote.number}.pdf", content_type="application/pdf",
+            )
+            response["ETag"] = etag
+            response["Cache-Control"] = "private, no-cache"
+            return response
+
+    job = enqueue(
+        "sales.exports.quote_client_pdf", f"Proposta {quote.number}", request.user,
+        quote_id=quote.id,
+    )
+    return redirect("core:job_detail", job_id=job.pk)
+
+
+def render_quote_client_pdf(quote) -> bytes:
+    """PDF da proposta para o cliente (roda no worker de tarefas — sales/exports.py).
+
+    `quote` deve vir de `exports.proposal_quotes()`: nada aqui consulta o banco.
+    """
+    from reportlab.pdfgen import canvas as pdf_canvas
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    from .pdf_images import ImageAssets
+
     config = ProposalConfig.get_config()
+    assets = ImageAssets()
 
     buffer = BytesIO()
     page_w, page_h = A4
@@ -1097,16 +1221,11 @@ def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
         _draw_spaced(text, cx - tw / 2, y, font, size, cs)
 
     def _draw_bg(field, fallback='#1a0f07'):
-        drawn = False
-        if field:
-            try:
-                c.drawImage(ImageReader(field.path), 0, 0,
-                            width=page_w, height=page_h,
-                            preserveAspectRatio=False, mask='auto')
-                drawn = True
-            except Exception:
-                pass
-        if not drawn:
+        reader = assets.reader(field.path, page_w, page_h, stretch=True) if field else None
+        if reader is not None:
+            c.drawImage(reader, 0, 0, width=page_w, height=page_h,
+                        preserveAspectRatio=False)
+        else:
             c.setFillColor(colors.HexColor(fallback))
             c.rect(0, 0, page_w, page_h, fill=1, stroke=0)
 
@@ -1146,13 +1265,12 @@ def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
         for ext in ('.jpg', '.jpeg', '.png', '.webp'):
             candidate = _PROPOSAL_DIR / (filename + ext)
             if _os.path.isfile(candidate):
-                try:
-                    c.drawImage(ImageReader(str(candidate)), 0, 0,
+                reader = assets.reader(candidate, page_w, page_h, stretch=True)
+                if reader is not None:
+                    c.drawImage(reader, 0, 0,
                                 width=page_w, height=page_h,
-                                preserveAspectRatio=False, mask='auto')
+                                preserveAspectRatio=False)
                     drawn = True
-                except Exception:
-                    pass
                 break
         if not drawn:
             c.setFillColor(LINEN)
@@ -1171,7 +1289,7 @@ def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
     IMG_SZ   = 128
     FOOTER_H = 230
 
-    items = list(quote.items.prefetch_related('images').all())
+    items = list(quote.items.all())
 
     def _items_page_bg():
         # Fundo branco em toda a página de itens (header + lista de produtos),
@@ -1228,14 +1346,11 @@ def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
             txt_w = CW - IMG_SZ - 14
 
         img_y = y_top - (ITEM_H + IMG_SZ) / 2
-        first_img = item.images.first()
-        if first_img:
-            try:
-                c.drawImage(ImageReader(first_img.image.path),
-                            img_x, img_y, width=IMG_SZ, height=IMG_SZ,
-                            preserveAspectRatio=True, mask='auto')
-            except Exception:
-                _img_placeholder(img_x, img_y, IMG_SZ)
+        first_img = next(iter(item.images.all()), None)
+        reader = assets.reader(first_img.image.path, IMG_SZ, IMG_SZ) if first_img else None
+        if reader is not None:
+            c.drawImage(reader, img_x, img_y, width=IMG_SZ, height=IMG_SZ,
+                        preserveAspectRatio=True)
         else:
             _img_placeholder(img_x, img_y, IMG_SZ)
 
@@ -1329,13 +1444,13 @@ def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
 
         # ── Cálculo dos valores ──────────────────────────────────────────
         # Fonte única de verdade: o total ao cliente é EXATAMENTE o snapshot
-        # mostrado na tela de detalhe (calculate_rounded_total), já com ajuste
+        # mostrado na tela de detalhe (quote.totals.rounded_total), já com ajuste
         # de preço, desconto, FRETE e preço final/arredondamento embutidos.
         # Antes o PDF recomputava sem o frete e divergia do total do sistema.
-        subtotal   = quote.calculate_subtotal()
+        totals     = quote.totals
         disc_pct   = quote.discount_percent or Decimal('0')
-        disc_val   = subtotal * disc_pct / Decimal('100')
-        avista     = quote.calculate_rounded_total()   # total real ao cliente (com frete)
+        disc_val   = totals.discount_amount
+        avista     = totals.rounded_total              # total real ao cliente (com frete)
         list_price = avista + disc_val                 # "valor sem desconto"
 
         from core.models import PaymentMethodType
@@ -1454,16 +1569,11 @@ def quote_pdf_client(request: HttpRequest, quote_id: int) -> HttpResponse:
         raise
     pdf = buffer.getvalue()
     buffer.close()
-
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = _safe_content_disposition(
-        f'proposta_{quote.number}.pdf'
-    )
-    return response
+    return pdf
 
 @login_required
 def quote_pdf_supplier(request: HttpRequest, quote_id: int) -> HttpResponse:
-    import zipfile as zipfile_mod
+    from core.jobs import enqueue
 
     quote = get_object_or_404(
         Quote.objects.select_related("customer", "seller")
@@ -1499,218 +1609,6 @@ def quote_pdf_supplier(request: HttpRequest, quote_id: int) -> HttpResponse:
             )
             return render(request, "sales/quote_pdf_supplier_form.html", {"quote": quote})
 
-    def _fmt_brl(value) -> str:
-        s = f"{float(value):,.2f}"
-        return s.replace(',', '\x00').replace('.', ',').replace('\x00', '.')
-
-    NAVY  = colors.HexColor('#0A2640')
-    LGRAY = colors.HexColor('#DDDDDD')
-    BGROW = colors.HexColor('#F8F9FA')
-    MUTED = colors.HexColor('#888888')
-    _styles = getSampleStyleSheet()
-
-    def _ps(name, **kw):
-        return ParagraphStyle(name, parent=_styles['Normal'], **kw)
-
-    def _make_pdf_for_supplier(supplier, items_for_supplier,
-                               _transp=transportadora,
-                               _cond=cond_pagamento,
-                               _obs=observacoes,
-                               _prices=supplier_prices) -> bytes:
-        st_title   = _ps(f'{supplier.id}_title',  fontSize=15, fontName='Helvetica-Bold',
-                         textColor=NAVY, alignment=TA_CENTER, spaceAfter=2)
-        st_sub     = _ps(f'{supplier.id}_sub',    fontSize=9, textColor=MUTED,
-                         alignment=TA_CENTER, spaceAfter=0)
-        st_section = _ps(f'{supplier.id}_sec',    fontSize=9, fontName='Helvetica-Bold',
-                         textColor=NAVY, spaceBefore=8, spaceAfter=4)
-        st_normal  = _ps(f'{supplier.id}_normal', fontSize=9, leading=13)
-        st_label   = _ps(f'{supplier.id}_label',  fontSize=7, textColor=MUTED, leading=11)
-        st_footer  = _ps(f'{supplier.id}_footer', fontSize=7, textColor=MUTED, alignment=TA_CENTER)
-        st_th      = _ps(f'{supplier.id}_th',     fontSize=8, fontName='Helvetica-Bold',
-                         textColor=colors.white, alignment=TA_CENTER)
-        st_td_c    = _ps(f'{supplier.id}_td_c',   fontSize=8, alignment=TA_CENTER)
-        st_td_l    = _ps(f'{supplier.id}_td_l',   fontSize=8)
-        st_td_g    = _ps(f'{supplier.id}_td_g',   fontSize=7, textColor=colors.HexColor('#666666'))
-
-        buf = BytesIO()
-        doc = SimpleDocTemplate(
-            buf, pagesize=A4,
-            rightMargin=2*cm, leftMargin=2*cm,
-            topMargin=2*cm, bottomMargin=2*cm,
-        )
-        els = []
-
-        els.append(Paragraph("ROSELAR MÓVEIS", st_title))
-        els.append(Paragraph("PEDIDO DE COMPRA", st_sub))
-        els.append(Spacer(1, 0.3*cm))
-        els.append(HRFlowable(width="100%", thickness=2, color=NAVY))
-        els.append(Spacer(1, 0.4*cm))
-
-        seller_name = quote.seller.get_full_name() or quote.seller.username
-        meta_data = [
-            [
-                Paragraph(f"<b>Orçamento:</b> #{quote.number}", st_normal),
-                Paragraph(f"<b>Data:</b> {quote.quote_date.strftime('%d/%m/%Y')}", st_normal),
-            ],
-            [
-                Paragraph(f"<b>Vendedor:</b> {seller_name}", st_normal),
-                Paragraph("", st_normal),
-            ],
-            [
-                Paragraph(f"<b>Transportadora:</b> {_transp or '—'}", st_normal),
-                Paragraph(f"<b>Cond. Pagamento:</b> {_cond or '—'}", st_normal),
-            ],
-        ]
-        meta_tbl = Table(meta_data, colWidths=[8.5*cm, 8.5*cm])
-        meta_tbl.setStyle(TableStyle([
-            ('VALIGN',        (0, 0), (-1, -1), 'TOP'),
-            ('LEFTPADDING',   (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING',  (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ]))
-        els.append(meta_tbl)
-        els.append(Spacer(1, 0.4*cm))
-
-        supplier_cell = [
-            Paragraph("<b>Fornecedor</b>", st_section),
-            Paragraph(supplier.name, st_normal),
-        ]
-        if supplier.phone:
-            supplier_cell.append(Paragraph(f"Tel: {supplier.phone}", st_label))
-        if supplier.email:
-            supplier_cell.append(Paragraph(supplier.email, st_label))
-
-        client_cell = [
-            Paragraph("<b>Cliente</b>", st_section),
-            Paragraph(quote.customer.name, st_normal),
-        ]
-
-        party_tbl = Table([[supplier_cell, client_cell]], colWidths=[8.5*cm, 8.5*cm])
-        party_tbl.setStyle(TableStyle([
-            ('VALIGN',        (0, 0), (-1, -1), 'TOP'),
-            ('BOX',           (0, 0), (0, 0),   0.5, LGRAY),
-            ('BOX',           (1, 0), (1, 0),   0.5, LGRAY),
-            ('BACKGROUND',    (0, 0), (0, 0),   BGROW),
-            ('BACKGROUND',    (1, 0), (1, 0),   BGROW),
-            ('LEFTPADDING',   (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING',  (0, 0), (-1, -1), 8),
-            ('TOPPADDING',    (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        els.append(party_tbl)
-        els.append(Spacer(1, 0.5*cm))
-
-        els.append(Paragraph("ITENS DO PEDIDO", st_section))
-        hdr = [
-            Paragraph('#',          st_th),
-            Paragraph('Produto',    st_th),
-            Paragraph('Descrição',  st_th),
-            Paragraph('Qtd',        st_th),
-            Paragraph('Vlr. Unit.', st_th),
-            Paragraph('Total',      st_th),
-        ]
-        tdata = [hdr]
-        subtotal = Decimal('0.00')
-        for idx, item in enumerate(items_for_supplier, 1):
-            unit = _prices.get(item.id, Decimal('0.00'))
-            line = unit * item.quantity
-            subtotal += line
-            desc = item.description.strip() if item.description else '—'
-            tdata.append([
-                Paragraph(str(idx),              st_td_c),
-                Paragraph(item.product_name,     st_td_l),
-                Paragraph(desc,                  st_td_g),
-                Paragraph(str(item.quantity),    st_td_c),
-                Paragraph(f"R$ {_fmt_brl(unit)}", st_td_c),
-                Paragraph(f"R$ {_fmt_brl(line)}", st_td_c),
-            ])
-
-        col_w = [0.8*cm, 4.5*cm, 6.5*cm, 1.2*cm, 2.5*cm, 2.5*cm]
-        itbl = Table(tdata, colWidths=col_w, repeatRows=1)
-        row_styles = [
-            ('BACKGROUND',    (0, 0), (-1, 0),  NAVY),
-            ('TEXTCOLOR',     (0, 0), (-1, 0),  colors.white),
-            ('FONTNAME',      (0, 0), (-1, 0),  'Helvetica-Bold'),
-            ('FONTSIZE',      (0, 0), (-1, 0),  8),
-            ('TOPPADDING',    (0, 0), (-1, 0),  7),
-            ('BOTTOMPADDING', (0, 0), (-1, 0),  7),
-            ('GRID',          (0, 0), (-1, -1), 0.5, LGRAY),
-            ('VALIGN',        (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING',    (0, 1), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
-            ('LEFTPADDING',   (0, 1), (-1, -1), 5),
-            ('RIGHTPADDING',  (0, 1), (-1, -1), 5),
-        ]
-        for i in range(1, len(tdata)):
-            if i % 2 == 0:
-                row_styles.append(('BACKGROUND', (0, i), (-1, i), BGROW))
-        itbl.setStyle(TableStyle(row_styles))
-        els.append(itbl)
-        els.append(Spacer(1, 0.3*cm))
-
-        total_tbl = Table(
-            [[Paragraph(f"<b>Subtotal:</b> R$ {_fmt_brl(subtotal)}", st_normal)]],
-            colWidths=[17*cm],
-        )
-        total_tbl.setStyle(TableStyle([
-            ('ALIGN',         (0, 0), (-1, -1), 'RIGHT'),
-            ('TOPPADDING',    (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('RIGHTPADDING',  (0, 0), (-1, -1), 0),
-        ]))
-        els.append(total_tbl)
-
-        if quote.delivery_days_min or quote.delivery_days_max:
-            mn = quote.delivery_days_min
-            mx = quote.delivery_days_max
-            if mn and mx:
-                prazo_txt = f"{mn} a {mx} dias"
-            elif mn:
-                prazo_txt = f"a partir de {mn} dias"
-            else:
-                prazo_txt = f"até {mx} dias"
-            els.append(Spacer(1, 0.2*cm))
-            els.append(Paragraph(
-                f"<b>Prazo de entrega estimado:</b> {prazo_txt}",
-                st_normal,
-            ))
-
-        if _obs:
-            els.append(Spacer(1, 0.4*cm))
-            st_obs_lbl = _ps(f'{supplier.id}_obs_lbl', fontSize=8, fontName='Helvetica-Bold',
-                             textColor=NAVY, spaceBefore=4, spaceAfter=3)
-            st_obs_txt = _ps(f'{supplier.id}_obs_txt', fontSize=8, leading=12,
-                             textColor=colors.HexColor('#333333'))
-            obs_tbl = Table(
-                [[
-                    [Paragraph("OBSERVAÇÕES", st_obs_lbl),
-                     Paragraph(_obs, st_obs_txt)]
-                ]],
-                colWidths=[17*cm],
-            )
-            obs_tbl.setStyle(TableStyle([
-                ('BOX',           (0, 0), (-1, -1), 0.5, LGRAY),
-                ('BACKGROUND',    (0, 0), (-1, -1), BGROW),
-                ('LEFTPADDING',   (0, 0), (-1, -1), 8),
-                ('RIGHTPADDING',  (0, 0), (-1, -1), 8),
-                ('TOPPADDING',    (0, 0), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            els.append(obs_tbl)
-
-        els.append(Spacer(1, 0.8*cm))
-        els.append(HRFlowable(width="100%", thickness=0.5, color=LGRAY))
-        els.append(Spacer(1, 0.2*cm))
-        els.append(Paragraph(
-            f"Gerado em {timezone.localdate().strftime('%d/%m/%Y')} | Roselar Móveis",
-            st_footer,
-        ))
-
-        doc.build(els)
-        data = buf.getvalue()
-        buf.close()
-        return data
-
     by_supplier: dict = defaultdict(list)
     items_without_supplier = []
     for item in quote.items.all():
@@ -1730,47 +1628,66 @@ def quote_pdf_supplier(request: HttpRequest, quote_id: int) -> HttpResponse:
             f"Os seguintes itens não têm fornecedor e foram ignorados: {nomes}.",
         )
 
-    if len(by_supplier) == 1:
-        supplier_id, items_list = next(iter(by_supplier.items()))
-        supplier = items_list[0].supplier
-        pdf_bytes = _make_pdf_for_supplier(supplier, items_list, transportadora, cond_pagamento, observacoes, supplier_prices)
-        safe_name = supplier.name.replace(' ', '_').replace('/', '_')
-        filename = f"pedido_{quote.number}_{safe_name}.pdf"
-        response = HttpResponse(pdf_bytes, content_type='application/pdf')
-        response['Content-Disposition'] = _safe_content_disposition(filename)
-        return response
-
-    zip_buffer = BytesIO()
-    with zipfile_mod.ZipFile(zip_buffer, 'w', zipfile_mod.ZIP_DEFLATED) as zf:
-        for supplier_id, items_list in by_supplier.items():
-            supplier = items_list[0].supplier
-            pdf_bytes = _make_pdf_for_supplier(supplier, items_list, transportadora, cond_pagamento, observacoes, supplier_prices)
-            safe_name = supplier.name.replace(' ', '_').replace('/', '_')
-            zf.writestr(f"pedido_{quote.number}_{safe_name}.pdf", pdf_bytes)
-
-    zip_data = zip_buffer.getvalue()
-    zip_buffer.close()
-
-    zip_filename = f"pedidos_{quote.number}.zip"
-    response = HttpResponse(zip_data, content_type='application/zip')
-    response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
-    return response
+    job = enqueue(
+        "sales.exports.quote_supplier_pdfs", f"PDF de fornecedor – orçamento {quote.number}", request.user,
+        quote_id=quote.id,
+        transportadora=transportadora,
+        cond_pagamento=cond_pagamento,
+        observacoes=observacoes,
+        prices={str(pk): str(price) for pk, price in supplier_prices.items()},
+    )
+    return redirect("core:job_detail", job_id=job.pk)
 
-@login_required
-def order_list(request: HttpRequest) -> HttpResponse:
-    orders = Order.objects.select_related('quote', 'supplier', 'quote__customer', 'quote__seller').order_by('-created_at')
+
+def render_supplier_pdf(quote, supplier, items_for_supplier, transportadora: str,
+                        cond_pagamento: str, observacoes: str,
+                        supplier_prices: dict[int, Decimal]) -> bytes:
+    """Pedido de compra de um fornecedor com os preços digitados no formulário.
+
+    Não consulta o banco (quote com customer/seller carregados), então pode
+    rodar num processo separado — ver sales/exports.py.
+    """
+    from .pdf_layout import PurchaseOrderLine, build_purchase_order
+
+    prazo_txt = ""
+    mn, mx = quote.delivery_days_min, quote.delivery_days_max
+    if mn and mx:
+        prazo_txt = f"{mn} a {mx} dias"
+    elif mn:
+        prazo_txt = f"a partir de {mn} dias"
+    elif mx:
+        prazo_txt = f"até {mx} dias"
+
+    seller_name = quote.seller.get_full_name() or quote.seller.username
+    return build_purchase_order(
+        meta=[
+            (f"<b>Orçamento:</b> #{quote.number}", f"<b>Data:</b> {quote.quote_date.strftime('%d/%m/%Y')}"),
+            (f"<b>Vendedor:</b> {seller_name}", ""),
+            (f"<b>Transportadora:</b> {transportadora or '—'}", f"<b>Cond. Pagamento:</b> {cond_pagamento or '—'}"),
+        ],
+        supplier=supplier,
+        client_name=quote.customer.name,
+        lines=[
+            PurchaseOrderLine(
+                item.product_name, item.description or "", item.quantity,
+                supplier_prices.get(item.id, Decimal('0.00')),
+            )
+            for item in items_for_supplier
+        ],
+        total_label="Subtotal",
+        after_total=f"<b>Prazo de entrega estimado:</b> {prazo_txt}" if prazo_txt else "",
+        notes=observacoes,
+    )
+
+def _filtered_orders(request: HttpRequest):
+    """Pedidos visíveis ao usuário com os filtros da lista (busca/status/fornecedor)."""
+    orders = Order.objects.select_related('quote', 'supplier', 'quote__customer', 'quote__seller')
     if not _can_view_all_orders(request.user):
         orders = orders.filter(quote__seller=request.user)
 
     search_query = request.GET.get('search', '').strip()
     if search_query:
-        orders = orders.filter(
-            models.Q(number__icontains=search_query) |
-            models.Q(quote__number__icontains=search_query) |
-            models.Q(quote__customer__name__icontains=search_query) |
-            models.Q(supplier__name__icontains=search_query) |
-            models.Q(notes__icontains=search_query)
-        )
+        orders = orders.filter(pk__in=matching_ids(SearchDocument.Kind.ORDER, search_query))
     
     status_filter = request.GET.get('status', '').strip()
     if status_filter:
@@ -1779,9 +1696,17 @@ def order_list(request: HttpRequest) -> HttpResponse:
     supplier_filter = request.GET.get('supplier', '').strip()
     if supplier_filter:
         orders = orders.filter(supplier_id=supplier_filter)
-    
+    return orders, search_query, status_filter, supplier_filter
+
+
+@login_required
+def order_list(request: HttpRequest) -> HttpResponse:
+    orders, search_query, status_filter, supplier_filter = _filtered_orders(request)
+    page, next_cursor = keyset_page(orders, request.GET.get('cursor'))
+
     context = {
-        'orders': orders,
+        'orders': page,
+        'next_cursor': next_cursor,
         'search_query': search_query,
         'status_filter': status_filter,
         'supplier_filter': supplier_filter,
@@ -1792,6 +1717,19 @@ def order_list(request: HttpRequest) -> HttpResponse:
 
     return render(request, 'sales/order_list.html', context)
 
+
+@login_required
+def order_list_page(request: HttpRequest) -> JsonResponse:
+    """Próxima página da lista de pedidos (rolagem infinita)."""
+    orders, _, _, _ = _filtered_orders(request)
+    page, next_cursor = keyset_page(orders, request.GET.get('cursor'))
+    html = render_to_string(
+        'sales/_order_rows.html',
+        {'orders': page, 'can_generate_order_pdf': _can_generate_order_pdf(request.user)},
+        request=request,
+    )
+    return JsonResponse({'html': html, 'next_cursor': next_cursor, 'has_more': next_cursor is not None})
+
 @login_required
 def order_detail(request: HttpRequest, order_id: int) -> HttpResponse:
     order = get_object_or_404(
@@ -1882,47 +1820,37 @@ def order_set_delivery(request: HttpRequest, order_id: int) -> HttpResponse:
         f"Data de entrega definida por: {request.user.get_full_name() or request.user.username}"
     )
 
-    recipients = set()
-    recipients.add(quote.seller)
-    recipients.add(request.user)
-
-    for recipient in recipients:
-        event, _ = CalendarEvent.objects.get_or_create(
-            quote=quote,
-            order=order,
-            event_type=EventType.DELIVERY,
-            assigned_to=recipient,
-            defaults={
-                "title": reminder_title,
-                "description": reminder_description,
-                "status": EventStatus.PENDING,
-                "event_date": delivery_date,
-                "customer": quote.customer,
-            },
-        )
+    recipient_ids = [quote.seller_id, request.user.pk]
+    existing, _ = CalendarEvent.ensure_for(
+        recipient_ids,
+        quote=quote,
+        order=order,
+        event_type=EventType.DELIVERY,
+        defaults={
+            "title": reminder_title,
+            "description": reminder_description,
+            "status": EventStatus.PENDING,
+            "event_date": delivery_date,
+            "customer": quote.customer,
+        },
+        reminder={"remind_date": delivery_date, "message": reminder_title},
+    )
+    for event in existing.values():
         if event.event_date != delivery_date:
             event.event_date = delivery_date
             event.description = reminder_description
-            event.save(update_fields=["event_date", "description"])
-
-        Reminder.objects.get_or_create(
-            event=event,
-            defaults={
-                "remind_date": delivery_date,
-                "message": reminder_title,
-            },
-        )
-
-        Notification.send(
-            recipient,
-            f"Entrega agendada: {quote.number}",
-            NotificationType.DELIVERY_NEAR,
-            message=(
-                f"Data de entrega definida para {delivery_date.strftime('%d/%m/%Y')}.\n"
-                f"Cliente: {customer_name} | {item_count} itens | {subtotal_fmt}"
-            ),
-            url=f"/sales/orders/{order.id}/",
-        )
+            event.save(update_fields=["event_date", "description", "updated_at"])
+
+    Notification.send_many(
+        recipient_ids,
+        f"Entrega agendada: {quote.number}",
+        NotificationType.DELIVERY_NEAR,
+        message=(
+            f"Data de entrega definida para {delivery_date.strftime('%d/%m/%Y')}.\n"
+            f"Cliente: {customer_name} | {item_count} itens | {subtotal_fmt}"
+        ),
+        url=f"/sales/orders/{order.id}/",
+    )
 
     AuditLog.log(
         request.user,
@@ -2112,22 +2040,8 @@ def order_cancel(request: HttpRequest, order_id: int) -> HttpResponse:
 
 def generate_next_store_order_number() -> str:
     """Número sequencial para pedidos avulsos da loja (sem orçamento)."""
-    with transaction.atomic():
-        last = (
-            Order.objects.select_for_update()
-            .filter(number__startswith="LOJA-")
-            .order_by("-id")
-            .first()
-        )
-        try:
-            candidate = int(last.number.split("-")[1]) + 1 if last else 1
-        except (ValueError, IndexError):
-            candidate = Order.objects.filter(number__startswith="LOJA-").count() + 1
-
-        while Order.objects.filter(number=f"LOJA-{candidate:04d}").exists():
-            candidate += 1
-
-        return f"LOJA-{candidate:04d}"
+    from .numbering import next_number
+    return next_number("store_order")
 
 
 @login_required
@@ -2256,6 +2170,8 @@ def order_edit(request: HttpRequest, order_id: int) -> HttpResponse:
 
 @login_required
 def order_pdf(request: HttpRequest, order_id: int) -> HttpResponse:
+    from core.jobs import enqueue
+
     order = get_object_or_404(
         Order.objects.select_related('quote', 'supplier', 'quote__customer', 'quote__seller'),
         pk=order_id
@@ -2300,221 +2216,50 @@ def order_pdf(request: HttpRequest, order_id: int) -> HttpResponse:
             )
             return render(request, "sales/order_pdf_form.html", {"order": order})
 
-    def _fmt_brl(value) -> str:
-        s = f"{float(value):,.2f}"
-        return s.replace(',', '\x00').replace('.', ',').replace('\x00', '.')
+    job = enqueue(
+        "sales.exports.order_pdf", f"PDF do pedido {order.number}", request.user,
+        order_id=order.id,
+        prices={str(pk): str(price) for pk, price in manual_prices.items()},
+    )
+    return redirect("core:job_detail", job_id=job.pk)
 
-    NAVY   = colors.HexColor('#0A2640')
-    LGRAY  = colors.HexColor('#DDDDDD')
-    BGROW  = colors.HexColor('#F8F9FA')
-    MUTED  = colors.HexColor('#888888')
-
-    styles = getSampleStyleSheet()
-
-    def _ps(name, **kw):
-        return ParagraphStyle(name, parent=styles['Normal'], **kw)
-
-    st_title    = _ps('od_title',   fontSize=15, fontName='Helvetica-Bold',
-                      textColor=NAVY, alignment=TA_CENTER, spaceAfter=2)
-    st_sub      = _ps('od_sub',     fontSize=9,  textColor=MUTED,
-                      alignment=TA_CENTER, spaceAfter=0)
-    st_section  = _ps('od_sec',     fontSize=9,  fontName='Helvetica-Bold',
-                      textColor=NAVY, spaceBefore=8, spaceAfter=4)
-    st_normal   = _ps('od_normal',  fontSize=9,  leading=13)
-    st_label    = _ps('od_label',   fontSize=7,  textColor=MUTED, leading=11)
-    st_footer   = _ps('od_footer',  fontSize=7,  textColor=MUTED, alignment=TA_CENTER)
-    st_th       = _ps('od_th',      fontSize=8,  fontName='Helvetica-Bold',
-                      textColor=colors.white, alignment=TA_CENTER)
-    st_td_c     = _ps('od_td_c',    fontSize=8,  alignment=TA_CENTER)
-    st_td_l     = _ps('od_td_l',    fontSize=8)
-    st_td_g     = _ps('od_td_g',    fontSize=7,  textColor=colors.HexColor('#666666'))
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, pagesize=A4,
-        rightMargin=2*cm, leftMargin=2*cm,
-        topMargin=2*cm, bottomMargin=2*cm,
-    )
-    elements = []
+def render_order_pdf(order, manual_prices: dict[int, Decimal]) -> bytes:
+    """PDF do pedido de compra com os preços digitados no formulário.
 
-    elements.append(Paragraph("ROSELAR MÓVEIS", st_title))
-    elements.append(Paragraph("PEDIDO DE COMPRA", st_sub))
-    elements.append(Spacer(1, 0.3*cm))
-    elements.append(HRFlowable(width="100%", thickness=2, color=NAVY))
-    elements.append(Spacer(1, 0.4*cm))
+    Roda no worker de tarefas (sales/exports.py).
+    """
+    from .pdf_layout import PurchaseOrderLine, build_purchase_order
 
     if order.quote:
         seller_name = order.quote.seller.get_full_name() or order.quote.seller.username
     else:
         seller_name = "Compra da Loja"
     prazo = order.delivery_deadline.strftime('%d/%m/%Y') if order.delivery_deadline else '—'
-    meta_data = [
-        [
-            Paragraph(f"<b>Pedido:</b> #{order.number}", st_normal),
-            Paragraph(f"<b>Data:</b> {order.created_at.strftime('%d/%m/%Y')}", st_normal),
-        ],
-        [
-            Paragraph(f"<b>Vendedor:</b> {seller_name}", st_normal),
-            Paragraph(f"<b>Prazo de entrega:</b> {prazo}", st_normal),
-        ],
-        [
-            Paragraph(f"<b>Transportadora:</b> {order.transport_info or '—'}", st_normal),
-            Paragraph(f"<b>Cond. Pagamento:</b> {order.purchase_condition_text or '—'}", st_normal),
-        ],
-    ]
-    meta_tbl = Table(meta_data, colWidths=[8.5*cm, 8.5*cm])
-    meta_tbl.setStyle(TableStyle([
-        ('VALIGN',        (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING',   (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING',  (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-    ]))
-    elements.append(meta_tbl)
-    elements.append(Spacer(1, 0.4*cm))
-
-    supplier_cell = []
-    if order.supplier:
-        supplier_cell.append(Paragraph(f"<b>Fornecedor</b>", st_section))
-        supplier_cell.append(Paragraph(order.supplier.name, st_normal))
-        if order.supplier.phone:
-            supplier_cell.append(Paragraph(f"Tel: {order.supplier.phone}", st_label))
-        if order.supplier.email:
-            supplier_cell.append(Paragraph(order.supplier.email, st_label))
-    else:
-        supplier_cell.append(Paragraph("—", st_normal))
-
-    client_cell = [
-        Paragraph("<b>Cliente</b>", st_section),
-        Paragraph(order.quote.customer.name if order.quote else "Estoque da Loja", st_normal),
-    ]
-
-    party_tbl = Table([[supplier_cell, client_cell]], colWidths=[8.5*cm, 8.5*cm])
-    party_tbl.setStyle(TableStyle([
-        ('VALIGN',        (0, 0), (-1, -1), 'TOP'),
-        ('BOX',           (0, 0), (0, 0),   0.5, LGRAY),
-        ('BOX',           (1, 0), (1, 0),   0.5, LGRAY),
-        ('BACKGROUND',    (0, 0), (0, 0),   BGROW),
-        ('BACKGROUND',    (1, 0), (1, 0),   BGROW),
-        ('LEFTPADDING',   (0, 0), (-1, -1), 8),
-        ('RIGHTPADDING',  (0, 0), (-1, -1), 8),
-        ('TOPPADDING',    (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(party_tbl)
-    elements.append(Spacer(1, 0.5*cm))
-
-    elements.append(Paragraph("ITENS DO PEDIDO", st_section))
-
-    items_qs = items_qs_pre  # already fetched above
-
-    hdr = [
-        Paragraph('#',          st_th),
-        Paragraph('Produto',    st_th),
-        Paragraph('Descrição',  st_th),
-        Paragraph('Qtd',        st_th),
-        Paragraph('Vlr. Unit.', st_th),
-        Paragraph('Total',      st_th),
-    ]
-    table_data = [hdr]
-
-    for idx, item in enumerate(items_qs, 1):
-        desc = item.description.strip() if item.description else '—'
-        unit = manual_prices.get(item.id, Decimal('0.00'))
-        total_item = unit * item.quantity
-        table_data.append([
-            Paragraph(str(idx),                    st_td_c),
-            Paragraph(item.product_name,           st_td_l),
-            Paragraph(desc,                        st_td_g),
-            Paragraph(str(item.quantity),          st_td_c),
-            Paragraph(f"R$ {_fmt_brl(unit)}",      st_td_c),
-            Paragraph(f"R$ {_fmt_brl(total_item)}", st_td_c),
-        ])
-
-    col_widths = [0.8*cm, 4.5*cm, 6.5*cm, 1.2*cm, 2.5*cm, 2.5*cm]
-    items_tbl = Table(table_data, colWidths=col_widths, repeatRows=1)
-
-    row_styles = [
-        ('BACKGROUND',    (0, 0), (-1, 0),  NAVY),
-        ('TEXTCOLOR',     (0, 0), (-1, 0),  colors.white),
-        ('FONTNAME',      (0, 0), (-1, 0),  'Helvetica-Bold'),
-        ('FONTSIZE',      (0, 0), (-1, 0),  8),
-        ('TOPPADDING',    (0, 0), (-1, 0),  7),
-        ('BOTTOMPADDING', (0, 0), (-1, 0),  7),
-        ('GRID',          (0, 0), (-1, -1), 0.5, LGRAY),
-        ('VALIGN',        (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING',    (0, 1), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
-        ('LEFTPADDING',   (0, 1), (-1, -1), 5),
-        ('RIGHTPADDING',  (0, 1), (-1, -1), 5),
-    ]
-    for i in range(1, len(table_data)):
-        if i % 2 == 0:
-            row_styles.append(('BACKGROUND', (0, i), (-1, i), BGROW))
-
-    items_tbl.setStyle(TableStyle(row_styles))
-    elements.append(items_tbl)
-    elements.append(Spacer(1, 0.3*cm))
-
-    grand_total = sum(manual_prices.get(it.id, Decimal('0.00')) * it.quantity for it in items_qs)
-    total_tbl = Table(
-        [[Paragraph(f"<b>Total do pedido:</b> R$ {_fmt_brl(grand_total)}", st_normal)]],
-        colWidths=[17*cm],
-    )
-    total_tbl.setStyle(TableStyle([
-        ('ALIGN',         (0, 0), (-1, -1), 'RIGHT'),
-        ('TOPPADDING',    (0, 0), (-1, -1), 4),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('RIGHTPADDING',  (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(total_tbl)
-
-    if order.notes:
-        elements.append(Spacer(1, 0.4*cm))
-        st_obs_lbl = _ps('od_obs_lbl', fontSize=8, fontName='Helvetica-Bold',
-                         textColor=NAVY, spaceBefore=4, spaceAfter=3)
-        st_obs_txt = _ps('od_obs_txt', fontSize=8, leading=12,
-                         textColor=colors.HexColor('#333333'))
-        obs_tbl = Table(
-            [[
-                [Paragraph("OBSERVAÇÕES", st_obs_lbl),
-                 Paragraph(order.notes, st_obs_txt)]
-            ]],
-            colWidths=[17*cm],
-        )
-        obs_tbl.setStyle(TableStyle([
-            ('BOX',           (0, 0), (-1, -1), 0.5, LGRAY),
-            ('BACKGROUND',    (0, 0), (-1, -1), BGROW),
-            ('LEFTPADDING',   (0, 0), (-1, -1), 8),
-            ('RIGHTPADDING',  (0, 0), (-1, -1), 8),
-            ('TOPPADDING',    (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(obs_tbl)
-
-    elements.append(Spacer(1, 0.8*cm))
-    elements.append(HRFlowable(width="100%", thickness=0.5, color=LGRAY))
-    elements.append(Spacer(1, 0.2*cm))
-    elements.append(Paragraph(
-        f"Gerado em {timezone.localdate().strftime('%d/%m/%Y')} | Roselar Móveis",
-        st_footer,
-    ))
-
     try:
-        doc.build(elements)
+        return build_purchase_order(
+            meta=[
+                (f"<b>Pedido:</b> #{order.number}", f"<b>Data:</b> {order.created_at.strftime('%d/%m/%Y')}"),
+                (f"<b>Vendedor:</b> {seller_name}", f"<b>Prazo de entrega:</b> {prazo}"),
+                (f"<b>Transportadora:</b> {order.transport_info or '—'}",
+                 f"<b>Cond. Pagamento:</b> {order.purchase_condition_text or '—'}"),
+            ],
+            supplier=order.supplier,
+            client_name=order.quote.customer.name if order.quote else "Estoque da Loja",
+            lines=[
+                PurchaseOrderLine(
+                    item.product_name, item.description or "", item.quantity,
+                    manual_prices.get(item.id, Decimal('0.00')),
+                )
+                for item in order.items.all()
+            ],
+            total_label="Total do pedido",
+            notes=order.notes,
+        )
     except Exception:
         logger.exception('Erro ao gerar PDF do pedido %s', order.number)
         raise
 
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    supplier_name = order.supplier.name if order.supplier else 'sem_fornecedor'
-    filename = f'pedido_{order.number}_{supplier_name}.pdf'
-    filename = filename.replace(' ', '_').replace('/', '_')
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = _safe_content_disposition(filename)
-    return response
-
 def _run_simulation(
     subtotal: Decimal,
     freight_value: Decimal,
@@ -2530,7 +2275,6 @@ def _run_simulation(
     Comissão interpolada linearmente: [2%, 5%] para PIX/Dinheiro, [2%, 4%] para cartão e demais.
     Status: VERMELHO se MLD<0, AMARELO se 0≤MLD<2, VERDE se MLD≥2.
     """
-    from decimal import ROUND_HALF_UP
     subtotal      = Decimal(str(subtotal or 0))
     freight_value = Decimal(str(freight_value or 0))
     discount_pct  = Decimal(str(discount_pct or 0))
@@ -2614,49 +2358,11 @@ def _run_simulation(
     lucro_sobra         = (budget_loja + gordura_acrescimo) - custos_operacionais
     mld_pct = (lucro_sobra / subtotal) * Decimal('100') if subtotal > Decimal('0') else Decimal('0')
 
-    # 5. Comissão por tipo de pagamento (conforme LOGICA_SIMULADOR.txt)
-    #    PIX / CASH (Dinheiro):         dinâmico, clamp(mld, 2%, 5%)
-    #    Débito:                        4% fixo
-    #    Boleto à vista (1x):           4% fixo (máximo)
-    #    Boleto parcelado (2x+):        dinâmico, clamp(mld, 2%, 4%)
-    #    Crédito 1x–6x:                 3% fixo
-    #    Crédito 7x+:                   dinâmico, clamp(mld, 2%, 4%)
-    #    Cheque / outros:               dinâmico, clamp(mld, 2%, 4%)
-    sacrificio_ativo = False
-    _AVISTA_5   = {'CASH', 'PIX'}        # único teto 5%
-    _DEBIT_COMM = {'DEBIT_CARD'}
-
-    if metodo_principal in _AVISTA_5:
-        comissao_final = max(Decimal('2'), min(mld_pct, Decimal('5')))
-    elif metodo_principal in _DEBIT_COMM:
-        comissao_final = Decimal('4')
-    elif metodo_principal == 'BOLETO':
-        if max_parcelas == 1:
-            # boleto à vista = máximo da faixa
-            comissao_final = Decimal('4')
-        else:
-            # boleto parcelado: dinâmico, teto 4%
-            comissao_final = max(Decimal('2'), min(mld_pct, Decimal('4')))
-    elif metodo_principal == 'CREDIT_CARD':
-        if max_parcelas >= 7:
-            # 7x+: dinâmico, teto 4%
-            comissao_final = max(Decimal('2'), min(mld_pct, Decimal('4')))
-        else:
-            # 1x–6x: fixo 3%
-            comissao_final = Decimal('3')
-    else:
-        # Cheque, sem forma selecionada, etc.: dinâmico, teto 4%
-        comissao_final = max(Decimal('2'), min(mld_pct, Decimal('4')))
-
-    comissao_final = comissao_final.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-    if mld_pct < Decimal('0'):
-        status_simulacao = "VERMELHO"
-    elif mld_pct < Decimal('2'):
-        status_simulacao = "AMARELO"
-        sacrificio_ativo = True
-    else:
-        status_simulacao = "VERDE"
+    # 5. Comissão por tipo de pagamento (conforme LOGICA_SIMULADOR.txt) — regra
+    #    única compartilhada com o motor em lote (simulation_matrix).
+    comissao_final   = commission_pct_for(metodo_principal, max_parcelas, mld_pct)
+    status_simulacao = status_for(mld_pct)
+    sacrificio_ativo = status_simulacao == "AMARELO"
 
     return {
         "status": status_simulacao,
@@ -2900,23 +2606,18 @@ def _build_simulation_context(
 
     # ---- tariffs_by_type_json para o JS do painel ----
     payment_type_choices = list(PaymentMethodType.choices)
-    max_inst_map = {
-        'CASH': 1, 'PIX': 1, 'DEBIT_CARD': 1, 'CREDIT_CARD': 18, 'CHEQUE': 12, 'BOLETO': 4,
-    }
     tariffs_by_type: dict[str, list] = {}
     for pt_val, _pt_lbl in payment_type_choices:
-        max_inst = max_inst_map.get(pt_val, 1)
-        tariff_lookup = PaymentTariff.lookup_type(pt_val)
+        max_inst = MAX_INSTALLMENTS.get(pt_val, 1)
         # Só oferece parcelas com tarifa cadastrada — ausência não é 0%.
         options = [
             {
-                'installments': t.installments,
-                'fee': float(t.fee_percent),
-                'label': "À vista" if t.installments == 1 else f"{t.installments}x",
+                'installments': installments,
+                'fee': float(fee),
+                'label': "À vista" if installments == 1 else f"{installments}x",
             }
-            for t in PaymentTariff.objects.filter(
-                payment_type=tariff_lookup, installments__lte=max_inst
-            ).order_by('installments')
+            for installments, fee in PaymentTariff.fees_for(pt_val).items()
+            if installments <= max_inst
         ]
         tariffs_by_type[pt_val] = options
 
@@ -2951,9 +2652,10 @@ def _build_simulation_context(
     # e todas as mensagens caíam no texto genérico.
     #
     # `_run_simulation` é puro, então em vez de derivar uma fórmula fechada por
-    # modo (split, entrada, arquiteto) varremos o acréscimo em passos de 0,1% e
-    # perguntamos ao próprio motor. Vale para todos os modos, sem duplicar regra.
-    _PI_STEP = Decimal("0.1")
+    # modo (split, entrada, arquiteto) perguntamos ao próprio motor, em passos
+    # de 0,1%. Vale para todos os modos, sem duplicar regra; a busca é por
+    # bisecção (margin_solver), não varredura linear.
+    _PI_STEP = PI_STEP
 
     def _mld_pct_para(pi: Decimal, solo: dict | None = None) -> Decimal:
         """MLD% com acréscimo `pi`. `solo` avalia um método cobrindo a venda toda."""
@@ -2979,12 +2681,13 @@ def _build_simulation_context(
         """Menor acréscimo ADICIONAL que leva o MLD ao alvo. 0 se nem +30% resolve."""
         if subtotal <= 0:
             return Decimal("0")
-        pi = price_increase_pct
-        while pi <= MAX_PRICE_INCREASE:
-            if _mld_pct_para(pi, solo) >= alvo_mld:
-                return pi - price_increase_pct
-            pi += _PI_STEP
-        return Decimal("0")
+        return min_increase_for(
+            lambda pi: _mld_pct_para(pi, solo),
+            alvo_mld,
+            start=price_increase_pct,
+            limit=MAX_PRICE_INCREASE,
+            step=_PI_STEP,
+        )
 
     min_increase_to_unblock = Decimal("0")
     suggested_increase = Decimal("0")
@@ -3133,7 +2836,7 @@ def quote_simulate_commission(request: HttpRequest, quote_id: int) -> HttpRespon
         messages.error(request, "Acesso negado.")
         return redirect("sales:quote_list")
 
-    subtotal = quote.calculate_subtotal()
+    subtotal = quote.totals.subtotal
     freight_value = quote.freight_value or Decimal("0.00")
 
     if request.method == "POST":
@@ -3369,47 +3072,13 @@ def quote_duplicate(request, quote_id):
         messages.error(request, "Acesso negado.")
         return redirect("sales:quote_list")
     from core.models import AuditLog, AuditAction
+    from .cloning import duplicate_quote
 
     with transaction.atomic():
-        new_number = generate_next_quote_number()
-        new_quote = Quote.objects.create(
-            number=new_number,
-            customer=original.customer,
-            seller=request.user,
-            status=QuoteStatus.DRAFT,
-            quote_date=timezone.localdate(),
-            freight_value=original.freight_value,
-            freight_responsible=original.freight_responsible,
-            shipping_company=original.shipping_company,
-            shipping_payment_method=original.shipping_payment_method,
-            discount_percent=original.discount_percent,
-            price_increase_percent=original.price_increase_percent,
-            has_architect=original.has_architect,
-            architect=original.architect,
-            payment_type=original.payment_type,
-            payment_installments=original.payment_installments,
-            payment_fee_percent=original.payment_fee_percent,
-            payment_type_2=original.payment_type_2,
-            payment_installments_2=original.payment_installments_2,
-            payment_fee_percent_2=original.payment_fee_percent_2,
-            payment_split_amount=original.payment_split_amount,
-            total_override=original.total_override,
-            total_rounding_mode=original.total_rounding_mode,
-            total_manual_adjustment=original.total_manual_adjustment,
+        new_quote = duplicate_quote(
+            original, number=generate_next_quote_number(), seller=request.user,
         )
 
-        for item in original.items.all():
-            QuoteItem.objects.create(
-                quote=new_quote,
-                supplier=item.supplier,
-                product_name=item.product_name,
-                description=item.description,
-                quantity=item.quantity,
-                unit_value=item.unit_value,
-                condition_text=item.condition_text,
-                architect_percent=item.architect_percent,
-            )
-
     AuditLog.log(request.user, AuditAction.CREATE_QUOTE,
                  f"Orçamento duplicado: {original.number} → {new_quote.number}", obj=new_quote)
 
@@ -4,18 +4,40 @@ set -e
 cd config
 echo "==> Running migrations"
 python manage.py migrate --no-input --verbosity 2
+python manage.py createcachetable
+python manage.py rebuild_sales_rollup
+python manage.py migrate_attachment_blobs
 
 # One-time data import: set LOAD_FIXTURE=1 in Railway env vars for the
 # first deploy, then REMOVE it so data isn't re-imported on every restart.
 if [ "$LOAD_FIXTURE" = "1" ]; then
   echo "==> Loading initial data from data_dump.json"
   python manage.py loaddata ../data_dump.json --verbosity 2
+  python manage.py rebuild_search_index
   echo "==> Data loaded! REMOVE the LOAD_FIXTURE env var now."
 fi
+python manage.py sync_number_sequences
+# Signals keep the search index current; only build it on the first deploy.
+python manage.py rebuild_search_index --if-empty
 
 echo "==> Creating superuser (if env vars set)"
 python manage.py create_superuser_from_env
 echo "==> Collecting static files"
 python manage.py collectstatic --no-input
+echo "==> Starting background job worker"
+# gunicorn (exec below) does not watch this process: restart the worker
+# whenever it exits (crash, OOM kill) so exports never sit PENDING forever.
+(
+  while true; do
+    python manage.py run_jobs || echo "==> run_jobs exited with status $?; restarting in 5s"
+    sleep 5
+  done
+) &
 echo "==> Starting gunicorn"
-exec gunicorn config.wsgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+# config.asgi under uvicorn's gunicorn worker serves the SSE stream at
+# /api/live/. GUNICORN_ASGI_WORKER=sync falls back to WSGI (navbar polls).
+GUNICORN_ASGI_WORKER="${GUNICORN_ASGI_WORKER:-uvicorn_worker.UvicornWorker}"
+if [ "$GUNICORN_ASGI_WORKER" = "sync" ]; then
+  exec gunicorn config.wsgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+fi
+exec gunicorn config.asgi:application -k "$GUNICORN_ASGI_WORKER" --bind 0.0.0.0:$PORT --workers 2 --timeout 120
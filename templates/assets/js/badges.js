@@ -0,0 +1,49 @@
+/* Contadores do navbar (notificações + lembretes) via /api/badges/.
+ *
+ * Elementos com data-badge="notifications" ou data-badge="reminders"
+ * recebem a contagem (escondidos quando zero). Com o site em ASGI, o stream
+ * SSE /api/live/ avisa quando algo muda e só então os contadores são
+ * recarregados; sem SSE (WSGI responde 204, ou navegador sem EventSource)
+ * volta ao polling a cada 30s. O navegador revalida com If-None-Match, então
+ * sem mudanças a resposta é um 304 vazio.
+ */
+(function () {
+  var INTERVAL = 30000;
+  var badges = document.querySelectorAll('[data-badge]');
+  if (!badges.length) return;
+
+  function apply(data) {
+    badges.forEach(function (el) {
+      var group = data[el.dataset.badge];
+      if (!group) return;
+      el.textContent = group.count;
+      el.style.display = group.count ? '' : 'none';
+    });
+  }
+
+  function poll() {
+    if (document.hidden) return;
+    fetch('/api/badges/', { credentials: 'same-origin' })
+      .then(function (r) { return r.ok ? r.json() : null; })
+      .then(function (data) { if (data) apply(data); })
+      .catch(function () {});
+  }
+
+  var timer = null;
+  function startPolling() {
+    if (!timer) timer = setInterval(poll, INTERVAL);
+  }
+
+  if (window.EventSource) {
+    var source = new EventSource('/api/live/');
+    source.addEventListener('open', poll);  // (re)conectou: acerta os contadores
+    source.addEventListener('notification', poll);
+    source.addEventListener('reminder', poll);
+    source.addEventListener('error', function () {
+      if (source.readyState === EventSource.CLOSED) startPolling();
+    });
+  } else {
+    startPolling();
+  }
+  document.addEventListener('visibilitychange', poll);
+})();